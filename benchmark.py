@@ -0,0 +1,868 @@
+"""Бенчмарки FaceCrop на синтетических изображениях.
+
+Запуск:
+    python benchmark.py padding
+    python benchmark.py padding --size 2048 --repeat 10
+    python benchmark.py faceset --source portrait.png --out faces/
+    python benchmark.py detect --dir faces/
+    python benchmark.py tiled --source portrait.png
+    python benchmark.py video --source portrait.png
+    python benchmark.py dedup --dir faces/
+    python benchmark.py watch --dir faces/
+    python benchmark.py backend --dir faces/
+    python benchmark.py resample --dir faces/
+    python benchmark.py prescan --dir mixed/
+    python benchmark.py isolate --dir faces/ --timeout 5 --memory-limit 300
+    python benchmark.py uiload --dir faces/ --configs 1:1,1:4,2:2,4:4
+    python benchmark.py cache --dir faces/
+    python benchmark.py aio --dir faces/ --workers 1,2,4
+    python benchmark.py threads --dir faces/ --workers 1,2,4 --cv-threads 1,2,4
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+import numpy as np
+from PIL import Image
+
+from facecrop.core import FaceCropper, DEFAULT_ROI, RESAMPLING_POLICIES, resize_image
+from facecrop.cv_backend import crop_array, encode_array, read_array
+from facecrop.dedup import DetectionIndex, DEDUP_MAX_DISTANCE
+from facecrop.inventory import expected_runtime, order_by_cost, scan_jobs
+from facecrop.video import VideoCropper
+
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Плавный градиент с шумом - похоже на фото и не сжимается в ноль."""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(xx / 97.0),
+        128 + 100 * np.cos(yy / 131.0),
+        128 + 60 * np.sin((xx + yy) / 211.0),
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def timeit(fn, repeat: int) -> float:
+    """Медианное время вызова fn в миллисекундах."""
+    fn()  # прогрев
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def bench_padding(args):
+    """Время построения фона для каждого типа padding."""
+    cropper = FaceCropper()
+    target = args.size
+    original = synthetic_image(int(target * 1.6), int(target * 1.2))
+    # Содержимое, которое нужно вписать в квадрат: 60% по ширине
+    content = original.resize((int(target * 0.6), target))
+
+    print(f"padding, target={target}, content={content.size}, original={original.size}")
+    for padding in ("solid", "mirror", "blur", "none"):
+        ms = timeit(
+            lambda: cropper._add_padding(content, target, padding, original),
+            args.repeat
+        )
+        print(f"  {padding:<8} {ms:8.1f} мс")
+
+
+def iou(a, b) -> float:
+    """Intersection over union двух bbox (x, y, w, h)."""
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    inter_w = max(0, min(ax2, bx2) - max(a[0], b[0]))
+    inter_h = max(0, min(ay2, by2) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union else 0.0
+
+
+def bench_faceset(args):
+    """
+    Собирает тестовый набор: фото с лицом вписывается в фон разного
+    разрешения, масштаба и положения (как в реальном каталоге - от 1 до 24 Мп).
+    """
+    source = Image.open(args.source).convert("RGB")
+    cropper = FaceCropper()
+    # Эталонное положение лица - детекция на исходном чистом фото
+    source_face = cropper._detect_face_gray(cropper._to_gray(source))
+    if source_face is None:
+        sys.exit("На исходном фото не найдено лицо")
+    truth = {}
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(args.seed)
+    for i in range(args.count):
+        long_side = rng.choice([1024, 2048, 3000, 4000, 6000])
+        aspect = rng.choice([1.0, 4 / 3, 3 / 2, 16 / 9])
+        portrait = rng.random() < 0.5
+        width, height = long_side, int(long_side / aspect)
+        if portrait:
+            width, height = height, width
+        canvas = synthetic_image(width, height, seed=i)
+        # Фото с лицом занимает 30-90% короткой стороны
+        side = int(min(width, height) * rng.uniform(0.3, 0.9))
+        patch = source.resize(
+            (side, int(side * source.size[1] / source.size[0])),
+            Image.Resampling.LANCZOS
+        )
+        x = rng.randint(0, max(0, width - patch.size[0]))
+        y = rng.randint(0, max(0, height - patch.size[1]))
+        canvas.paste(patch, (x, y))
+        name = f"face_{i:03d}.jpg"
+        canvas.save(out / name, quality=90)
+        ratio = patch.size[0] / source.size[0]
+        truth[name] = [int(x + source_face[0] * ratio), int(y + source_face[1] * ratio),
+                       int(source_face[2] * ratio), int(source_face[3] * ratio)]
+    (out / "truth.json").write_text(json.dumps(truth, indent=1))
+    print(f"Сохранено {args.count} изображений в {out}")
+
+
+def bench_detect(args):
+    """
+    Сравнение фиксированных и адаптивных параметров детекции.
+
+    Если в папке есть truth.json (см. faceset), точность считается по эталону:
+    найденное лицо верно при IoU >= 0.5 с эталонным bbox.
+    """
+    cropper = FaceCropper()
+    folder = Path(args.dir)
+    truth_path = folder / "truth.json"
+    truth = json.loads(truth_path.read_text()) if truth_path.exists() else {}
+    files = sorted(p for p in folder.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    if args.limit:
+        files = files[:args.limit]
+
+    roi_cropper = FaceCropper(roi=DEFAULT_ROI)
+    tier_cropper = FaceCropper(tiers=tuple(args.tiers.split(",")))
+    modes = {
+        "фиксированные": lambda gray: cropper._detect_face_gray(gray),
+        "адаптивные": lambda gray: cropper._detect_scaled(gray, 1, args.size, args.k),
+        "адаптивные+ROI": lambda gray: roi_cropper._detect_scaled(gray, 1, args.size, args.k),
+        "ступени": lambda gray: tier_cropper._detect_scaled(gray, 1, args.size, args.k),
+    }
+    times = {name: [] for name in modes}
+    hits = {name: 0 for name in modes}
+    correct = {name: 0 for name in modes}
+    for path in files:
+        gray = cropper._to_gray(Image.open(path))
+        for name, detect in modes.items():
+            start = time.perf_counter()
+            face = detect(gray)
+            times[name].append((time.perf_counter() - start) * 1000)
+            hits[name] += face is not None
+            if face is not None and path.name in truth and iou(face, truth[path.name]) >= 0.5:
+                correct[name] += 1
+
+    n = len(files)
+    print(f"detect, {n} изображений, size={args.size}, k={args.k}")
+    for name in modes:
+        line = f"  {name:<14} {statistics.mean(times[name]):8.1f} мс/изобр, найдено {hits[name]}/{n}"
+        if truth:
+            line += f", верно {correct[name]}/{n}"
+        print(line)
+    baseline = sum(times["фиксированные"])
+    for name in list(modes)[1:]:
+        print(f"  ускорение {name}: {baseline / max(sum(times[name]), 1e-9):.1f}x")
+    roi_total = roi_cropper.stats["roi_hit"] + roi_cropper.stats["roi_miss"]
+    print(f"  ROI быстрый путь: {roi_cropper.stats['roi_hit']}/{roi_total}")
+    for tier in tier_cropper.tiers:
+        runs = tier_cropper.stats[f"tier_run:{tier}"]
+        print(f"  ступень {tier:<8} нашла {tier_cropper.stats[f'tier_hit:{tier}']}/{runs}")
+
+
+def bench_tiled(args):
+    """Детекция на панораме: весь кадр одним вызовом против тайлов."""
+    source = Image.open(args.source).convert("RGB")
+    width, height = args.width, args.height
+    panorama = synthetic_image(width, height)
+    side = int(height * 0.8)
+    patch = source.resize((side, int(side * source.size[1] / source.size[0])))
+    panorama.paste(patch, (int(width * 0.62), (height - patch.size[1]) // 2))
+    gray = FaceCropper()._to_gray(panorama)
+
+    print(f"tiled, панорама {width}x{height}, size={args.size}, k={args.k}")
+    results = {}
+    for mode in ("off", "on"):
+        cropper = FaceCropper(tiled=mode)
+        start = time.perf_counter()
+        results[mode] = cropper._detect_scaled(gray, 1, args.size, args.k)
+        ms = (time.perf_counter() - start) * 1000
+        print(f"  tiled={mode:<4} {ms:8.1f} мс, лицо {results[mode]}")
+    if results["off"] and results["on"]:
+        print(f"  IoU результатов: {iou(results['off'], results['on']):.3f}")
+
+
+def synthetic_clip(source: Image.Image, frames: int, width: int, height: int):
+    """
+    Ролик: фото с лицом плавно движется по фону с небольшой дрожью камеры.
+
+    Returns:
+        (кадры, x центра фото на каждом кадре)
+    """
+    rng = np.random.default_rng(0)
+    background = synthetic_image(width + 40, height + 40)
+    side = int(height * 0.5)
+    patch = source.resize((side, int(side * source.size[1] / source.size[0])))
+    clip, centers = [], []
+    for i in range(frames):
+        # Камера дрожит на пару пикселей, объект плавно ходит по кадру
+        shake_x, shake_y = rng.integers(0, 5, size=2)
+        frame = background.crop((20 + shake_x, 20 + shake_y, 20 + shake_x + width, 20 + shake_y + height))
+        x = int((width - side) * (0.5 + 0.35 * np.sin(i / frames * 2 * np.pi)))
+        frame.paste(patch, (x, (height - patch.size[1]) // 2))
+        clip.append(frame)
+        centers.append(x + side / 2)
+    return clip, centers
+
+
+def bench_video(args):
+    """Покадровая детекция против детекции на ключевых кадрах с трекингом и сглаживанием."""
+    source = Image.open(args.source).convert("RGB")
+    clip, centers = synthetic_clip(source, args.frames, args.width, args.height)
+    print(f"video, {len(clip)} кадров {args.width}x{args.height}, size={args.size}")
+    modes = {
+        "покадрово": VideoCropper(keyframe_interval=1, smoothing=0.0),
+        "трекинг": VideoCropper(keyframe_interval=args.keyframe, smoothing=0.0),
+        "трекинг+сглаж.": VideoCropper(keyframe_interval=args.keyframe),
+    }
+    for name, video in modes.items():
+        xs = []
+        for frame in video.process(clip, args.size, args.k):
+            box = video.last_square_box
+            xs.append(box[0] + box[2] / 2 if box else np.nan)
+        # Дрожание: вторая разность положения итогового окна (у плавного движения ~0)
+        jitter = np.nanstd(np.diff(xs, 2))
+        print(f"  {name:<15} {video.fps():7.1f} кадр/с, дрожание {jitter:5.1f} px, {video.summary()}")
+
+
+def near_duplicates(image: Image.Image):
+    """Типичные почти-дубликаты: пересохранение в JPEG 60 и уменьшенная копия."""
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "JPEG", quality=60)
+    resaved = Image.open(io.BytesIO(buffer.getvalue()))
+    resaved.load()
+    resized = image.resize((image.size[0] * 7 // 10, image.size[1] * 7 // 10), Image.Resampling.BILINEAR)
+    return [resaved, resized]
+
+
+def bench_dedup(args):
+    """
+    Повторное использование детекций: каждый кадр набора и два его
+    почти-дубликата, с индексом хешей и без. Точность дубликатов - по
+    truth.json с учетом масштаба копии.
+    """
+    folder = Path(args.dir)
+    truth = json.loads((folder / "truth.json").read_text())
+    files = sorted(folder / name for name in truth)[:args.limit or None]
+    items = []
+    for path in files:
+        original = Image.open(path)
+        original.load()
+        for image in [original] + near_duplicates(original):
+            ratio = image.size[0] / original.size[0]
+            items.append((image, [v * ratio for v in truth[path.name]]))
+
+    print(f"dedup, {len(files)} кадров x 3 варианта, size={args.size}, порог {args.distance}")
+    for name, index in (("без индекса", None), ("с индексом", DetectionIndex(args.distance))):
+        cropper = FaceCropper(dedup=index)
+        times, correct = [], 0
+        for image, box in items:
+            gray = cropper._to_gray(image)
+            start = time.perf_counter()
+            face = cropper._detect_or_reuse(gray, 1, args.size, args.k)
+            times.append((time.perf_counter() - start) * 1000)
+            correct += face is not None and iou(face, box) >= 0.5
+        line = f"  {name:<12} {statistics.mean(times):7.1f} мс/изобр, верно {correct}/{len(items)}"
+        if index is not None:
+            line += f", повторно использовано {cropper.stats['dedup_hit']}/{len(items)}"
+        print(line)
+
+
+def bench_watch(args):
+    """
+    Задержка "файл положили → кроп сохранен" в режиме --watch: файлы из
+    набора копируются в папку порциями (как по сети), с паузами между ними.
+    """
+    from facecrop.main import run_watch
+
+    files = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() == ".jpg")[:args.count]
+    print(f"watch, {len(files)} файлов, settle={args.settle}с, poll={args.poll}с")
+    for mode, use_events in (("опрос", False), ("события ОС", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            inbox, out = Path(tmp) / "in", Path(tmp) / "out"
+            inbox.mkdir()
+
+            def drop():
+                time.sleep(0.5)
+                for path in files:
+                    data = path.read_bytes()
+                    with open(inbox / path.name, "wb") as f:
+                        for start in range(0, len(data), len(data) // 4 + 1):
+                            f.write(data[start:start + len(data) // 4 + 1])
+                            f.flush()
+                            time.sleep(0.05)
+                    time.sleep(args.gap)
+
+            dropper = threading.Thread(target=drop)
+            dropper.start()
+            latencies = run_watch(
+                inbox, out, FaceCropper(), args.size, args.k, "none", False,
+                settle=args.settle, poll_interval=args.poll,
+                max_events=len(files), use_events=use_events
+            )
+            dropper.join()
+        print(f"  {mode:<11} медиана {statistics.median(latencies):.2f}с, макс {max(latencies):.2f}с")
+
+
+def bench_backend(args):
+    """
+    Полный путь "файл → кроп → JPEG" через PIL и через OpenCV бэкенд.
+    Расхождение - средняя абсолютная разница результатов (0-255) до кодирования.
+    """
+    from facecrop.main import load_image, write_image
+
+    files = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    files = files[:args.limit or None]
+    pil_cropper, cv_cropper = FaceCropper(), FaceCropper()
+
+    def run_pil(path):
+        image = pil_cropper.crop_to_square_with_face(load_image(path), args.size, args.k)
+        write_image(image, io.BytesIO(), "JPEG")
+        return np.asarray(image.convert("RGB"))
+
+    def run_cv(path):
+        array = crop_array(cv_cropper, read_array(path), args.size, args.k)
+        encode_array(array, "JPEG")
+        return array[:, :, ::-1]
+
+    times = {"pil": [], "opencv": []}
+    diffs, worst = [], 0.0
+    for path in files:
+        results = {}
+        for name, run in (("pil", run_pil), ("opencv", run_cv)):
+            start = time.perf_counter()
+            results[name] = run(path)
+            times[name].append((time.perf_counter() - start) * 1000)
+        diff = np.abs(results["pil"].astype(np.int16) - results["opencv"]).mean()
+        diffs.append(diff)
+        worst = max(worst, diff)
+
+    print(f"backend, {len(files)} изображений, size={args.size}")
+    for name, values in times.items():
+        print(f"  {name:<7} {statistics.mean(values):7.1f} мс/изобр")
+    print(f"  ускорение: {sum(times['pil']) / sum(times['opencv']):.2f}x")
+    print(f"  расхождение с PIL: среднее {statistics.mean(diffs):.2f}, макс {worst:.2f} (из 255)")
+
+
+def bench_resample(args):
+    """
+    Политики ресайза: время кропа+ресайза короткой стороны до --sizes и
+    PSNR относительно max (LANCZOS из полного разрешения).
+    """
+    files = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    images = []
+    for path in files[:args.limit or None]:
+        image = Image.open(path)
+        image.load()
+        images.append(image)
+
+    print(f"resample, {len(images)} изображений {images[0].size[0]}x{images[0].size[1]}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        reference = None
+        # max первым - он эталон для PSNR
+        for policy in sorted(RESAMPLING_POLICIES, key=lambda name: name != "max"):
+            times, results = [], []
+            for image in images:
+                side = min(image.size)
+                box = ((image.size[0] - side) // 2, (image.size[1] - side) // 2)
+                box += (box[0] + side, box[1] + side)
+                start = time.perf_counter()
+                result = resize_image(image, (size, size), policy, box)
+                times.append((time.perf_counter() - start) * 1000)
+                results.append(np.asarray(result, dtype=np.float32))
+            if policy == "max":
+                reference = results
+            line = f"  {size:>5}px {policy:<9} {statistics.mean(times):7.1f} мс"
+            if policy != "max":
+                mse = statistics.mean(float(((a - b) ** 2).mean()) for a, b in zip(results, reference))
+                line += f", PSNR {10 * np.log10(255 ** 2 / max(mse, 1e-12)):.1f} дБ"
+            print(line)
+
+
+def bench_prescan(args):
+    """
+    Инвентаризация по заголовкам: скорость, точность оценки времени и
+    время прогона на --workers потоках в исходном порядке и "дорогие
+    первыми". Время каждого изображения измеряется последовательно, прогон
+    на нескольких потоках моделируется по этим замерам (выдача задания
+    первому освободившемуся потоку, как в конвейере).
+    """
+    from facecrop.main import load_image, save_image
+
+    files = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = [(path, Path(tmp) / f"{path.stem}_square.jpg") for path in files]
+        start = time.perf_counter()
+        infos = scan_jobs(jobs)
+        scan_ms = (time.perf_counter() - start) * 1000
+        readable = [(job, info) for job, info in zip(jobs, infos) if info.ok]
+        print(f"prescan, {len(files)} файлов, нечитаемых {len(files) - len(readable)}, "
+              f"заголовки за {scan_ms:.0f} мс ({scan_ms / len(files):.2f} мс/файл)")
+
+        cropper = FaceCropper()
+        actual = {}
+        for (input_path, output_path), _ in readable:
+            start = time.perf_counter()
+            save_image(cropper.crop_to_square_with_face(load_image(input_path), args.size, args.k), output_path)
+            actual[input_path] = time.perf_counter() - start
+    predicted = sum(info.cost for _, info in readable)
+    print(f"  оценка {predicted:.1f} с, факт {sum(actual.values()):.1f} с (1 поток)")
+
+    ok_jobs = [job for job, _ in readable]
+    shuffled = ok_jobs[:]
+    random.Random(0).shuffle(shuffled)
+    orders = {
+        "по имени": ok_jobs,
+        "случайный": shuffled,
+        "дорогие первыми": order_by_cost(ok_jobs, [info for _, info in readable]),
+    }
+    for workers in (int(value) for value in args.workers.split(",")):
+        line = ", ".join(
+            f"{name} {expected_runtime((actual[job[0]] for job in order), workers):.1f} с"
+            for name, order in orders.items()
+        )
+        print(f"  {workers} потоков: {line} (нижняя граница {sum(actual.values()) / workers:.1f} с)")
+
+
+def bench_isolate(args):
+    """
+    Изоляция на папке с добавленным патологическим кадром (PNG
+    13000x13000, 500 МБ после декодирования): задержка на изображение
+    p50/p99/макс и пиковый RSS основного процесса при обработке в нем и в
+    процессе-воркере с лимитами.
+    """
+    import resource
+    from facecrop.isolate import IsolatedWorker
+    from facecrop.main import load_image, save_image
+
+    def percentiles(latencies):
+        latencies = sorted(latencies)
+        p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        return f"p50 {statistics.median(latencies) * 1000:.0f} мс, p99 {p99 * 1000:.0f} мс, макс {latencies[-1] * 1000:.0f} мс"
+
+    files = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        bomb = tmp / "bomb.png"
+        # В отдельном процессе, иначе 500 МБ попадут в пиковый RSS
+        subprocess.run([
+            sys.executable, "-c",
+            "import sys; from PIL import Image; "
+            "Image.new('RGB', (13000, 13000), (120, 100, 90)).save(sys.argv[1], compress_level=1)",
+            str(bomb)
+        ], check=True)
+        files.insert(len(files) // 2, bomb)
+        print(f"isolate, {len(files)} файлов (один 13000x13000 PNG)")
+
+        # Сначала изоляция: пиковый RSS основного процесса растет только
+        # при обработке в нем самом
+        worker = IsolatedWorker(timeout=args.timeout, memory_limit=args.memory_limit << 20)
+        results = [worker.process(path, tmp / f"b_{path.stem}.jpg", args.size, args.k) for path in files]
+        worker.close()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        limits = sum(1 for r in results if r.limit)
+        print(f"  изоляция (--timeout {args.timeout:g} --memory-limit {args.memory_limit}): "
+              f"{percentiles([r.seconds for r in results])}; ошибок {sum(1 for r in results if not r.ok)}; "
+              f"превышений лимитов {limits}, перезапусков {worker.restarts}; пиковый RSS {rss:.0f} МБ")
+
+        cropper = FaceCropper()
+        latencies, failed = [], 0
+        for path in files:
+            start = time.perf_counter()
+            try:
+                save_image(cropper.crop_to_square_with_face(load_image(path), args.size, args.k), tmp / f"a_{path.stem}.jpg")
+            except Exception:
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"  в процессе: {percentiles(latencies)}; ошибок {failed}; пиковый RSS {rss:.0f} МБ")
+
+
+def bench_aio(args):
+    """
+    asyncio API: пропускная способность и задержка event loop (максимальное
+    опоздание тика каждые 10 мс) при кропе прямо в корутине и через
+    AsyncCropper с разным числом потоков.
+    """
+    import asyncio
+    from facecrop.aio import AsyncCropper
+    from facecrop.main import crop_bytes
+
+    files = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    payloads = [p.read_bytes() for p in files[:args.limit or None]]
+    print(f"aio, {len(payloads)} изображений, --size {args.size}")
+
+    async def measure(name, crop_all):
+        lags, running = [], True
+
+        async def heartbeat():
+            while running:
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(time.perf_counter() - start - 0.01)
+
+        ticker = asyncio.ensure_future(heartbeat())
+        start = time.perf_counter()
+        await crop_all()
+        elapsed = time.perf_counter() - start
+        running = False
+        await ticker
+        print(f"  {name}: {len(payloads) / elapsed:.1f} изобр/с, "
+              f"задержка loop макс {max(lags) * 1000:.0f} мс, p50 {statistics.median(lags) * 1000:.1f} мс")
+
+    async def main():
+        cropper = FaceCropper()
+
+        async def blocking():
+            for data in payloads:
+                crop_bytes(data, cropper, args.size, args.k, "none")
+                await asyncio.sleep(0)
+
+        await measure("в корутине", blocking)
+        for workers in (int(value) for value in args.workers.split(",")):
+            async with AsyncCropper(workers, target_size=args.size, k=args.k, govern_threads=True) as pool:
+                async def pooled():
+                    async for result in pool.crop_many(payloads):
+                        assert result.ok, result.error
+                await measure(f"AsyncCropper({workers})", pooled)
+
+    asyncio.run(main())
+
+
+def bench_threads(args):
+    """
+    Матрица "воркеры x потоки OpenCV": пропускная способность кропа в
+    памяти (декодирование, детекция, кодирование) при workers потоках с
+    собственными FaceCropper и cv2.setNumThreads(cv_threads). Отмечается
+    значение по умолчанию threads.cv_threads_for.
+    """
+    import cv2
+    from concurrent.futures import ThreadPoolExecutor
+    from facecrop.main import crop_bytes
+    from facecrop.threads import available_cpus, cv_threads_for
+
+    files = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    payloads = [p.read_bytes() for p in files[:args.limit or None]]
+    cv_values = [int(value) for value in args.cv_threads.split(",")]
+    print(f"threads, {len(payloads)} изображений, CPU: {available_cpus()}, --size {args.size}")
+    print("  воркеры \\ потоки OpenCV: " + ", ".join(str(value) for value in cv_values) + " (изобр/с)")
+
+    initial = cv2.getNumThreads()
+    for workers in (int(value) for value in args.workers.split(",")):
+        cells = []
+        for cv_threads in cv_values:
+            cv2.setNumThreads(cv_threads)
+            local = threading.local()
+
+            def crop(data):
+                cropper = getattr(local, "cropper", None)
+                if cropper is None:
+                    cropper = local.cropper = FaceCropper(tile_workers=cv_threads)
+                return crop_bytes(data, cropper, args.size, args.k, "none")
+
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(crop, payloads[:workers]))  # прогрев каскадов
+                start = time.perf_counter()
+                list(pool.map(crop, payloads))
+                rate = len(payloads) / (time.perf_counter() - start)
+            mark = "*" if cv_threads == cv_threads_for(workers) else ""
+            cells.append(f"{rate:.2f}{mark}")
+        print(f"  {workers}: " + ", ".join(cells))
+    cv2.setNumThreads(initial)
+    print("  * - по умолчанию (доступные CPU / воркеры)")
+
+
+def bench_cache(args):
+    """
+    Кэш результатов Web UI: время запроса process_images_ui на холодном
+    кэше, повторная загрузка тех же файлов и загрузка с другим k.
+    """
+    from facecrop import ui
+
+    files = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    files = files[:args.limit or None]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ui.configure_cache(tmp, args.cache_mb)
+        print(f"cache, {len(files)} файлов, --size {args.size}, кэш {args.cache_mb} МБ")
+        for name, k in (("холодный", args.k), ("повтор", args.k), ("другой k", args.k + 0.5), ("повтор", args.k)):
+            hits = cache.stats["hits"]
+            start = time.perf_counter()
+            zip_path, gallery = ui.process_images_ui(files, args.size, k)
+            elapsed = time.perf_counter() - start
+            assert len(gallery) == len(files), zip_path
+            print(f"  {name} (k={k:g}): {elapsed * 1000 / len(files):.0f} мс/изобр, "
+                  f"из кэша {cache.stats['hits'] - hits}/{len(files)}")
+        print(f"  hit rate {cache.hit_rate:.0%}, записей {len(cache)}, {cache.total_bytes / 1e6:.1f} МБ")
+        ui.configure_cache(None, 0)
+
+
+def bench_thumbs(args):
+    """
+    Превью галереи Web UI: сколько байт уходит в галерею против
+    полноразмерных результатов и во что обходится построение превью.
+    """
+    from facecrop import ui
+
+    files = sorted(str(p) for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    files = files[:args.limit or None]
+    ui.configure_cache(None, 0)
+    print(f"thumbs, {len(files)} файлов, --size {args.size}, превью {ui.THUMB_SIZE}px")
+    start = time.perf_counter()
+    _, gallery = ui.process_images_ui(files, args.size, args.k)
+    elapsed = time.perf_counter() - start
+    outputs = [entry["output"] for entry in ui._processed_files_storage["files_map"].values()]
+    full = sum(os.path.getsize(path) for path in outputs)
+    thumbs = sum(os.path.getsize(path) for path, _ in gallery)
+    print(f"  запрос: {elapsed * 1000 / len(files):.0f} мс/изобр")
+    print(f"  полный размер: {full / 1e6:.1f} МБ, галерея: {thumbs / 1e6:.2f} МБ ({full / thumbs:.0f}x меньше)")
+
+    # Построение превью: из кропа в памяти и с диска (попадание в кэш)
+    images = [Image.open(path) for path in outputs]
+    for image in images:
+        image.load()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, source in (("из памяти", images), ("с диска", [None] * len(outputs))):
+            start = time.perf_counter()
+            for path, image in zip(outputs, source):
+                target = Path(tmp) / Path(path).name
+                if image is None:
+                    shutil.copyfile(path, target)
+                ui._save_thumbnail(target, image)
+            print(f"  превью {name}: {(time.perf_counter() - start) * 1000 / len(outputs):.1f} мс/изобр")
+
+
+def bench_uiload(args):
+    """
+    Нагрузочный тест Web UI: для каждой конфигурации "concurrency:workers"
+    запускается сервер, --clients клиентов gradio_client одновременно шлют по
+    --requests запросов из --files изображений. Нужны gradio и gradio_client.
+    """
+    import socket
+    import subprocess
+    from gradio_client import Client, handle_file
+
+    paths = sorted(p for p in Path(args.dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+    files = [str(path) for path in paths[:args.files]]
+    print(f"uiload, {args.clients} клиентов x {args.requests} запросов x {len(files)} файлов, size={args.size}")
+    for config in args.configs.split(","):
+        concurrency, workers = config.split(":")
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        env = dict(os.environ, UI_CONCURRENCY=concurrency, UI_WORKERS=workers,
+                   UI_MAX_QUEUE=str(args.max_queue), PYTHONPATH=str(Path(__file__).parent / "src"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "facecrop", "--ui", "--port", str(port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            url = f"http://127.0.0.1:{port}"
+            for _ in range(120):
+                try:
+                    client = Client(url, verbose=False, download_files=False)
+                    break
+                except Exception:
+                    time.sleep(0.5)
+            else:
+                raise RuntimeError("сервер не запустился")
+            latencies, errors = [], []
+            lock = threading.Lock()
+
+            def run_client():
+                client = Client(url, verbose=False, download_files=False)
+                for _ in range(args.requests):
+                    start = time.perf_counter()
+                    try:
+                        client.predict([handle_file(f) for f in files], args.size, 2.5, "balanced",
+                                       api_name="/process_wrapper")
+                    except Exception as e:
+                        with lock:
+                            errors.append(e)
+                        continue
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+
+            threads = [threading.Thread(target=run_client) for _ in range(args.clients)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0
+        print(f"  concurrency {concurrency} workers {workers}: "
+              f"{len(latencies) * len(files) / wall:5.1f} изобр/с, задержка медиана "
+              f"{statistics.median(latencies) if latencies else 0:.2f}с, p95 {p95:.2f}с, ошибок {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки FaceCrop")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("padding", help="Построение фона padding")
+    p.add_argument("--size", type=int, default=2048)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_padding)
+
+    p = sub.add_parser("faceset", help="Сгенерировать тестовый набор с лицами")
+    p.add_argument("--source", required=True, help="Фото с одним лицом")
+    p.add_argument("--out", required=True)
+    p.add_argument("--count", type=int, default=40)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=bench_faceset)
+
+    p = sub.add_parser("detect", help="Скорость и точность детекции")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--limit", type=int, default=0, help="Только первые N файлов")
+    p.add_argument("--tiers", default="fast,default,alt,profile", help="Цепочка ступеней детектора")
+    p.set_defaults(func=bench_detect)
+
+    p = sub.add_parser("tiled", help="Тайловая детекция на панораме")
+    p.add_argument("--source", required=True, help="Фото с одним лицом")
+    p.add_argument("--width", type=int, default=20000)
+    p.add_argument("--height", type=int, default=3000)
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.set_defaults(func=bench_tiled)
+
+    p = sub.add_parser("video", help="Кроп ролика: трекинг и сглаживание")
+    p.add_argument("--source", required=True, help="Фото с одним лицом")
+    p.add_argument("--frames", type=int, default=120)
+    p.add_argument("--width", type=int, default=1920)
+    p.add_argument("--height", type=int, default=1080)
+    p.add_argument("--size", type=int, default=512)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--keyframe", type=int, default=10)
+    p.set_defaults(func=bench_video)
+
+    p = sub.add_parser("dedup", help="Повторное использование детекций на почти-дубликатах")
+    p.add_argument("--dir", required=True, help="Папка из faceset с truth.json")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--distance", type=int, default=DEDUP_MAX_DISTANCE, help="Порог расстояния Хэмминга")
+    p.add_argument("--limit", type=int, default=0, help="Только первые N файлов")
+    p.set_defaults(func=bench_dedup)
+
+    p = sub.add_parser("watch", help="Задержка режима --watch")
+    p.add_argument("--dir", required=True, help="Папка с изображениями .jpg")
+    p.add_argument("--count", type=int, default=8)
+    p.add_argument("--gap", type=float, default=1.0, help="Пауза между файлами, сек")
+    p.add_argument("--settle", type=float, default=0.5)
+    p.add_argument("--poll", type=float, default=1.0)
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.set_defaults(func=bench_watch)
+
+    p = sub.add_parser("backend", help="PIL против OpenCV бэкенда")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--limit", type=int, default=0, help="Только первые N файлов")
+    p.set_defaults(func=bench_backend)
+
+    p = sub.add_parser("resample", help="Скорость и качество политик ресайза")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--sizes", default="1024,512,256", help="Целевые размеры через запятую")
+    p.add_argument("--limit", type=int, default=10, help="Только первые N файлов (0 - все)")
+    p.set_defaults(func=bench_resample)
+
+    p = sub.add_parser("prescan", help="Инвентаризация и порядок заданий")
+    p.add_argument("--dir", required=True, help="Папка с изображениями разных размеров")
+    p.add_argument("--workers", default="2,4,8", help="Число потоков через запятую")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.set_defaults(func=bench_prescan)
+
+    p = sub.add_parser("isolate", help="Лимиты времени и памяти на изображение")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--timeout", type=float, default=5.0, help="Лимит времени, секунды")
+    p.add_argument("--memory-limit", type=int, default=300, help="Лимит памяти, МБ")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.set_defaults(func=bench_isolate)
+
+    p = sub.add_parser("aio", help="asyncio API")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--workers", default="1,2,4", help="Число потоков через запятую")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--limit", type=int, default=20, help="Только первые N файлов (0 - все)")
+    p.set_defaults(func=bench_aio)
+
+    p = sub.add_parser("threads", help="Матрица воркеры x потоки OpenCV")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--workers", default="1,2,4", help="Число воркеров через запятую")
+    p.add_argument("--cv-threads", default="1,2,4", help="Потоков OpenCV через запятую")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--limit", type=int, default=20, help="Только первые N файлов (0 - все)")
+    p.set_defaults(func=bench_threads)
+
+    p = sub.add_parser("cache", help="Кэш результатов Web UI")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--size", type=int, default=1024)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--cache-mb", type=int, default=256)
+    p.add_argument("--limit", type=int, default=20, help="Только первые N файлов (0 - все)")
+    p.set_defaults(func=bench_cache)
+
+    p = sub.add_parser("thumbs", help="Превью галереи Web UI")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--size", type=int, default=2048)
+    p.add_argument("--k", type=float, default=2.5)
+    p.add_argument("--limit", type=int, default=20, help="Только первые N файлов (0 - все)")
+    p.set_defaults(func=bench_thumbs)
+
+    p = sub.add_parser("uiload", help="Нагрузочный тест Web UI")
+    p.add_argument("--dir", required=True, help="Папка с изображениями")
+    p.add_argument("--configs", default="1:1,1:4,2:2,4:4", help="concurrency:workers через запятую")
+    p.add_argument("--clients", type=int, default=4)
+    p.add_argument("--requests", type=int, default=3, help="Запросов на клиента")
+    p.add_argument("--files", type=int, default=4, help="Изображений в запросе")
+    p.add_argument("--max-queue", type=int, default=16)
+    p.add_argument("--size", type=int, default=512)
+    p.set_defaults(func=bench_uiload)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,12 @@ setup(
         "numpy>=1.24.0",
         "gradio>=4.0.0",
     ],
+    extras_require={
+        # События ОС для --watch (без него - опрос папки)
+        "watch": ["watchdog>=3.0.0"],
+        # /metrics для Web UI (--metrics-port)
+        "metrics": ["prometheus-client>=0.16.0"],
+    },
     python_requires=">=3.8",
     entry_points={
         "console_scripts": [
@@ -0,0 +1,217 @@
+"""asyncio API: кроп закодированных изображений в памяти без блокировки event loop."""
+
+import asyncio
+import threading
+import weakref
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Optional, Union
+
+from .core import FaceCropper
+from .main import crop_bytes
+from .threads import available_cpus, configure_threads
+
+
+class AsyncResult:
+    """Результат одного входа crop_many: данные или ошибка."""
+
+    def __init__(self, index: int, data: Optional[bytes] = None, error: Optional[BaseException] = None):
+        self.index = index
+        self.data = data
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class AsyncCropper:
+    """
+    Кроп для asyncio сервисов: декодирование, детекция и кодирование идут в
+    собственном пуле потоков (Pillow и OpenCV отпускают GIL), у каждого
+    потока свой FaceCropper. С govern_threads потоки OpenCV процесса
+    настраиваются под workers (threads.configure_threads), чтобы пул не
+    перегружал ядра; по умолчанию глобальные настройки процесса не меняются.
+
+    Одновременно в пуле не больше max_pending изображений (на event loop):
+    следующий crop ждет освобождения места, так что быстрый источник не
+    накапливает декодированные кадры в памяти. Отмена задачи снимает
+    изображение из очереди пула; уже начатое доделывается в потоке, но
+    результат отбрасывается, а место освобождается по завершении.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        target_size: int = 1024,
+        k: float = 2.5,
+        padding: str = "none",
+        output_format: Optional[str] = None,
+        govern_threads: bool = False,
+        **cropper_options: Any
+    ):
+        """
+        Args:
+            workers: Потоков кропа (по умолчанию число доступных CPU)
+            max_pending: Изображений в пуле одновременно (по умолчанию 2 * workers)
+            target_size, k, padding: Параметры кропа по умолчанию
+            output_format: 'JPEG', 'PNG' или 'WEBP' (None - формат входа)
+            govern_threads: Вызвать configure_threads(workers): меняет
+                cv2.setNumThreads и OMP_NUM_THREADS/MKL_NUM_THREADS и т.п.
+                во всем процессе
+            **cropper_options: Параметры FaceCropper (resampling, roi, tiers, ...)
+        """
+        self.workers = workers or available_cpus()
+        self.max_pending = max_pending or 2 * self.workers
+        if self.workers < 1 or self.max_pending < 1:
+            raise ValueError("workers и max_pending должны быть >= 1")
+        self.target_size = target_size
+        self.k = k
+        self.padding = padding
+        self.output_format = output_format
+        self.cropper_options = cropper_options
+        if govern_threads:
+            configure_threads(self.workers)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="facecrop-async")
+        self._local = threading.local()
+        self._croppers = []
+        self._slots = weakref.WeakKeyDictionary()
+
+    def _cropper(self) -> FaceCropper:
+        cropper = getattr(self._local, 'cropper', None)
+        if cropper is None:
+            cropper = self._local.cropper = FaceCropper(**self.cropper_options)
+            self._croppers.append(cropper)
+        return cropper
+
+    def _crop_sync(self, data: bytes, target_size: int, k: float, padding: str, output_format: Optional[str]) -> bytes:
+        return crop_bytes(data, self._cropper(), target_size, k, padding, output_format)
+
+    @property
+    def stats(self) -> Counter:
+        """Счетчики FaceCropper всех потоков."""
+        return sum((cropper.stats for cropper in list(self._croppers)), Counter())
+
+    async def crop(
+        self,
+        data: bytes,
+        target_size: Optional[int] = None,
+        k: Optional[float] = None,
+        padding: Optional[str] = None,
+        output_format: Optional[str] = None
+    ) -> bytes:
+        """
+        Кропает закодированное изображение, возвращает закодированный результат.
+
+        Параметры, не заданные явно, берутся из конструктора.
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+        await slots.acquire()
+        try:
+            future = self._executor.submit(
+                self._crop_sync, data,
+                self.target_size if target_size is None else target_size,
+                self.k if k is None else k,
+                padding or self.padding,
+                output_format or self.output_format
+            )
+        except BaseException:
+            slots.release()
+            raise
+        # Место освобождается, когда поток действительно закончил
+        future.add_done_callback(lambda _: _release(loop, slots))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def crop_many(
+        self,
+        inputs: Union[Iterable[bytes], AsyncIterable[bytes]],
+        **options: Any
+    ) -> AsyncIterator[AsyncResult]:
+        """
+        Кропает поток входов, отдавая AsyncResult в порядке входов.
+
+        Следующий вход читается, только когда в окне из max_pending
+        изображений есть место. Ошибки отдельных входов не прерывают поток.
+        Если потребитель перестал читать (break, aclose), незавершенные
+        изображения отменяются. options - как у crop.
+        """
+        window = deque()
+
+        async def next_result() -> AsyncResult:
+            index, task = window.popleft()
+            try:
+                return AsyncResult(index, await task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return AsyncResult(index, error=e)
+
+        try:
+            index = 0
+            async for data in _aiter(inputs):
+                if len(window) >= self.max_pending:
+                    yield await next_result()
+                window.append((index, asyncio.ensure_future(self.crop(data, **options))))
+                index += 1
+            while window:
+                yield await next_result()
+        finally:
+            for _, task in window:
+                task.cancel()
+
+    def close(self, wait: bool = True):
+        """Останавливает пул потоков."""
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self) -> "AsyncCropper":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Ожидание потоков - тоже вне event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+def _release(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore):
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:  # event loop уже закрыт
+        pass
+
+
+async def _aiter(inputs: Union[Iterable[bytes], AsyncIterable[bytes]]) -> AsyncIterator[bytes]:
+    if hasattr(inputs, '__aiter__'):
+        async for data in inputs:
+            yield data
+    else:
+        for data in inputs:
+            yield data
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+async def crop_async(
+    data: bytes,
+    target_size: int = 1024,
+    k: float = 2.5,
+    padding: str = "none",
+    output_format: Optional[str] = None
+) -> bytes:
+    """
+    Кропает закодированное изображение в общем AsyncCropper процесса
+    (потоков по числу CPU). Для своих настроек пула - AsyncCropper.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = AsyncCropper()
+    return await _default.crop(data, target_size, k, padding, output_format)
@@ -0,0 +1,227 @@
+"""Локальная очередь заданий на SQLite: аренда, повторы и dead-letter."""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+
+# Через сколько секунд задание упавшего воркера снова выдается другим
+LEASE_SECONDS = 300.0
+# После стольких неудачных попыток задание уходит в dead-letter
+MAX_ATTEMPTS = 3
+
+STATUSES = ("pending", "running", "done", "dead")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    worker TEXT,
+    error TEXT,
+    UNIQUE (input, output)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until);
+"""
+
+
+class Job:
+    """Задание, выданное воркеру."""
+
+    def __init__(self, job_id: int, input_path: str, output_path: str, attempts: int):
+        self.id = job_id
+        self.input = Path(input_path)
+        self.output = Path(output_path)
+        self.attempts = attempts
+
+
+class JobQueue:
+    """
+    Очередь заданий (input, output) в файле SQLite.
+
+    Несколько процессов на одной машине берут задания в аренду атомарно
+    (BEGIN IMMEDIATE). Если воркер упал и не отчитался, по истечении аренды
+    задание снова становится доступно. Задание, упавшее MAX_ATTEMPTS раз,
+    переходит в статус dead и больше не выдается.
+
+    Аренду определяют воркер и номер попытки: после повторной выдачи
+    задания complete/fail/renew прежнего владельца ничего не меняют.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        lease_seconds: float = LEASE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS
+    ):
+        """
+        Args:
+            path: Файл базы (создается при первом обращении)
+            lease_seconds: Длительность аренды задания
+            max_attempts: Число попыток до dead-letter
+        """
+        if lease_seconds <= 0 or max_attempts < 1:
+            raise ValueError("lease_seconds должен быть > 0, max_attempts >= 1")
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # autocommit, транзакции открываются явно
+        self._db = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def enqueue(self, jobs: Iterable[Tuple[Path, Path]]) -> int:
+        """
+        Добавляет задания; уже существующие пары (input, output) пропускаются.
+
+        Returns:
+            Число добавленных заданий
+        """
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO jobs (input, output) VALUES (?, ?)",
+                ((str(input_path), str(output_path)) for input_path, output_path in jobs)
+            )
+            return self._db.total_changes - before
+
+    def claim(self) -> Optional[Job]:
+        """
+        Берет в аренду следующее задание.
+
+        Returns:
+            Job или None, если доступных заданий нет
+        """
+        now = time.time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            # Аренда истекла на последней попытке - воркер падает на этом файле
+            self._db.execute(
+                "UPDATE jobs SET status = 'dead', error = 'аренда истекла' "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts)
+            )
+            row = self._db.execute(
+                "SELECT id, input, output, attempts FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, input_path, output_path, attempts = row
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', attempts = ?, lease_until = ?, worker = ? "
+                "WHERE id = ?",
+                (attempts + 1, now + self.lease_seconds, self.worker_id, job_id)
+            )
+        return Job(job_id, input_path, output_path, attempts + 1)
+
+    # Условие "аренда задания все еще у этого воркера"
+    _OWNED = "id = ? AND worker = ? AND attempts = ? AND status = 'running'"
+
+    def _owned(self, job: Job) -> Tuple[int, str, int]:
+        return (job.id, self.worker_id, job.attempts)
+
+    def complete(self, job: Job) -> bool:
+        """
+        Отмечает задание выполненным.
+
+        Returns:
+            False, если аренда уже потеряна (задание выдано другому воркеру)
+        """
+        with self._db:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET status = 'done', lease_until = NULL, error = NULL WHERE {self._OWNED}",
+                self._owned(job)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        Возвращает задание в очередь или, после max_attempts попыток, в dead-letter.
+
+        Returns:
+            False, если аренда уже потеряна (задание выдано другому воркеру)
+        """
+        status = 'dead' if job.attempts >= self.max_attempts else 'pending'
+        with self._db:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET status = ?, lease_until = NULL, error = ? WHERE {self._OWNED}",
+                (status, error) + self._owned(job)
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, job: Job) -> bool:
+        """
+        Продлевает аренду задания на lease_seconds от текущего момента.
+
+        Returns:
+            False, если аренда уже потеряна
+        """
+        with self._db:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE {self._OWNED}",
+                (time.time() + self.lease_seconds,) + self._owned(job)
+            )
+        return cursor.rowcount == 1
+
+    def counts(self) -> Dict[str, int]:
+        """Число заданий по статусам."""
+        counts = dict.fromkeys(STATUSES, 0)
+        for status, count in self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def dead_jobs(self) -> Iterable[Tuple[str, str]]:
+        """(input, ошибка) заданий в dead-letter."""
+        return self._db.execute("SELECT input, error FROM jobs WHERE status = 'dead' ORDER BY id").fetchall()
+
+
+class LeaseKeeper:
+    """
+    Контекст, продлевающий аренду задания в фоне, пока оно обрабатывается.
+
+    Аренда продлевается каждую треть lease_seconds через отдельное
+    соединение (соединение SQLite нельзя делить между потоками), поэтому
+    задание дольше --lease не выдается второму воркеру. lost становится
+    True, если продлить аренду не удалось.
+    """
+
+    def __init__(self, queue: JobQueue, job: Job):
+        self.queue = queue
+        self.job = job
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job.id}", daemon=True)
+
+    def _run(self):
+        keeper = JobQueue(self.queue.path, self.queue.lease_seconds, self.queue.max_attempts)
+        keeper.worker_id = self.queue.worker_id
+        try:
+            while not self._stop.wait(self.queue.lease_seconds / 3):
+                if not keeper.renew(self.job):
+                    self.lost = True
+                    break
+        finally:
+            keeper.close()
+
+    def __enter__(self) -> "LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,149 @@
+"""Кэш результатов по содержимому: хеш файла + параметры кропа → закодированный результат."""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+from . import __version__
+
+
+# Порция чтения при хешировании
+HASH_CHUNK = 1 << 20
+# Размер кэша по умолчанию, МБ
+DEFAULT_CACHE_MB = 256
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 содержимого файла (hex)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(
+    content_digest: str,
+    size: int,
+    k: float,
+    padding: str = "none",
+    resampling: str = "max",
+    output_format: str = "JPEG",
+    quality: int = 95
+) -> str:
+    """
+    Ключ результата: содержимое входа и все, что влияет на байты выхода.
+
+    Версия facecrop входит в ключ, чтобы изменения алгоритма не отдавали
+    старые результаты.
+    """
+    parts = (__version__, content_digest, size, repr(float(k)), padding, resampling, output_format, quality)
+    return hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Ограниченный по размеру кэш закодированных результатов на диске.
+
+    Файл записи - <ключ>.bin в root. Вытесняются давно не использованные
+    записи (LRU), пока суммарный размер больше max_bytes. Порядок LRU
+    хранится в mtime файлов, поэтому переживает перезапуск процесса.
+    Потокобезопасен.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_CACHE_MB << 20):
+        if max_bytes < 1:
+            raise ValueError("max_bytes должен быть >= 1")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # ключ -> размер, от старых к новым
+        entries = []
+        for path in self.root.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+        self.total_bytes = sum(self._entries.values())
+        with self._lock:
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.bin"
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def get(self, key: str, destination: Path) -> bool:
+        """Копирует результат в destination. Returns: True при попадании."""
+        with self._lock:
+            if key not in self._entries:
+                self.stats['misses'] += 1
+                return False
+            self._entries.move_to_end(key)
+        try:
+            shutil.copyfile(self._path(key), destination)
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            # Файл удалили снаружи
+            with self._lock:
+                self._forget(key)
+                self.stats['misses'] += 1
+            return False
+        with self._lock:
+            self.stats['hits'] += 1
+        return True
+
+    def put(self, key: str, source: Path):
+        """Сохраняет копию source; записи больше max_bytes не кэшируются."""
+        size = Path(source).stat().st_size
+        if size > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = size
+            self.total_bytes += size
+            self.stats['stores'] += 1
+            self._evict()
+
+    def invalidate(self, key: str):
+        """Удаляет запись (например, результат исправили вручную)."""
+        with self._lock:
+            if key in self._entries:
+                self._forget(key)
+                self._path(key).unlink(missing_ok=True)
+                self.stats['invalidations'] += 1
+
+    def _forget(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self._path(key).unlink(missing_ok=True)
+            self.stats['evictions'] += 1
@@ -2,26 +2,178 @@
 
 import cv2
 import numpy as np
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from PIL import Image
 from typing import Tuple, Optional, List
 from pathlib import Path
 import sys
+import threading
+import time
+
+from .dedup import DetectionIndex, DEDUP_THUMB_SIZE, dhash
+
+# EXIF тег ориентации
+EXIF_ORIENTATION = 274
+
+# Преобразование сохраненных пикселей в отображаемые для EXIF ориентаций 2-8
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Лица меньше short_side / (MIN_FACE_DIVISOR * k) не дают осмысленного кропа
+MIN_FACE_DIVISOR = 8.0
+# Размер такого минимального лица в кадре детекции (окно каскада 24px)
+DETECT_FACE_PX = 40
+# Максимальное число уровней пирамиды detectMultiScale
+MAX_PYRAMID_LEVELS = 16
+
+# Тайловая детекция: включается в режиме "auto" для кадров детекции больше
+# TILED_MIN_PIXELS, сторона тайла - не меньше TILE_MIN_SIZE и 3 * maxSize
+TILED_MIN_PIXELS = 3_000_000
+TILE_MIN_SIZE = 1024
+TILED_MODES = ("auto", "on", "off")
+
+# Априорная область лица для ROI-first детекции (left, top, right, bottom
+# в долях кадра): верхние две трети, центральная полоса
+DEFAULT_ROI = (0.15, 0.0, 0.85, 0.67)
+
+# Ступени детектора: имя -> (файл каскада, масштаб кадра относительно
+# адаптивного). None - основной каскад (frontalface_default или alt).
+# Следующая ступень запускается только если предыдущие не нашли лицо.
+DETECTOR_TIERS = {
+    "fast": (None, 0.5),
+    "default": (None, 1.0),
+    "alt": ("haarcascade_frontalface_alt2.xml", 1.0),
+    "profile": ("haarcascade_profileface.xml", 1.0),
+}
+DEFAULT_TIERS = ("default",)
+# Минимальное окно Haar каскада
+CASCADE_WINDOW = 24
+
+# Политики ресайза: имя -> reducing_gap Pillow. Перед LANCZOS кадр
+# уменьшается reduce() в целое число раз так, чтобы до цели оставалось не
+# меньше gap раз; меньший gap - быстрее и грубее, None - LANCZOS из полного
+# разрешения. По умолчанию max: байты результата как до появления политик,
+# быстрые политики включаются явно.
+RESAMPLING_POLICIES = {
+    "fast": 1.0,
+    "balanced": 2.0,
+    "max": None,
+}
+DEFAULT_RESAMPLING = "max"
+
+# Sigma размытия фона padding в пикселях target_size (как у ядра 51x51)
+BLUR_SIGMA = 8.0
+# Во сколько раз фон padding строится меньше target_size
+BLUR_DOWNSCALE = 4
+
+
+def resize_image(
+    image: Image.Image,
+    size: Tuple[int, int],
+    resampling: str = DEFAULT_RESAMPLING,
+    box: Optional[Tuple[int, int, int, int]] = None
+) -> Image.Image:
+    """LANCZOS ресайз (опционально области box) по политике из RESAMPLING_POLICIES."""
+    return image.resize(
+        size, Image.Resampling.LANCZOS, box=box, reducing_gap=RESAMPLING_POLICIES[resampling]
+    )
+
+
+def merge_boxes(
+    boxes: List[Tuple[int, int, int, int]],
+    overlap_threshold: float = 0.3
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Non-maximum suppression для bbox (x, y, w, h) без оценок уверенности.
+    
+    Боксы перебираются от больших к меньшим; бокс отбрасывается, если его
+    IoU с уже принятым больше overlap_threshold или он больше чем на 70%
+    лежит внутри принятого (обрезанное на стыке тайла лицо).
+    """
+    kept = []
+    for box in sorted(boxes, key=lambda b: b[2] * b[3], reverse=True):
+        x, y, w, h = box
+        duplicate = False
+        for kx, ky, kw, kh in kept:
+            inter_w = max(0, min(x + w, kx + kw) - max(x, kx))
+            inter_h = max(0, min(y + h, ky + kh) - max(y, ky))
+            inter = inter_w * inter_h
+            union = w * h + kw * kh - inter
+            if inter / union > overlap_threshold or inter / (w * h) > 0.7:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(tuple(box))
+    return kept
 
 
 class FaceCropper:
     """Класс для детекции лица и расчета квадратного кропа."""
     
-    def __init__(self):
-        """Инициализация детектора лиц (OpenCV Haar Cascades)."""
+    def __init__(
+        self,
+        tiled: str = "auto",
+        tile_workers: Optional[int] = None,
+        roi: Optional[Tuple[float, float, float, float]] = None,
+        tiers: Tuple[str, ...] = DEFAULT_TIERS,
+        dedup: Optional[DetectionIndex] = None,
+        resampling: str = DEFAULT_RESAMPLING
+    ):
+        """
+        Инициализация детектора лиц (OpenCV Haar Cascades).
+        
+        Args:
+            tiled: Тайловая детекция больших кадров: "auto", "on" или "off"
+            tile_workers: Число потоков для тайлов (по умолчанию - как у
+                OpenCV, cv2.getNumThreads; см. threads.configure_threads)
+            roi: Априорная область лица (left, top, right, bottom) в долях
+                кадра. Сначала ищем в ней, весь кадр - только при промахе.
+                None - сразу весь кадр.
+            tiers: Цепочка ступеней детектора из DETECTOR_TIERS, от дешевой
+                к дорогой; следующая запускается только при промахе.
+            dedup: Индекс перцептивных хешей; для почти-дубликата уже
+                обработанного кадра bbox берется из индекса без детекции.
+                Один индекс можно передать нескольким FaceCropper.
+            resampling: Политика ресайза результата из RESAMPLING_POLICIES
+        """
+        unknown = [tier for tier in tiers if tier not in DETECTOR_TIERS]
+        if not tiers or unknown:
+            raise ValueError(f"ступени детектора должны быть из {tuple(DETECTOR_TIERS)}")
+        self.tiers = tuple(tiers)
+        if resampling not in RESAMPLING_POLICIES:
+            raise ValueError(f"resampling должен быть одним из {tuple(RESAMPLING_POLICIES)}")
+        self.resampling = resampling
+        if tiled not in TILED_MODES:
+            raise ValueError(f"tiled должен быть одним из {TILED_MODES}")
+        if roi is not None:
+            left, top, right, bottom = roi
+            if not (0 <= left < right <= 1 and 0 <= top < bottom <= 1):
+                raise ValueError("roi должен быть (left, top, right, bottom) в долях 0..1")
+        self.roi = roi
+        self.dedup = dedup
+        self.tiled = tiled
+        self.tile_workers = tile_workers or cv2.getNumThreads() or 1
+        self._cascade_path = None
+        self._local = threading.local()
+        self._owner = threading.get_ident()
+        self._tier_cascades = {}
         self.face_cascade = self._load_haar_cascade()
+        # Счетчики за время жизни объекта (детекции, пропуски и т.п.);
+        # меняются только через _count - FaceCropper делят между потоками
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
 
-    def _load_haar_cascade(self) -> cv2.CascadeClassifier:
-        """Ищет и загружает Haar каскад из возможных путей."""
-        filenames = [
-            "haarcascade_frontalface_default.xml",
-            "haarcascade_frontalface_alt.xml",
-        ]
-
+    def _cascade_dirs(self) -> List[Path]:
+        """Возможные папки с Haar каскадами."""
         candidates = []
         # Стандартный путь OpenCV
         if hasattr(cv2, "data") and hasattr(cv2.data, "haarcascades"):
@@ -32,24 +184,133 @@ class FaceCropper:
         if meipass:
             candidates.append(Path(meipass) / "cv2" / "data" / "haarcascades")
             candidates.append(Path(meipass) / "haarcascades")
+        return candidates
 
-        for base in candidates:
+    def _load_haar_cascade(self) -> cv2.CascadeClassifier:
+        """Ищет и загружает Haar каскад из возможных путей."""
+        filenames = [
+            "haarcascade_frontalface_default.xml",
+            "haarcascade_frontalface_alt.xml",
+        ]
+
+        for base in self._cascade_dirs():
             for name in filenames:
                 path = base / name
                 if path.exists():
                     cascade = cv2.CascadeClassifier(str(path))
                     if not cascade.empty():
+                        self._cascade_path = str(path)
                         return cascade
 
         # Пустой классификатор, чтобы не падать при detectMultiScale
         return cv2.CascadeClassifier()
     
-    def detect_face(self, image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    def _tier_cascade_path(self, tier: str) -> Optional[str]:
+        """Путь к файлу каскада ступени (None - файл не найден)."""
+        filename = DETECTOR_TIERS[tier][0]
+        if filename is None:
+            return self._cascade_path
+        for base in self._cascade_dirs():
+            path = base / filename
+            if path.exists():
+                return str(path)
+        return None
+    
+    def _cascade(self, tier: str = "default") -> cv2.CascadeClassifier:
+        """Каскад ступени; дополнительные загружаются при первом промахе."""
+        if DETECTOR_TIERS[tier][0] is None:
+            return self.face_cascade
+        cascade = self._tier_cascades.get(tier)
+        if cascade is None:
+            path = self._tier_cascade_path(tier)
+            cascade = cv2.CascadeClassifier(path) if path else cv2.CascadeClassifier()
+            self._tier_cascades[tier] = cascade
+        return cascade
+    
+    def _count(self, key: str, value: float = 1):
+        """
+        Увеличивает счетчик stats (под блокировкой) и счетчик track_call
+        текущего потока, если он открыт.
+        """
+        with self._stats_lock:
+            self.stats[key] += value
+        call = getattr(self._local, "call", None)
+        if call is not None:
+            call[key] += value
+    
+    @contextmanager
+    def track_call(self):
+        """
+        Счетчики только этого потока за время блока (Counter).
+        
+        Прирост общего stats за блок при общем FaceCropper включает работу
+        других потоков; track_call - нет.
+        """
+        previous = getattr(self._local, "call", None)
+        call = self._local.call = Counter()
+        try:
+            yield call
+        finally:
+            self._local.call = previous
+            if previous is not None:
+                previous.update(call)
+    
+    def _thread_cascade(self, tier: str = "default") -> cv2.CascadeClassifier:
+        """
+        Экземпляр каскада ступени для текущего потока.
+        
+        detectMultiScale использует внутренние буферы классификатора, поэтому
+        параллельные вызовы на одном объекте небезопасны. Поток, создавший
+        FaceCropper, работает с основными каскадами, остальные загружают
+        свои при первом вызове - один FaceCropper можно делить между потоками.
+        """
+        if threading.get_ident() == self._owner:
+            return self._cascade(tier)
+        cascades = getattr(self._local, "cascades", None)
+        if cascades is None:
+            cascades = self._local.cascades = {}
+        path = self._tier_cascade_path(tier)
+        cascade = cascades.get(path)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(path) if path else self._cascade(tier)
+            cascades[path] = cascade
+        return cascade
+    
+    def _cascade_faces(
+        self,
+        cascade: cv2.CascadeClassifier,
+        gray: np.ndarray,
+        tier: str,
+        **params
+    ) -> List[Tuple[int, int, int, int]]:
+        """
+        Все лица, найденные каскадом. Каскад профилей обучен только на
+        повернутых влево лицах, поэтому для него кадр дополнительно
+        сканируется зеркально.
+        """
+        faces = [tuple(face) for face in cascade.detectMultiScale(gray, minNeighbors=5, **params)]
+        if tier == "profile":
+            width = gray.shape[1]
+            mirrored = cascade.detectMultiScale(
+                np.ascontiguousarray(gray[:, ::-1]), minNeighbors=5, **params
+            )
+            faces += [(width - x - w, y, w, h) for x, y, w, h in mirrored]
+        return faces
+    
+    def detect_face(
+        self,
+        image: np.ndarray,
+        target_size: Optional[int] = None,
+        k: Optional[float] = None
+    ) -> Optional[Tuple[int, int, int, int]]:
         """
         Детектирует лицо на изображении с помощью OpenCV Haar Cascades.
         
         Args:
             image: Изображение в формате BGR (OpenCV)
+            target_size: Размер результата; вместе с k включает адаптивные
+                границы детекции (см. detection_params)
+            k: Множитель размера лица
             
         Returns:
             Tuple (x, y, width, height) bounding box лица или None
@@ -57,11 +318,252 @@ class FaceCropper:
         if self.face_cascade is None or self.face_cascade.empty():
             return None
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(
+        if k is None:
+            if self._use_tiles(gray.shape, min(gray.shape[:2])):
+                return self._detect_tiled(gray, max_size=min(gray.shape[:2]))
+            return self._detect_face_gray(gray)
+        return self._detect_scaled(gray, 1, target_size or 1024, k)
+    
+    def detection_params(
+        self,
+        image_size: Tuple[int, int],
+        target_size: int = 1024,
+        k: float = 2.5
+    ) -> Tuple[float, int, int, float]:
+        """
+        Рассчитывает параметры детекции из размеров изображения и результата.
+        
+        В кроп попадает только самое большое лицо, а лицо меньше
+        short_side / (MIN_FACE_DIVISOR * k) в разы меньше задуманного размера
+        в кадре и не дает осмысленного кропа - такие размеры не сканируются. Кадр детекции
+        уменьшается так, чтобы минимальное лицо было ~DETECT_FACE_PX пикселей,
+        но не грубее половины target_size по короткой стороне (точность
+        позиции). Шаг пирамиды подбирается так, чтобы диапазон minSize..maxSize
+        укладывался в MAX_PYRAMID_LEVELS уровней.
+        
+        Args:
+            image_size: (width, height) изображения
+            target_size: Размер результата
+            k: Множитель размера лица
+            
+        Returns:
+            Tuple (scale, min_size, max_size, scale_factor); размеры - в
+            пикселях уменьшенного в scale раз кадра
+        """
+        short_side = min(image_size)
+        min_face = max(30.0, short_side / (MIN_FACE_DIVISOR * k))
+        scale = min(1.0, max(DETECT_FACE_PX / min_face, target_size / 2 / short_side))
+        
+        min_size = max(24, int(min_face * scale))
+        max_size = max(min_size, int(short_side * scale))
+        scale_factor = max(1.1, (max_size / min_size) ** (1 / MAX_PYRAMID_LEVELS))
+        return scale, min_size, max_size, scale_factor
+    
+    def face_can_change_crop(
+        self,
+        image_size: Tuple[int, int],
+        target_size: int,
+        padding: str = "none"
+    ) -> bool:
+        """
+        Проверяет по размерам, может ли положение лица изменить результат.
+        
+        Итоговый квадрат всегда берет короткую сторону целиком, а по длинной
+        может сместиться не больше чем на (long - short) пикселей исходника,
+        то есть на (long - short) * target_size / short пикселей результата.
+        Если это меньше пикселя (квадратные и почти квадратные кадры), кроп
+        не зависит от лица. С padding от размера лица зависит, нужен ли фон,
+        поэтому там детекция нужна всегда.
+        """
+        if padding != "none":
+            return True
+        short_side, long_side = min(image_size), max(image_size)
+        return (long_side - short_side) * target_size / short_side >= 1
+    
+    def _detect_scaled(
+        self,
+        gray: np.ndarray,
+        orientation: int,
+        target_size: int,
+        k: float
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Детекция с адаптивными границами на полутоновом кадре в сохраненной
+        ориентации. Кадр сначала уменьшается, потом разворачивается, так что
+        копируется уже маленький массив.
+        
+        Returns:
+            bbox лица в отображаемых координатах полного размера или None
+        """
+        height, width = gray.shape[:2]
+        scale, min_size, max_size, scale_factor = self.detection_params(
+            (width, height), target_size, k
+        )
+        if scale < 1.0:
+            small_w = max(1, round(width * scale))
+            small_h = max(1, round(height * scale))
+            gray = cv2.resize(gray, (small_w, small_h), interpolation=cv2.INTER_AREA)
+            ratio_x, ratio_y = width / small_w, height / small_h
+        else:
+            ratio_x = ratio_y = 1.0
+        if orientation >= 5:
+            ratio_x, ratio_y = ratio_y, ratio_x
+        
+        gray = self._orient_array(gray, orientation)
+        face = None
+        for tier in self.tiers:
+            self._count(f'tier_run:{tier}')
+            face = self._detect_tier(tier, gray, min_size, max_size, scale_factor)
+            if face is not None:
+                self._count(f'tier_hit:{tier}')
+                break
+        if face is None:
+            return None
+        x, y, face_w, face_h = face
+        return (
+            int(round(x * ratio_x)), int(round(y * ratio_y)),
+            int(round(face_w * ratio_x)), int(round(face_h * ratio_y))
+        )
+    
+    def _detect_or_reuse(
+        self,
+        gray: np.ndarray,
+        orientation: int,
+        target_size: int,
+        k: float
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        _detect_scaled с повторным использованием результата почти-дубликата.
+        
+        Хеш считается по миниатюре в отображаемой ориентации, bbox в индексе
+        хранится в долях кадра и масштабируется к текущему разрешению.
+        """
+        if self.dedup is None:
+            return self._detect_scaled(gray, orientation, target_size, k)
+        height, width = gray.shape[:2]
+        img_w, img_h = self._oriented_size((width, height), orientation)
+        thumb = cv2.resize(gray, (DEDUP_THUMB_SIZE, DEDUP_THUMB_SIZE), interpolation=cv2.INTER_AREA)
+        key = dhash(self._orient_array(thumb, orientation))
+        aspect = img_w / img_h
+        
+        found, box = self.dedup.lookup(key, aspect)
+        if found:
+            self._count('dedup_hit')
+            if box is None:
+                return None
+            return (
+                int(round(box[0] * img_w)), int(round(box[1] * img_h)),
+                int(round(box[2] * img_w)), int(round(box[3] * img_h))
+            )
+        self._count('dedup_miss')
+        face = self._detect_scaled(gray, orientation, target_size, k)
+        self.dedup.add(key, aspect, None if face is None else (
+            face[0] / img_w, face[1] / img_h, face[2] / img_w, face[3] / img_h
+        ))
+        return face
+    
+    def _detect_tier(
+        self,
+        tier: str,
+        gray: np.ndarray,
+        min_size: int,
+        max_size: int,
+        scale_factor: float
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Одна ступень детектора на кадре детекции: ROI (если задана), затем
+        весь кадр. Дешевые ступени работают на дополнительно уменьшенном кадре.
+        """
+        frame_scale = DETECTOR_TIERS[tier][1]
+        ratio_x = ratio_y = 1.0
+        if frame_scale < 1.0:
+            height, width = gray.shape[:2]
+            small_w = max(1, round(width * frame_scale))
+            small_h = max(1, round(height * frame_scale))
+            gray = cv2.resize(gray, (small_w, small_h), interpolation=cv2.INTER_AREA)
+            ratio_x, ratio_y = width / small_w, height / small_h
+            min_size = max(CASCADE_WINDOW, int(min_size * frame_scale))
+            max_size = max(min_size, int(max_size * frame_scale))
+        
+        face = None
+        if self.roi is not None:
+            face = self._detect_roi(gray, min_size, max_size, scale_factor, tier)
+        if face is None:
+            face = self._detect_region(gray, min_size, max_size, scale_factor, tier)
+        if face is None:
+            return None
+        x, y, face_w, face_h = face
+        return (
+            int(round(x * ratio_x)), int(round(y * ratio_y)),
+            int(round(face_w * ratio_x)), int(round(face_h * ratio_y))
+        )
+    
+    def _detect_region(
+        self,
+        gray: np.ndarray,
+        min_size: int,
+        max_size: int,
+        scale_factor: float,
+        tier: str = "default"
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """Детекция на кадре или его части: целиком или по тайлам."""
+        max_size = max(min_size, min(max_size, min(gray.shape[:2])))
+        detect = self._detect_tiled if self._use_tiles(gray.shape, max_size) else self._detect_face_gray
+        return detect(
+            gray,
+            min_size=(min_size, min_size),
+            max_size=(max_size, max_size),
+            scale_factor=scale_factor,
+            tier=tier
+        )
+    
+    def _detect_roi(
+        self,
+        gray: np.ndarray,
+        min_size: int,
+        max_size: int,
+        scale_factor: float,
+        tier: str = "default"
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Быстрый путь: детекция только в априорной области self.roi.
+        
+        Returns:
+            bbox в координатах всего кадра или None (тогда нужен весь кадр)
+        """
+        height, width = gray.shape[:2]
+        left, top, right, bottom = self.roi
+        x0, y0 = int(width * left), int(height * top)
+        x1, y1 = int(round(width * right)), int(round(height * bottom))
+        face = None
+        if min(x1 - x0, y1 - y0) >= min_size:
+            face = self._detect_region(gray[y0:y1, x0:x1], min_size, max_size, scale_factor, tier)
+        if face is None:
+            self._count('roi_miss')
+            return None
+        self._count('roi_hit')
+        x, y, face_w, face_h = face
+        return (x + x0, y + y0, face_w, face_h)
+    
+    def _detect_face_gray(
+        self,
+        gray: np.ndarray,
+        min_size: Tuple[int, int] = (30, 30),
+        max_size: Optional[Tuple[int, int]] = None,
+        scale_factor: float = 1.1,
+        tier: str = "default"
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """Детектирует самое большое лицо на полутоновом изображении."""
+        cascade = self._thread_cascade(tier)
+        if cascade is None or cascade.empty():
+            return None
+        faces = self._cascade_faces(
+            cascade,
             gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
+            tier,
+            scaleFactor=scale_factor,
+            minSize=min_size,
+            maxSize=max_size or (0, 0)
         )
         if len(faces) > 0:
             # Берем самое большое лицо
@@ -70,6 +572,84 @@ class FaceCropper:
             return (x, y, width, height)
         return None
     
+    def _use_tiles(self, shape: Tuple[int, ...], max_size: int) -> bool:
+        """Нужна ли тайловая детекция для кадра детекции данного размера."""
+        if self.tiled == "off" or self.face_cascade is None or self.face_cascade.empty():
+            return False
+        if len(self._tile_boxes(shape, max_size)) < 2:
+            return False
+        if self.tiled == "on":
+            return True
+        # Тайлы перекрываются, и без параллельности это лишняя работа
+        return self.tile_workers > 1 and shape[0] * shape[1] >= TILED_MIN_PIXELS
+    
+    def _tile_boxes(self, shape: Tuple[int, ...], max_size: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Разбивает кадр на перекрывающиеся тайлы (left, top, right, bottom).
+        
+        Перекрытие равно maxSize детекции, поэтому любое допустимое лицо
+        целиком попадает хотя бы в один тайл.
+        """
+        height, width = shape[:2]
+        tile = max(TILE_MIN_SIZE, 3 * max_size)
+        step = tile - max_size
+        
+        def spans(length):
+            if length <= tile:
+                return [(0, length)]
+            starts = list(range(0, length - tile, step)) + [length - tile]
+            return [(start, start + tile) for start in starts]
+        
+        return [
+            (x0, y0, x1, y1)
+            for y0, y1 in spans(height)
+            for x0, x1 in spans(width)
+        ]
+    
+    def _detect_tiled(
+        self,
+        gray: np.ndarray,
+        min_size: Tuple[int, int] = (30, 30),
+        max_size: Optional[Tuple[int, int]] = None,
+        scale_factor: float = 1.1,
+        tier: str = "default"
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Детекция по перекрывающимся тайлам в пуле потоков.
+        
+        Каждый поток использует свой экземпляр каскада. Дубли лиц на стыках
+        тайлов объединяются NMS, возвращается самое большое лицо - как у
+        детекции по всему кадру.
+        """
+        if isinstance(max_size, int):
+            max_size = (max_size, max_size)
+        if max_size is None:
+            max_size = (min(gray.shape[:2]),) * 2
+        tiles = self._tile_boxes(gray.shape, max(max_size))
+        
+        def detect_tile(tile):
+            x0, y0, x1, y1 = tile
+            faces = self._cascade_faces(
+                self._thread_cascade(tier),
+                gray[y0:y1, x0:x1],
+                tier,
+                scaleFactor=scale_factor,
+                minSize=min_size,
+                maxSize=max_size
+            )
+            return [(x + x0, y + y0, w, h) for x, y, w, h in faces]
+        
+        workers = min(self.tile_workers, len(tiles))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            boxes = [box for found in pool.map(detect_tile, tiles) for box in found]
+        
+        self._count('tiled_detections')
+        faces = merge_boxes(boxes)
+        if not faces:
+            return None
+        x, y, width, height = max(faces, key=lambda f: f[2] * f[3])
+        return (int(x), int(y), int(width), int(height))
+    
     def calculate_orientation_crop(
         self,
         face_bbox: Tuple[int, int, int, int],
@@ -218,38 +798,90 @@ class FaceCropper:
         Returns:
             PIL Image с сохраненной ориентацией
         """
-        # Учитываем EXIF ориентацию
-        image = self._fix_orientation(image)
+        # EXIF ориентацию не применяем ко всему кадру: геометрия считается
+        # в отображаемых координатах, а пиксели берутся из сохраненных
+        orientation = self._get_orientation(image)
+        img_w, img_h = self._oriented_size(image.size, orientation)
         
-        # Конвертируем в numpy для детекции
-        img_array = np.array(image)
-        if len(img_array.shape) == 2:  # Grayscale
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_GRAY2BGR)
-        elif img_array.shape[2] == 4:  # RGBA
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGBA2BGR)
-        else:  # RGB
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+        if not self.face_can_change_crop((img_w, img_h), target_size, padding):
+            # Кроп не может сдвинуться - детекция не нужна
+            self._count('detect_skipped')
+            return self._center_crop_orientation(image, target_size, orientation)
+        self._count('detect_run')
         
-        # Детектируем лицо
-        face_bbox = self.detect_face(img_array)
+        # Детектируем лицо (каскад не инвариантен к повороту, поэтому
+        # разворачивается уменьшенная полутоновая копия, а не цветной кадр)
+        start = time.perf_counter()
+        face_bbox = self._detect_or_reuse(self._to_gray(image), orientation, target_size, k)
+        self._count('detect_seconds', time.perf_counter() - start)
         
         if face_bbox is None:
             # Fallback: центральный кроп с сохранением ориентации
-            return self._center_crop_orientation(image, target_size)
+            self._count('center_fallback')
+            return self._center_crop_orientation(image, target_size, orientation)
         
-        # Рассчитываем кроп с учетом ориентации
-        img_w, img_h = image.size
-        
-        # Центр лица в исходном изображении
-        face_center_x = face_bbox[0] + face_bbox[2] // 2
-        face_center_y = face_bbox[1] + face_bbox[3] // 2
+        if padding != "none" and self._needs_padding(face_bbox, (img_w, img_h), k, safety_margin):
+            # Лицо с запасом не помещается в квадрат внутри изображения -
+            # вписываем область с лицом в квадрат и достраиваем фон
+            return self._padding_stage(
+                image, face_bbox, target_size, k, safety_margin, padding, orientation
+            )
         
-        crop_x, crop_y, crop_width, crop_height = self.calculate_orientation_crop(
+        crop_box = self.calculate_orientation_crop(
             face_bbox, (img_w, img_h), k, safety_margin
         )
+        return self._crop_box_to_square(image, face_bbox, crop_box, target_size, orientation)
+    
+    def _crop_box_to_square(
+        self,
+        image: Image.Image,
+        face_bbox: Tuple[int, int, int, int],
+        crop_box: Tuple[int, int, int, int],
+        target_size: int,
+        orientation: int = 1
+    ) -> Image.Image:
+        """
+        Вырезает crop_box (результат calculate_orientation_crop), масштабирует
+        короткую сторону до target_size и обрезает до квадрата, сохраняя
+        относительную позицию лица.
+        """
+        return self._apply_plan(
+            image, self._square_plan(face_bbox, crop_box, target_size), orientation
+        )
+    
+    def _apply_plan(
+        self,
+        image: Image.Image,
+        plan: Tuple[Tuple[int, int, int, int], Tuple[int, int], Tuple[int, int, int, int]],
+        orientation: int = 1
+    ) -> Image.Image:
+        """Выполняет план кропа (см. _square_plan) на PIL изображении."""
+        box, size, final_box = plan
+        # Кроп и ресайз до промежуточного размера одной операцией
+        cropped = self._crop_oriented(image, box, orientation, size)
+        if final_box != (0, 0) + size:
+            cropped = cropped.crop(final_box)
+        return cropped
+    
+    def _square_plan(
+        self,
+        face_bbox: Tuple[int, int, int, int],
+        crop_box: Tuple[int, int, int, int],
+        target_size: int
+    ) -> Tuple[Tuple[int, int, int, int], Tuple[int, int], Tuple[int, int, int, int]]:
+        """
+        Геометрия _crop_box_to_square без работы с пикселями - общая для
+        PIL и OpenCV бэкендов.
+        
+        Returns:
+            Tuple (box кропа в отображаемых координатах, размер после ресайза,
+            box квадрата target_size в ресайзнутом изображении)
+        """
+        crop_x, crop_y, crop_width, crop_height = crop_box
         
-        # Выполняем кроп
-        cropped = image.crop((crop_x, crop_y, crop_x + crop_width, crop_y + crop_height))
+        # Центр лица в исходном изображении
+        face_center_x = face_bbox[0] + face_bbox[2] // 2
+        face_center_y = face_bbox[1] + face_bbox[3] // 2
         
         # Вычисляем позицию лица в ОТНОСИТЕЛЬНЫХ координатах кропа (0.0 - 1.0)
         # Это нужно для сохранения позиции лица после ресайза
@@ -273,8 +905,8 @@ class FaceCropper:
             new_width = target_size
             new_height = target_size
         
-        # Ресайз до промежуточного размера
-        cropped = cropped.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        box = (crop_x, crop_y, crop_x + crop_width, crop_y + crop_height)
+        final_box = (0, 0, new_width, new_height)
         
         # Если нужно, обрезаем до точного квадрата, сохраняя позицию лица
         if new_width != new_height:
@@ -286,7 +918,7 @@ class FaceCropper:
                 
                 # Корректируем, если выходит за границы (но стараемся сохранить позицию лица)
                 left = max(0, min(left, new_width - target_size))
-                cropped = cropped.crop((left, 0, left + target_size, target_size))
+                final_box = (left, 0, left + target_size, target_size)
             else:
                 # Обрезаем по высоте (вертикальное) - сохраняем Y позицию лица
                 # После ресайза лицо находится на позиции: face_y_in_crop * new_height от верха (абсолютные координаты)
@@ -299,24 +931,172 @@ class FaceCropper:
                 
                 # Корректируем границы, стараясь сохранить позицию лица
                 top = max(0, min(top, new_height - target_size))
-                cropped = cropped.crop((0, top, target_size, top + target_size))
+                final_box = (0, top, target_size, top + target_size)
         
-        return cropped
+        return box, (new_width, new_height), final_box
     
-    def _fix_orientation(self, image: Image.Image) -> Image.Image:
-        """Исправляет ориентацию изображения на основе EXIF."""
+    def _needs_padding(
+        self,
+        face_bbox: Tuple[int, int, int, int],
+        image_size: Tuple[int, int],
+        k: float,
+        safety_margin: float
+    ) -> bool:
+        """Проверяет, что квадрат с лицом и запасом больше короткой стороны изображения."""
+        face_max_dim = max(face_bbox[2], face_bbox[3])
+        min_crop_size = int(face_max_dim * k * (1 + safety_margin))
+        return min_crop_size > min(image_size)
+    
+    def _padding_stage(
+        self,
+        image: Image.Image,
+        face_bbox: Tuple[int, int, int, int],
+        target_size: int,
+        k: float,
+        safety_margin: float,
+        padding: str,
+        orientation: int = 1
+    ) -> Image.Image:
+        """
+        Вписывает область вокруг лица в квадрат target_size с padding.
+        
+        По короткой стороне берется все изображение, по длинной - отрезок
+        длиной в требуемый размер кропа, центрированный по лицу. Результат
+        масштабируется длинной стороной до target_size, остаток заполняется
+        фоном выбранного типа.
+        """
+        x, y, face_w, face_h = face_bbox
+        img_w, img_h = self._oriented_size(image.size, orientation)
+        face_max_dim = max(face_w, face_h)
+        side = int(face_max_dim * k * (1 + safety_margin))
+        
+        if img_w >= img_h:
+            crop_w = min(side, img_w)
+            crop_x = max(0, min(x + face_w // 2 - crop_w // 2, img_w - crop_w))
+            box = (crop_x, 0, crop_x + crop_w, img_h)
+        else:
+            crop_h = min(side, img_h)
+            crop_y = max(0, min(y + face_h // 2 - crop_h // 2, img_h - crop_h))
+            box = (0, crop_y, img_w, crop_y + crop_h)
+        
+        region_w, region_h = box[2] - box[0], box[3] - box[1]
+        scale = target_size / max(region_w, region_h)
+        new_size = (
+            max(1, min(target_size, round(region_w * scale))),
+            max(1, min(target_size, round(region_h * scale)))
+        )
+        region = self._crop_oriented(image, box, orientation, new_size)
+        
+        background = image
+        if padding == "blur":
+            # Для размытого фона достаточно уменьшенной копии всего кадра
+            factor = max(1, min(image.size) // max(1, target_size // BLUR_DOWNSCALE))
+            background = image.reduce(factor) if factor > 1 else image
+            transpose = ORIENTATION_TRANSPOSE.get(orientation)
+            if transpose is not None:
+                background = background.transpose(transpose)
+        return self._add_padding(region, target_size, padding, background)
+    
+    def _get_orientation(self, image: Image.Image) -> int:
+        """Возвращает EXIF ориентацию (1-8), 1 если тега нет."""
         try:
-            exif = image._getexif()
-            if exif is not None:
-                orientation = exif.get(274)  # EXIF tag for orientation
-                if orientation == 3:
-                    image = image.rotate(180, expand=True)
-                elif orientation == 6:
-                    image = image.rotate(270, expand=True)
-                elif orientation == 8:
-                    image = image.rotate(90, expand=True)
-        except (AttributeError, KeyError, TypeError):
-            pass
+            orientation = int(image.getexif().get(EXIF_ORIENTATION, 1))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return 1
+        return orientation if orientation in ORIENTATION_TRANSPOSE else 1
+    
+    def _oriented_size(self, size: Tuple[int, int], orientation: int) -> Tuple[int, int]:
+        """Размер изображения после применения EXIF ориентации."""
+        width, height = size
+        return (height, width) if orientation >= 5 else (width, height)
+    
+    def _box_to_stored(
+        self,
+        box: Tuple[int, int, int, int],
+        stored_size: Tuple[int, int],
+        orientation: int
+    ) -> Tuple[int, int, int, int]:
+        """
+        Переводит box (left, top, right, bottom) из отображаемых координат
+        в координаты сохраненных пикселей.
+        """
+        width, height = stored_size
+        left, top, right, bottom = box
+        if orientation == 2:
+            return (width - right, top, width - left, bottom)
+        if orientation == 3:
+            return (width - right, height - bottom, width - left, height - top)
+        if orientation == 4:
+            return (left, height - bottom, right, height - top)
+        if orientation == 5:
+            return (top, left, bottom, right)
+        if orientation == 6:
+            return (top, height - right, bottom, height - left)
+        if orientation == 7:
+            return (width - bottom, height - right, width - top, height - left)
+        if orientation == 8:
+            return (width - bottom, left, width - top, right)
+        return box
+    
+    def _orient_array(self, array: np.ndarray, orientation: int) -> np.ndarray:
+        """Разворачивает массив сохраненных пикселей в отображаемую ориентацию."""
+        if orientation == 2:
+            array = array[:, ::-1]
+        elif orientation == 3:
+            array = array[::-1, ::-1]
+        elif orientation == 4:
+            array = array[::-1]
+        elif orientation == 5:
+            array = array.swapaxes(0, 1)
+        elif orientation == 6:
+            array = array[::-1].swapaxes(0, 1)
+        elif orientation == 7:
+            array = array[::-1, ::-1].swapaxes(0, 1)
+        elif orientation == 8:
+            array = array[:, ::-1].swapaxes(0, 1)
+        else:
+            return array
+        # detectMultiScale требует непрерывный буфер
+        return np.ascontiguousarray(array)
+    
+    def _to_gray(self, image: Image.Image) -> np.ndarray:
+        """Полутоновая копия изображения для детекции."""
+        if image.mode not in ('L', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        img_array = np.asarray(image)
+        if image.mode == 'L':
+            return img_array
+        if image.mode == 'RGBA':
+            return cv2.cvtColor(img_array, cv2.COLOR_RGBA2GRAY)
+        return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    
+    def _crop_oriented(
+        self,
+        image: Image.Image,
+        box: Tuple[int, int, int, int],
+        orientation: int = 1,
+        size: Optional[Tuple[int, int]] = None
+    ) -> Image.Image:
+        """
+        Вырезает box (в отображаемых координатах) из сохраненных пикселей.
+        
+        Если задан size, кроп и ресайз выполняются одной операцией, а
+        транспонируется уже уменьшенный результат.
+        """
+        stored_box = self._box_to_stored(box, image.size, orientation)
+        if size is None:
+            region = image.crop(stored_box)
+        else:
+            stored_size = self._oriented_size(size, orientation)
+            region = resize_image(image, stored_size, self.resampling, stored_box)
+        transpose = ORIENTATION_TRANSPOSE.get(orientation)
+        return region.transpose(transpose) if transpose is not None else region
+    
+    def _fix_orientation(self, image: Image.Image) -> Image.Image:
+        """Исправляет ориентацию изображения на основе EXIF (все 8 вариантов)."""
+        transpose = ORIENTATION_TRANSPOSE.get(self._get_orientation(image))
+        if transpose is not None:
+            image = image.transpose(transpose)
         return image
     
     def _center_crop(self, image: Image.Image, target_size: int) -> Image.Image:
@@ -326,11 +1106,28 @@ class FaceCropper:
         left = (width - size) // 2
         top = (height - size) // 2
         cropped = image.crop((left, top, left + size, top + size))
-        return cropped.resize((target_size, target_size), Image.Resampling.LANCZOS)
+        return resize_image(cropped, (target_size, target_size), self.resampling)
     
-    def _center_crop_orientation(self, image: Image.Image, target_size: int) -> Image.Image:
+    def _center_crop_orientation(
+        self,
+        image: Image.Image,
+        target_size: int,
+        orientation: int = 1
+    ) -> Image.Image:
         """Центральный кроп с сохранением ориентации, всегда квадрат (fallback)."""
-        width, height = image.size
+        return self._apply_plan(
+            image,
+            self._center_plan(self._oriented_size(image.size, orientation), target_size),
+            orientation
+        )
+    
+    def _center_plan(
+        self,
+        image_size: Tuple[int, int],
+        target_size: int
+    ) -> Tuple[Tuple[int, int, int, int], Tuple[int, int], Tuple[int, int, int, int]]:
+        """Геометрия _center_crop_orientation без пикселей (см. _square_plan)."""
+        width, height = image_size
         
         if height > width:
             # Вертикальное: кроп по высоте, сохраняем ширину
@@ -338,7 +1135,7 @@ class FaceCropper:
             crop_width = width
             left = 0
             top = (height - int(crop_height)) // 2
-            cropped = image.crop((left, top, left + crop_width, top + int(crop_height)))
+            box = (left, top, left + crop_width, top + int(crop_height))
             # Масштабируем по ширине до target_size
             scale = target_size / crop_width
             new_width = target_size
@@ -349,32 +1146,30 @@ class FaceCropper:
             crop_height = height
             left = (width - int(crop_width)) // 2
             top = 0
-            cropped = image.crop((left, top, left + int(crop_width), top + crop_height))
+            box = (left, top, left + int(crop_width), top + crop_height)
             # Масштабируем по высоте до target_size
             scale = target_size / crop_height
             new_height = target_size
             new_width = int(crop_width * scale)
         else:
             # Квадратное
-            cropped = image
+            box = (0, 0, width, height)
             new_width = target_size
             new_height = target_size
         
-        # Ресайз до промежуточного размера
-        cropped = cropped.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
         # Обрезаем до точного квадрата если нужно
+        final_box = (0, 0, new_width, new_height)
         if new_width != new_height:
             if new_width > new_height:
                 # Обрезаем по ширине
                 left = (new_width - target_size) // 2
-                cropped = cropped.crop((left, 0, left + target_size, target_size))
+                final_box = (left, 0, left + target_size, target_size)
             else:
                 # Обрезаем по высоте
                 top = (new_height - target_size) // 2
-                cropped = cropped.crop((0, top, target_size, top + target_size))
+                final_box = (0, top, target_size, top + target_size)
         
-        return cropped
+        return box, (new_width, new_height), final_box
     
     def _add_padding(
         self,
@@ -392,8 +1187,8 @@ class FaceCropper:
             # Размытие краев
             result = self._blur_padding(image, target_size, original_image)
         elif padding_type == "mirror":
-            # Зеркальное отражение
-            result = self._mirror_padding(image, target_size)
+            # Зеркальное отражение - уже содержит изображение в центре
+            return self._mirror_padding(image, target_size)
         else:
             # Просто черный/белый фон
             bg_color = (255, 255, 255) if image.mode == 'RGB' else 255
@@ -406,12 +1201,16 @@ class FaceCropper:
         return result
     
     def _get_average_color(self, image: Image.Image) -> Tuple[int, ...]:
-        """Вычисляет средний цвет изображения."""
-        img_array = np.array(image)
+        """Вычисляет средний цвет изображения по уменьшенной копии."""
+        # reduce() усредняет блоки пикселей, поэтому среднее почти не меняется,
+        # а считать его приходится по ~64x64 пикселям вместо всего кадра
+        factor = max(1, max(image.size) // 64)
+        thumb = image.reduce(factor) if factor > 1 else image
+        img_array = np.asarray(thumb)
         if len(img_array.shape) == 3:
-            return tuple(map(int, img_array.mean(axis=(0, 1))))
+            return tuple(map(int, np.rint(img_array.mean(axis=(0, 1)))))
         else:
-            return (int(img_array.mean()),)
+            return (int(np.rint(img_array.mean())),)
     
     def _blur_padding(
         self,
@@ -419,47 +1218,55 @@ class FaceCropper:
         target_size: int,
         original_image: Image.Image
     ) -> Image.Image:
-        """Добавляет размытый padding."""
-        # Увеличиваем оригинал и размываем
-        scale = target_size / max(image.size)
-        enlarged = original_image.resize(
-            (int(original_image.size[0] * scale), int(original_image.size[1] * scale)),
-            Image.Resampling.LANCZOS
+        """
+        Добавляет размытый padding.
+        
+        Фон - размытый оригинал, вписанный в квадрат с обрезкой краев.
+        Он строится в уменьшенном в BLUR_DOWNSCALE раз масштабе: оригинал
+        сразу уменьшается до малого размера, там же размывается, и только
+        результат растягивается до target_size. Размытие все равно убирает
+        высокие частоты, поэтому разница с построением в полном размере мала.
+        """
+        factor = max(1, min(BLUR_DOWNSCALE, target_size // 16))
+        small_target = max(1, target_size // factor)
+        
+        # Оригинал покрывает весь квадрат фона
+        scale = target_size / min(original_image.size) / factor
+        small = original_image.resize(
+            (max(1, int(original_image.size[0] * scale)),
+             max(1, int(original_image.size[1] * scale))),
+            Image.Resampling.BILINEAR,
+            reducing_gap=2.0
         )
         
-        # Кропаем до target_size
-        width, height = enlarged.size
-        left = (width - target_size) // 2
-        top = (height - target_size) // 2
-        blurred = enlarged.crop((left, top, left + target_size, top + target_size))
+        # Кропаем до малого квадрата
+        width, height = small.size
+        left = (width - small_target) // 2
+        top = (height - small_target) // 2
+        blurred = small.crop((left, top, left + small_target, top + small_target))
         
-        # Применяем размытие
-        blurred_array = np.array(blurred)
-        blurred_array = cv2.GaussianBlur(blurred_array, (51, 51), 0)
-        return Image.fromarray(blurred_array)
+        # Ядро 51x51 в полном размере соответствует sigma = 8 px
+        blurred_array = cv2.GaussianBlur(
+            np.asarray(blurred), (0, 0), BLUR_SIGMA / factor
+        )
+        enlarged = cv2.resize(
+            blurred_array, (target_size, target_size), interpolation=cv2.INTER_LINEAR
+        )
+        return Image.fromarray(enlarged)
     
     def _mirror_padding(self, image: Image.Image, target_size: int) -> Image.Image:
-        """Добавляет зеркальный padding."""
+        """Добавляет зеркальный padding одной операцией reflect-border."""
         width, height = image.size
-        result = Image.new(image.mode, (target_size, target_size))
+        left = (target_size - width) // 2
+        top = (target_size - height) // 2
+        right = target_size - width - left
+        bottom = target_size - height - top
         
-        # Копируем изображение в центр
-        paste_x = (target_size - width) // 2
-        paste_y = (target_size - height) // 2
-        result.paste(image, (paste_x, paste_y))
-        
-        # Зеркалим края
-        if paste_x > 0:
-            left_edge = image.crop((0, 0, min(10, width), height))
-            left_edge = left_edge.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
-            for x in range(0, paste_x, left_edge.size[0]):
-                result.paste(left_edge, (x, paste_y))
-        
-        if paste_y > 0:
-            top_edge = image.crop((0, 0, width, min(10, height)))
-            top_edge = top_edge.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
-            for y in range(0, paste_y, top_edge.size[1]):
-                result.paste(top_edge, (paste_x, y))
-        
-        return result
-
+        if image.mode not in ('L', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        img_array = np.asarray(image)
+        # BORDER_REFLECT корректно отражает и рамки шире самого изображения
+        result = cv2.copyMakeBorder(
+            img_array, top, bottom, left, right, cv2.BORDER_REFLECT
+        )
+        return Image.fromarray(result)
@@ -0,0 +1,127 @@
+"""OpenCV бэкенд: декодирование, кроп и кодирование без объектов PIL."""
+
+import time
+from pathlib import Path
+from typing import Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .core import FaceCropper
+
+
+BACKENDS = ("pil", "opencv")
+# Качество JPEG - как у PIL пути (write_image)
+JPEG_QUALITY = 95
+
+# Декодирование сразу в уменьшенном виде (для JPEG - масштабированием DCT)
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+_ENCODE_PARAMS = {
+    'JPEG': ('.jpg', [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]),
+    'PNG': ('.png', []),
+    'WEBP': ('.webp', []),
+}
+
+
+def read_array(path: Path, scale: int = 1) -> np.ndarray:
+    """
+    Декодирует файл в BGR массив прямо из отображения файла в память.
+
+    IMREAD_COLOR сам применяет EXIF ориентацию, поэтому дальше массив
+    считается в ориентации 1. Альфа-канал отбрасывается. scale (1, 2, 4
+    или 8) уменьшает кадр при декодировании.
+
+    Raises:
+        ValueError: Если файл не удалось декодировать
+    """
+    try:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    except ValueError:  # пустой файл нельзя отобразить в память
+        buffer = np.empty(0, dtype=np.uint8)
+    array = cv2.imdecode(buffer, _REDUCED_FLAGS[scale]) if buffer.size else None
+    del buffer
+    if array is None:
+        raise ValueError(f"не удалось декодировать {Path(path).name}")
+    return array
+
+
+def encode_array(array: np.ndarray, output_format: str) -> bytes:
+    """Кодирует BGR массив в JPEG, PNG или WEBP."""
+    extension, params = _ENCODE_PARAMS[output_format]
+    ok, encoded = cv2.imencode(extension, array, params)
+    if not ok:
+        raise ValueError(f"не удалось закодировать в {output_format}")
+    return encoded.tobytes()
+
+
+def write_array(array: np.ndarray, output_path: Path):
+    """Сохраняет результат, определяя формат по расширению (как save_image)."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    suffix = output_path.suffix.lower()
+    output_format = {'.png': 'PNG', '.webp': 'WEBP'}.get(suffix, 'JPEG')
+    output_path.write_bytes(encode_array(array, output_format))
+
+
+def _apply_plan_array(
+    array: np.ndarray,
+    plan: Tuple[Tuple[int, int, int, int], Tuple[int, int], Tuple[int, int, int, int]]
+) -> np.ndarray:
+    """
+    Выполняет план FaceCropper._square_plan/_center_plan на массиве.
+
+    Кроп - срез без копирования, копируется только результат ресайза.
+    """
+    (left, top, right, bottom), (new_w, new_h), final_box = plan
+    region = array[top:bottom, left:right]
+    if (new_w, new_h) != (right - left, bottom - top):
+        # INTER_AREA при уменьшении ближе всего к LANCZOS PIL и не дает алиасинга
+        shrink = new_w < right - left
+        interpolation = cv2.INTER_AREA if shrink else cv2.INTER_LANCZOS4
+        region = cv2.resize(region, (new_w, new_h), interpolation=interpolation)
+    final_left, final_top, final_right, final_bottom = final_box
+    return np.ascontiguousarray(region[final_top:final_bottom, final_left:final_right])
+
+
+def crop_array(
+    cropper: FaceCropper,
+    array: np.ndarray,
+    target_size: int = 1024,
+    k: float = 2.5,
+    safety_margin: float = 0.15,
+    padding: str = "none"
+) -> np.ndarray:
+    """
+    crop_to_square_with_face для BGR массива из read_array.
+
+    Геометрия и детекция общие с PIL путем, поэтому результат совпадает с
+    ним с точностью до фильтра ресайза. Кадры, которым действительно нужен
+    padding, достраиваются PIL путем (фон рисуется через PIL).
+    """
+    img_h, img_w = array.shape[:2]
+    if not cropper.face_can_change_crop((img_w, img_h), target_size, padding):
+        cropper._count('detect_skipped')
+        return _apply_plan_array(array, cropper._center_plan((img_w, img_h), target_size))
+    cropper._count('detect_run')
+
+    start = time.perf_counter()
+    gray = cv2.cvtColor(array, cv2.COLOR_BGR2GRAY)
+    face_bbox = cropper._detect_or_reuse(gray, 1, target_size, k)
+    cropper._count('detect_seconds', time.perf_counter() - start)
+    if face_bbox is None:
+        cropper._count('center_fallback')
+        return _apply_plan_array(array, cropper._center_plan((img_w, img_h), target_size))
+
+    if padding != "none" and cropper._needs_padding(face_bbox, (img_w, img_h), k, safety_margin):
+        image = Image.fromarray(cv2.cvtColor(array, cv2.COLOR_BGR2RGB))
+        padded = cropper._padding_stage(image, face_bbox, target_size, k, safety_margin, padding)
+        return cv2.cvtColor(np.asarray(padded.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    crop_box = cropper.calculate_orientation_crop(face_bbox, (img_w, img_h), k, safety_margin)
+    return _apply_plan_array(array, cropper._square_plan(face_bbox, crop_box, target_size))
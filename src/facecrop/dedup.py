@@ -0,0 +1,110 @@
+"""Индекс перцептивных хешей для повторного использования детекций на почти-дубликатах."""
+
+import threading
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# Максимальное расстояние Хэмминга между 64-битными dHash почти-дубликатов
+# (пересохранения, другое качество JPEG, уменьшенные копии)
+DEDUP_MAX_DISTANCE = 3
+# Допустимое относительное расхождение пропорций кадров
+DEDUP_ASPECT_TOLERANCE = 0.01
+# Сторона промежуточной миниатюры: сначала кадр уменьшается до нее, потом
+# разворачивается по EXIF и сжимается до 9x8 для dHash
+DEDUP_THUMB_SIZE = 32
+
+
+def dhash(thumb: np.ndarray) -> int:
+    """
+    64-битный difference hash полутоновой миниатюры.
+
+    Каждый бит - сравнение яркости соседних пикселей по горизонтали на
+    копии 9x8, поэтому хеш устойчив к масштабу, сжатию и яркости.
+    """
+    small = cv2.resize(thumb, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+class DetectionIndex:
+    """
+    Потокобезопасный индекс: перцептивный хеш кадра -> нормализованный bbox лица.
+
+    bbox хранится в долях отображаемого кадра (x, y, w, h), поэтому
+    переносится на копию любого разрешения с теми же пропорциями. Хранятся и
+    промахи детекции (None): дубликат кадра без лица тоже не детектируется.
+    Один индекс можно разделить между несколькими FaceCropper.
+    """
+
+    def __init__(self, max_distance: int = DEDUP_MAX_DISTANCE):
+        """
+        Args:
+            max_distance: Максимальное расстояние Хэмминга (0..64) между
+                хешами, при котором кадры считаются почти-дубликатами
+        """
+        if not 0 <= max_distance <= 64:
+            raise ValueError("max_distance должен быть в диапазоне 0..64")
+        self.max_distance = max_distance
+        # Буферы растут удвоением, занято первые _count элементов
+        self._hashes = np.zeros(64, dtype=np.uint64)
+        self._aspects = np.zeros(64, dtype=np.float64)
+        self._boxes = []
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getstate__(self):
+        # Копия для другого процесса (--timeout/--memory-limit) - без блокировки
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def lookup(
+        self,
+        key: int,
+        aspect: float
+    ) -> Tuple[bool, Optional[Tuple[float, float, float, float]]]:
+        """
+        Ищет ближайший почти-дубликат.
+
+        Returns:
+            Tuple (найден, нормализованный bbox или None для кадра без лица)
+        """
+        with self._lock:
+            if not self._count:
+                return False, None
+            hashes = self._hashes[:self._count]
+            aspects = self._aspects[:self._count]
+            xor = np.bitwise_xor(hashes, np.uint64(key))
+            distances = np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+            same_aspect = np.abs(aspects / aspect - 1) <= DEDUP_ASPECT_TOLERANCE
+            distances = np.where(same_aspect, distances, 65)
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                return False, None
+            return True, self._boxes[best]
+
+    def add(
+        self,
+        key: int,
+        aspect: float,
+        box: Optional[Tuple[float, float, float, float]]
+    ):
+        """Добавляет результат детекции кадра."""
+        with self._lock:
+            if self._count == len(self._hashes):
+                self._hashes = np.resize(self._hashes, 2 * self._count)
+                self._aspects = np.resize(self._aspects, 2 * self._count)
+            self._hashes[self._count] = key
+            self._aspects[self._count] = aspect
+            self._boxes.append(box)
+            self._count += 1
@@ -0,0 +1,130 @@
+"""Предварительный просмотр пакета по заголовкам: размеры, ориентация, оценка стоимости."""
+
+import heapq
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from .core import EXIF_ORIENTATION, ORIENTATION_TRANSPOSE
+
+
+# Модель времени обработки одного изображения (кроп до 1024, 1 shared CPU):
+# постоянная часть (детекция идет на уменьшенном кадре) + декодирование и
+# ресайз пропорционально мегапикселям. У квадратных кадров детекция
+# пропускается (FaceCropper.face_can_change_crop), постоянной части нет.
+SECONDS_PER_IMAGE = 0.15
+SECONDS_PER_MEGAPIXEL = 0.02
+# Декодирование, секунды на мегапиксель по формату; неизвестные - как PNG
+DECODE_SECONDS_PER_MEGAPIXEL = {
+    'JPEG': 0.007,
+    'WEBP': 0.024,
+    'PNG': 0.036,
+}
+
+
+class ImageInfo:
+    """Сведения об изображении из заголовка, без декодирования пикселей."""
+
+    def __init__(
+        self,
+        path: Path,
+        size: Tuple[int, int] = (0, 0),
+        image_format: Optional[str] = None,
+        orientation: int = 1,
+        error: Optional[str] = None
+    ):
+        self.path = Path(path)
+        self.size = size
+        self.format = image_format
+        self.orientation = orientation
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def megapixels(self) -> float:
+        return self.size[0] * self.size[1] / 1e6
+
+    @property
+    def cost(self) -> float:
+        """Оценка времени обработки в секундах (0 для нечитаемых файлов)."""
+        if not self.ok:
+            return 0.0
+        decode = DECODE_SECONDS_PER_MEGAPIXEL.get(self.format, DECODE_SECONDS_PER_MEGAPIXEL['PNG'])
+        detect = SECONDS_PER_IMAGE if self.size[0] != self.size[1] else 0.0
+        return detect + self.megapixels * (decode + SECONDS_PER_MEGAPIXEL)
+
+
+def scan_image(path: Path) -> ImageInfo:
+    """
+    Читает заголовок и EXIF. Image.open не декодирует пиксели, поэтому
+    файл любого размера читается за доли миллисекунды. Файлы, у которых
+    не читается заголовок, возвращаются с error.
+    """
+    try:
+        with Image.open(path) as image:
+            try:
+                orientation = int(image.getexif().get(EXIF_ORIENTATION, 1))
+            except (AttributeError, KeyError, TypeError, ValueError, SyntaxError):
+                orientation = 1
+            if orientation not in ORIENTATION_TRANSPOSE:
+                orientation = 1
+            return ImageInfo(path, image.size, image.format, orientation)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        return ImageInfo(path, error=str(e) or type(e).__name__)
+
+
+def scan_jobs(jobs: Iterable[Tuple[Path, Path]]) -> List[ImageInfo]:
+    """ImageInfo для входного файла каждого задания (input, output)."""
+    return [scan_image(input_path) for input_path, _ in jobs]
+
+
+def order_by_cost(
+    jobs: List[Tuple[Path, Path]],
+    infos: List[ImageInfo]
+) -> List[Tuple[Path, Path]]:
+    """
+    Сначала самые дорогие задания: при нескольких потоках большой кадр,
+    взятый последним, задерживает окончание всего прогона, а мелкие в
+    конце выравнивают загрузку потоков. Порядок равных по стоимости
+    заданий сохраняется.
+    """
+    order = sorted(range(len(jobs)), key=lambda i: -infos[i].cost)
+    return [jobs[i] for i in order]
+
+
+def expected_runtime(costs: Iterable[float], workers: int = 1) -> float:
+    """
+    Ожидаемое время прогона: задания в заданном порядке отдаются первому
+    освободившемуся из workers потоков.
+    """
+    finish = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heappush(finish, heapq.heappop(finish) + cost)
+    return max(finish)
+
+
+def format_inventory(infos: List[ImageInfo], workers: int = 1) -> str:
+    """Сводка инвентаризации для печати перед прогоном."""
+    readable = [info for info in infos if info.ok]
+    formats = {}
+    rotated = 0
+    for info in readable:
+        formats[info.format] = formats.get(info.format, 0) + 1
+        rotated += info.orientation != 1
+    costs = sorted((info.cost for info in readable), reverse=True)
+    lines = [
+        f"Инвентаризация: {len(readable)} изображений, "
+        f"{sum(info.megapixels for info in readable):.0f} Мп, "
+        + ", ".join(f"{name} {count}" for name, count in sorted(formats.items(), key=str))
+        + (f"; с EXIF поворотом: {rotated}" if rotated else ""),
+        f"Ожидаемое время: ~{expected_runtime(costs, workers):.0f} с ({workers} потоков)",
+    ]
+    unreadable = [info for info in infos if not info.ok]
+    if unreadable:
+        lines.append(f"Нечитаемых файлов: {len(unreadable)}")
+        lines.extend(f"  {info.path}: {info.error}" for info in unreadable)
+    return "\n".join(lines)
@@ -0,0 +1,356 @@
+"""Изолированная обработка: процесс-воркер с лимитами времени и памяти на изображение."""
+
+import multiprocessing
+import os
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .core import FaceCropper
+from .cv_backend import crop_array, read_array, write_array
+
+try:
+    import resource  # нет на Windows
+except ImportError:
+    resource = None
+
+
+# Во сколько раз уменьшается кадр при повторной попытке
+REDUCED_SCALE = 4
+# Время на запуск процесса-воркера (импорт OpenCV, загрузка каскадов)
+STARTUP_TIMEOUT = 60.0
+
+# Исходы попытки
+OK = "ok"
+ERROR = "error"  # битый файл и т.п. - повтор не поможет
+TIMEOUT = "timeout"
+MEMORY = "memory"
+CRASHED = "crashed"
+# Превышение лимитов: повтор на уменьшенном кадре
+LIMIT_EXCEEDED = (TIMEOUT, MEMORY, CRASHED)
+
+# Начало файла JPEG (SOI и первый маркер)
+_JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+def decodes_reduced(path: Path) -> bool:
+    """
+    Декодируется ли файл сразу уменьшенным (только JPEG: масштабирование DCT).
+
+    PNG, WEBP и остальные форматы и Pillow, и OpenCV декодируют целиком и
+    только потом уменьшают, так что повтор уменьшенным стоит столько же
+    памяти и времени. Формат определяется по первым байтам, без разбора
+    заголовка в основном процессе.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(_JPEG_MAGIC)) == _JPEG_MAGIC
+    except OSError:
+        return False
+
+
+def partial_path(output_path: Path) -> Path:
+    """Временный файл, в который пишется результат до переименования в output_path."""
+    return output_path.with_name(f".{output_path.stem}.part{output_path.suffix}")
+
+
+def load_reduced(path: Path, scale: int = 1) -> Image.Image:
+    """
+    Декодирует изображение, уменьшенное в scale раз.
+
+    JPEG сразу декодируется в уменьшенном виде (draft, масштабирование DCT),
+    память и время падают примерно в scale² раз. Остальные форматы
+    декодируются целиком и затем уменьшаются reduce (см. decodes_reduced).
+    """
+    image = Image.open(path)
+    if scale > 1:
+        width, height = image.width // scale or 1, image.height // scale or 1
+        image.draft(None, (width, height))
+    image.load()
+    if scale > 1 and image.width >= 2 * width:
+        image = image.reduce(image.width // width)
+    return image
+
+
+def _is_memory_error(error: BaseException) -> bool:
+    """MemoryError или отказ выделить память внутри OpenCV/Pillow."""
+    if isinstance(error, MemoryError):
+        return True
+    text = str(error).lower()
+    return any(marker in text for marker in ("insufficient memory", "failed to allocate", "cannot allocate"))
+
+
+def _limit_memory(limit_bytes: Optional[int]):
+    """
+    Ограничивает адресное пространство процесса: текущее + limit_bytes.
+
+    Отсчет от текущего размера, чтобы лимит означал память на одно
+    изображение, а не вместе с OpenCV и numpy. Без модуля resource (Windows)
+    лимит не ставится.
+    """
+    if resource is None or not limit_bytes:
+        return
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        current = 0
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = current + limit_bytes
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def _crop_file(
+    cropper: FaceCropper,
+    save: Callable[[Image.Image, Path], None],
+    backend: str,
+    input_path: Path,
+    output_path: Path,
+    target_size: int,
+    k: float,
+    padding: str,
+    scale: int
+):
+    """
+    Кропает файл; результат пишется в partial_path и переименовывается, так
+    что убитая посреди записи попытка не оставляет битый output_path.
+    """
+    partial = partial_path(output_path)
+    try:
+        if backend == "opencv":
+            array = read_array(input_path, scale)
+            write_array(crop_array(cropper, array, target_size, k, padding=padding), partial)
+        else:
+            image = load_reduced(input_path, scale)
+            save(cropper.crop_to_square_with_face(image, target_size, k, padding=padding), partial)
+        os.replace(partial, output_path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+
+def _serve(conn, cropper_options: Dict[str, Any], backend: str, memory_limit: Optional[int]):
+    """Цикл процесса-воркера: задание из conn → (исход, ошибка, прирост stats)."""
+    # Все импорты - до лимита: под ним не отобразятся разделяемые библиотеки
+    from .main import save_image
+    cropper = FaceCropper(**cropper_options)
+    _limit_memory(memory_limit)
+    conn.send(OK)
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        before = cropper.stats.copy()
+        try:
+            _crop_file(cropper, save_image, backend, *message)
+            status, error = OK, None
+        except Exception as e:
+            status = MEMORY if _is_memory_error(e) else ERROR
+            error = str(e) or type(e).__name__
+        conn.send((status, error, dict(cropper.stats - before)))
+    conn.close()
+
+
+class IsolatedResult:
+    """Результат обработки одного задания в IsolatedWorker."""
+
+    def __init__(
+        self,
+        job: Tuple[Path, Path],
+        status: str,
+        error: Optional[str] = None,
+        limit: Optional[str] = None,
+        seconds: float = 0.0,
+        stats: Optional[Counter] = None
+    ):
+        self.job = job
+        self.status = status
+        self.error = error
+        # Какой лимит был превышен на полном разрешении (None - не был)
+        self.limit = limit
+        self.seconds = seconds
+        self.stats = stats or Counter()
+
+    @property
+    def ok(self) -> bool:
+        return self.status == OK
+
+
+class IsolatedWorker:
+    """
+    Процесс-воркер для кропа с лимитом времени и памяти на изображение.
+
+    Процесс запускается один раз (spawn) и переиспользуется, пока
+    изображения укладываются в лимиты. Зависшее изображение (Image.open,
+    detectMultiScale) убивается вместе с процессом по таймауту, при
+    нехватке памяти или падении процесс тоже перезапускается. Такой JPEG
+    повторяется уменьшенным в REDUCED_SCALE раз, затем считается ошибкой;
+    остальные форматы сразу считаются ошибкой (см. decodes_reduced).
+    Индекс почти-дубликатов (dedup) в каждом процессе свой.
+    """
+
+    def __init__(
+        self,
+        cropper_options: Optional[Dict[str, Any]] = None,
+        backend: str = "pil",
+        timeout: Optional[float] = None,
+        memory_limit: Optional[int] = None
+    ):
+        """
+        Args:
+            cropper_options: Параметры FaceCropper процесса
+            backend: "pil" или "opencv"
+            timeout: Лимит времени на попытку, секунды (None - без лимита)
+            memory_limit: Лимит памяти на изображение, байты (None - без лимита)
+        """
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout должен быть > 0")
+        if memory_limit is not None and memory_limit <= 0:
+            raise ValueError("memory_limit должен быть > 0")
+        self.cropper_options = dict(cropper_options or {})
+        self.backend = backend
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.restarts = 0
+        self._process = None
+        self._conn = None
+
+    def _start(self):
+        context = multiprocessing.get_context('spawn')
+        conn, child_conn = context.Pipe()
+        process = context.Process(
+            target=_serve,
+            args=(child_conn, self.cropper_options, self.backend, self.memory_limit),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        try:
+            ready = conn.poll(STARTUP_TIMEOUT) and conn.recv() == OK
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            process.kill()
+            process.join()
+            raise RuntimeError(f"процесс-воркер не запустился (код {process.exitcode})")
+        self._process, self._conn = process, conn
+
+    def _kill(self):
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+
+    def stop(self):
+        """Убивает процесс; следующее задание запустит новый."""
+        if self._process is not None:
+            self._kill()
+            self.restarts += 1
+
+    def close(self):
+        """Штатно завершает процесс."""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(1.0)
+        self._kill()
+
+    def attempt(
+        self,
+        input_path: Path,
+        output_path: Path,
+        target_size: int,
+        k: float,
+        padding: str = "none",
+        scale: int = 1
+    ) -> Tuple[str, Optional[str], Counter]:
+        """
+        Одна попытка. Returns: (исход, текст ошибки, прирост FaceCropper.stats).
+
+        Raises:
+            RuntimeError: Если процесс-воркер не запустился
+        """
+        if self._process is None:
+            self._start()
+        try:
+            # Процесс мог умереть между заданиями - тогда падает уже send
+            self._conn.send((input_path, output_path, target_size, k, padding, scale))
+            if not self._conn.poll(self.timeout):
+                self.stop()
+                status, error, stats = TIMEOUT, f"не уложилось в {self.timeout:g} с", {}
+            else:
+                status, error, stats = self._conn.recv()
+        except (EOFError, OSError):
+            self._process.join(1.0)
+            code = self._process.exitcode
+            self.stop()
+            status, error, stats = CRASHED, f"процесс-воркер завершился (код {code})", {}
+        if status == MEMORY:
+            # После отказа в памяти состояние процесса ненадежно
+            self.stop()
+        if status in LIMIT_EXCEEDED:
+            # Процесс могли убить посреди записи результата
+            partial_path(output_path).unlink(missing_ok=True)
+        return status, error, Counter(stats)
+
+    def process(
+        self,
+        input_path: Path,
+        output_path: Path,
+        target_size: int,
+        k: float,
+        padding: str = "none"
+    ) -> IsolatedResult:
+        """
+        Обрабатывает изображение: полное разрешение, при превышении лимитов
+        JPEG - уменьшенное.
+
+        Raises:
+            RuntimeError: Если процесс-воркер не запустился
+        """
+        start = time.perf_counter()
+        status, error, stats = self.attempt(input_path, output_path, target_size, k, padding)
+        limit = None
+        if status in LIMIT_EXCEEDED and not decodes_reduced(input_path):
+            limit = status
+            error = f"{error}; без повтора: формат декодируется только целиком"
+        elif status in LIMIT_EXCEEDED:
+            limit = status
+            status, reduced_error, more = self.attempt(
+                input_path, output_path, target_size, k, padding, REDUCED_SCALE
+            )
+            stats += more
+            error = None if status == OK else f"{error}; уменьшенный в {REDUCED_SCALE} раза: {reduced_error}"
+        return IsolatedResult(
+            (input_path, output_path), status, error, limit, time.perf_counter() - start, stats
+        )
+
+
+def format_isolation(results: List[IsolatedResult], wall_time: float) -> str:
+    """Сводка изолированного прогона: задержки и превышения лимитов."""
+    latencies = sorted(result.seconds for result in results)
+    parts = [f"Изоляция: {len(results)} за {wall_time:.2f}с"]
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+        parts.append(f"задержка p50 {statistics.median(latencies):.2f}с, p99 {p99:.2f}с, макс {latencies[-1]:.2f}с")
+    limits = Counter(result.limit for result in results if result.limit)
+    names = {TIMEOUT: "таймаут", MEMORY: "память", CRASHED: "падение"}
+    if limits:
+        recovered = sum(1 for result in results if result.limit and result.ok)
+        parts.append(
+            "превышения лимитов: " + ", ".join(f"{names[key]} {limits[key]}" for key in names if limits[key])
+            + f" (обработано уменьшенными: {recovered})"
+        )
+    return "; ".join(parts)
@@ -1,20 +1,44 @@
 """CLI интерфейс для FaceCrop."""
 
 import argparse
+import io
+import statistics
 import sys
 import os
+import threading
+import time
+from collections import Counter
 from pathlib import Path
 from PIL import Image
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import cv2
 import numpy as np
 
-from .core import FaceCropper
+from .core import (
+    FaceCropper, DEFAULT_RESAMPLING, DEFAULT_ROI, DEFAULT_TIERS, DETECTOR_TIERS, RESAMPLING_POLICIES
+)
+from .broker import JobQueue, LeaseKeeper, LEASE_SECONDS, MAX_ATTEMPTS
+from .cv_backend import BACKENDS, crop_array, read_array, write_array
+from .dedup import DetectionIndex, DEDUP_MAX_DISTANCE
+from .inventory import format_inventory, order_by_cost, scan_jobs
+from .isolate import CRASHED, IsolatedResult, IsolatedWorker, format_isolation
+from .pipeline import Pipeline, PipelineResult
+from .shard import RunReport, merge_reports, parse_shard, select_shard
+from .stream import read_frames, read_paths, write_frame
+from .threads import available_cpus, configure_threads
+from .watch import FolderWatcher, SETTLE_SECONDS
+from .video import (
+    VideoCropper, VideoWriter, VIDEO_EXTENSIONS, KEYFRAME_INTERVAL, CROP_SMOOTHING,
+    is_video_file, read_video, sort_frames, video_fps
+)
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
 
 
 def get_image_files(path: Path, recursive: bool = False) -> List[Path]:
     """Получает список изображений из пути."""
-    extensions = {'.jpg', '.jpeg', '.png', '.webp', '.JPG', '.JPEG', '.PNG', '.WEBP'}
+    extensions = IMAGE_EXTENSIONS | {ext.upper() for ext in IMAGE_EXTENSIONS}
     
     if path.is_file():
         if path.suffix.lower() in extensions:
@@ -31,6 +55,95 @@ def get_image_files(path: Path, recursive: bool = False) -> List[Path]:
     return []
 
 
+def output_path_for(input_file: Path, input_path: Path, output_dir: Path) -> Path:
+    """Выходной путь: структура папок относительно input_path и суффикс _square."""
+    relative_path = input_file.relative_to(input_path) if input_path.is_dir() else input_file.name
+    output_file = output_dir / relative_path
+    return output_file.parent / f"{output_file.stem}_square{output_file.suffix}"
+
+
+def needs_processing(input_file: Path, output_file: Path) -> bool:
+    """Результата нет или он старше исходника."""
+    try:
+        return output_file.stat().st_mtime_ns < input_file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return True
+
+
+def load_image(input_path: Path) -> Image.Image:
+    """Открывает и сразу декодирует изображение (Image.open ленивый)."""
+    image = Image.open(input_path)
+    image.load()
+    return image
+
+
+def save_image(image: Image.Image, output_path: Path):
+    """Сохраняет результат, определяя формат по расширению."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    # Определяем формат
+    output_format = 'JPEG'
+    if output_path.suffix.lower() in ['.png', '.PNG']:
+        output_format = 'PNG'
+    elif output_path.suffix.lower() in ['.webp', '.WEBP']:
+        output_format = 'WEBP'
+    
+    write_image(image, output_path, output_format)
+
+
+def write_image(image: Image.Image, fp, output_format: str):
+    """Записывает изображение в файл или поток в формате JPEG, PNG или WEBP."""
+    if output_format == 'JPEG':
+        image = image.convert('RGB')
+        image.save(fp, output_format, quality=95)
+    else:
+        image.save(fp, output_format)
+
+
+def env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    """Целое из переменной окружения или default, если она не задана."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} должна быть целым числом, получено {value!r}")
+
+
+def parse_roi(value: str) -> Tuple[float, float, float, float]:
+    """Разбирает --roi вида "left,top,right,bottom" в долях кадра."""
+    try:
+        roi = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"некорректная область: {value}")
+    if len(roi) != 4:
+        raise argparse.ArgumentTypeError("ожидается 4 числа: left,top,right,bottom")
+    left, top, right, bottom = roi
+    if not (0 <= left < right <= 1 and 0 <= top < bottom <= 1):
+        raise argparse.ArgumentTypeError("границы должны быть в долях 0..1, left < right, top < bottom")
+    return roi
+
+
+def parse_tiers(value: str) -> Tuple[str, ...]:
+    """Разбирает --tiers вида "fast,default,alt"."""
+    tiers = tuple(part.strip() for part in value.split(',') if part.strip())
+    unknown = [tier for tier in tiers if tier not in DETECTOR_TIERS]
+    if not tiers or unknown:
+        raise argparse.ArgumentTypeError(
+            f"неизвестные ступени {unknown}; доступны: {','.join(DETECTOR_TIERS)}"
+        )
+    return tiers
+
+
+def shard_arg(value: str) -> Tuple[int, int]:
+    """Разбирает --shard вида "i/N"."""
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def process_image(
     input_path: Path,
     output_path: Path,
@@ -39,9 +152,14 @@ def process_image(
     k: float,
     padding: str,
     dry_run: bool,
-    visualize: bool
+    visualize: bool,
+    on_error: Optional[Callable[[Exception], None]] = None
 ) -> bool:
-    """Обрабатывает одно изображение."""
+    """
+    Обрабатывает одно изображение.
+    
+    on_error вызывается с исключением, если обработка не удалась.
+    """
     try:
         # Загружаем изображение
         image = Image.open(input_path)
@@ -56,42 +174,583 @@ def process_image(
         )
         
         # Сохраняем
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Определяем формат
-        output_format = 'JPEG'
-        if output_path.suffix.lower() in ['.png', '.PNG']:
-            output_format = 'PNG'
-        elif output_path.suffix.lower() in ['.webp', '.WEBP']:
-            output_format = 'WEBP'
-        
-        if output_format == 'JPEG':
-            cropped = cropped.convert('RGB')
-            cropped.save(output_path, output_format, quality=95)
-        else:
-            cropped.save(output_path, output_format)
+        save_image(cropped, output_path)
         
         if visualize:
             # Создаем визуализацию с рамками
             vis_path = output_path.parent / f"{output_path.stem}_vis{output_path.suffix}"
-            create_visualization(input_path, vis_path, cropper, target_size, k)
+            create_visualization(input_path, vis_path, cropper, target_size, k, padding)
         
         return True
         
     except Exception as e:
         print(f"Ошибка при обработке {input_path.name}: {e}", file=sys.stderr)
+        if on_error is not None:
+            on_error(e)
         return False
 
 
+def prescan_jobs(
+    jobs: List[Tuple[Path, Path]],
+    workers: int = 1
+) -> Tuple[List[Tuple[Path, Path]], List[Path]]:
+    """
+    Читает заголовки всех входных файлов и печатает сводку с ожидаемым
+    временем.
+    
+    Returns:
+        Tuple (читаемые задания, самые дорогие первыми; нечитаемые файлы)
+    """
+    infos = scan_jobs(jobs)
+    print(format_inventory(infos, workers))
+    readable = [(job, info) for job, info in zip(jobs, infos) if info.ok]
+    ordered = order_by_cost([job for job, _ in readable], [info for _, info in readable])
+    return ordered, [info.path for info in infos if not info.ok]
+
+
+def run_pipelined(
+    jobs: List[Tuple[Path, Path]],
+    target_size: int,
+    k: float,
+    padding: str,
+    visualize: bool,
+    workers: int = 1,
+    queue_size: int = 4,
+    cropper_options: Optional[Dict[str, Any]] = None,
+    report: Optional[RunReport] = None,
+    backend: str = "pil"
+) -> int:
+    """
+    Обрабатывает задания (input, output) конвейером reader → compute → writer.
+    
+    cropper_options передаются в FaceCropper каждого потока вычислений.
+    Если передан report, в него записываются итоги прогона. backend "opencv"
+    декодирует, кропает и кодирует массивы OpenCV без объектов PIL.
+    
+    Returns:
+        Количество успешно обработанных изображений
+    """
+    total = len(jobs)
+    done = [0]
+    croppers = []
+    
+    def compute_factory():
+        # Собственный детектор на каждый поток вычислений
+        cropper = FaceCropper(**(cropper_options or {}))
+        croppers.append(cropper)
+        
+        def compute(job, image):
+            input_path, output_path = job
+            crop = crop_array if backend == "opencv" else FaceCropper.crop_to_square_with_face
+            cropped = crop(cropper, image, target_size=target_size, k=k, padding=padding)
+            if visualize:
+                vis_path = output_path.parent / f"{output_path.stem}_vis{output_path.suffix}"
+                output_path.parent.mkdir(parents=True, exist_ok=True)
+                create_visualization(input_path, vis_path, cropper, target_size, k, padding)
+            return cropped
+        
+        return compute
+    
+    def on_result(result: PipelineResult):
+        done[0] += 1
+        input_path = result.job[0]
+        print(f"[{done[0]}/{total}] Обработка: {input_path.name}")
+        if not result.ok:
+            print(f"Ошибка при обработке {input_path.name}: {result.error}", file=sys.stderr)
+    
+    read, write = (read_array, write_array) if backend == "opencv" else (load_image, save_image)
+    pipeline = Pipeline(
+        read=lambda job: read(job[0]),
+        compute_factory=compute_factory,
+        write=lambda job, image: write(image, job[1]),
+        queue_size=queue_size,
+        workers=workers
+    )
+    results = pipeline.run(jobs, on_result=on_result)
+    stats = sum((c.stats for c in croppers), Counter())
+    print(pipeline.summary())
+    print_stats(stats)
+    success_count = sum(1 for r in results if r.ok)
+    if report is not None:
+        report.total = total
+        report.success = success_count
+        report.failed = sorted(str(r.job[0]) for r in results if not r.ok)
+        report.stats = stats
+        report.wall_time = pipeline.wall_time
+    return success_count
+
+
+def run_isolated(
+    jobs: List[Tuple[Path, Path]],
+    target_size: int,
+    k: float,
+    padding: str,
+    workers: int = 1,
+    timeout: Optional[float] = None,
+    memory_limit: Optional[int] = None,
+    cropper_options: Optional[Dict[str, Any]] = None,
+    report: Optional[RunReport] = None,
+    backend: str = "pil"
+) -> int:
+    """
+    Обрабатывает задания в workers процессах-воркерах (IsolatedWorker) с
+    лимитом времени и памяти на изображение.
+    
+    Зависшее или раздувшееся изображение не останавливает прогон: его
+    процесс убивается, изображение повторяется уменьшенным, затем
+    записывается в ошибки. В конце печатаются задержки p50/p99.
+    
+    Returns:
+        Количество успешно обработанных изображений
+    """
+    total = len(jobs)
+    pending = iter(jobs)
+    lock = threading.Lock()
+    results: List[IsolatedResult] = []
+    
+    def drive(worker: IsolatedWorker):
+        try:
+            while True:
+                with lock:
+                    job = next(pending, None)
+                if job is None:
+                    break
+                start = time.perf_counter()
+                try:
+                    result = worker.process(job[0], job[1], target_size, k, padding)
+                except (RuntimeError, OSError) as e:
+                    # Процесс не перезапустился: задание - в ошибки, следующее
+                    # попробует запустить его снова
+                    result = IsolatedResult(job, CRASHED, str(e), seconds=time.perf_counter() - start)
+                with lock:
+                    results.append(result)
+                    print(f"[{len(results)}/{total}] Обработка: {job[0].name}")
+                    if result.limit and result.ok:
+                        print(f"Лимит превышен ({result.limit}), обработано уменьшенным: {job[0].name}")
+                    elif not result.ok:
+                        print(f"Ошибка при обработке {job[0].name}: {result.error}", file=sys.stderr)
+        finally:
+            worker.close()
+    
+    isolated = [
+        IsolatedWorker(cropper_options, backend, timeout, memory_limit)
+        for _ in range(min(workers, max(1, total)))
+    ]
+    threads = [threading.Thread(target=drive, args=(worker,), daemon=True) for worker in isolated]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_time = time.perf_counter() - wall_start
+    
+    stats = sum((r.stats for r in results), Counter())
+    print(format_isolation(results, wall_time))
+    print_stats(stats)
+    success_count = sum(1 for r in results if r.ok)
+    if report is not None:
+        report.total = total
+        report.success = success_count
+        report.failed = sorted(str(r.job[0]) for r in results if not r.ok)
+        report.stats = stats
+        report.wall_time = wall_time
+    return success_count
+
+
+def run_video(
+    input_path: Path,
+    output_path: Path,
+    target_size: int,
+    k: float,
+    padding: str,
+    keyframe_interval: int,
+    smoothing: float,
+    cropper_options: Optional[Dict[str, Any]] = None
+) -> int:
+    """
+    Кропает видеофайл или папку с пронумерованными кадрами.
+    
+    Видео пишется в output_path (если у него расширение видео) или в
+    output_path/<имя>_square.mp4; кадры - в output_path с суффиксом _square.
+    
+    Returns:
+        Количество обработанных кадров
+    """
+    video = VideoCropper(
+        FaceCropper(**(cropper_options or {})),
+        keyframe_interval=keyframe_interval,
+        smoothing=smoothing
+    )
+    count = 0
+    if is_video_file(input_path):
+        if output_path.suffix.lower() not in VIDEO_EXTENSIONS:
+            output_path = output_path / f"{input_path.stem}_square.mp4"
+        writer = VideoWriter(output_path, video_fps(input_path), target_size)
+        try:
+            for frame in video.process(read_video(input_path), target_size, k, padding=padding):
+                writer.write(frame)
+                count += 1
+        finally:
+            writer.close()
+        print(f"Видео сохранено: {output_path}")
+    else:
+        frames = sort_frames(get_image_files(input_path))
+        crops = video.process((load_image(path) for path in frames), target_size, k, padding=padding)
+        for path, frame in zip(frames, crops):
+            save_image(frame, output_path / f"{path.stem}_square{path.suffix}")
+            count += 1
+    print(video.summary())
+    print_stats(video.cropper.stats)
+    return count
+
+
+def run_worker(
+    queue: JobQueue,
+    cropper: FaceCropper,
+    target_size: int,
+    k: float,
+    padding: str,
+    visualize: bool,
+    poll_interval: float = 1.0,
+    exit_when_empty: bool = False
+) -> int:
+    """
+    Берет задания из очереди и обрабатывает их process_image.
+    
+    Пустая очередь опрашивается раз в poll_interval секунд; с
+    exit_when_empty воркер завершается, когда заданий не осталось. Пока
+    задание обрабатывается, его аренда продлевается в фоне.
+    
+    Returns:
+        Количество успешно обработанных заданий
+    """
+    done = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            job = queue.claim()
+            if job is None:
+                if exit_when_empty:
+                    break
+                time.sleep(poll_interval)
+                continue
+            errors = []
+            print(f"[{queue.worker_id}] Обработка: {job.input.name} (попытка {job.attempts})")
+            with LeaseKeeper(queue, job):
+                ok = process_image(
+                    job.input, job.output, cropper, target_size, k, padding,
+                    False, visualize, on_error=errors.append
+                )
+            if ok:
+                reported = queue.complete(job)
+                if reported:
+                    done += 1
+            else:
+                reported = queue.fail(job, str(errors[0]) if errors else "ошибка обработки")
+            if not reported:
+                print(f"[{queue.worker_id}] Аренда {job.input.name} потеряна: задание выдано другому воркеру")
+    except KeyboardInterrupt:
+        # Незавершенное задание вернется в очередь по истечении аренды
+        print("\nВоркер остановлен.")
+    elapsed = time.perf_counter() - start
+    print(f"Воркер {queue.worker_id}: обработано {done} за {elapsed:.1f}с ({done / max(elapsed, 1e-9):.1f} изобр/с)")
+    print_stats(cropper.stats)
+    return done
+
+
+def run_watch(
+    input_path: Path,
+    output_dir: Path,
+    cropper: FaceCropper,
+    target_size: int,
+    k: float,
+    padding: str,
+    visualize: bool,
+    recursive: bool = False,
+    settle: float = SETTLE_SECONDS,
+    poll_interval: float = 1.0,
+    max_events: Optional[int] = None,
+    use_events: Optional[bool] = None
+) -> List[float]:
+    """
+    Следит за папкой и обрабатывает новые и измененные изображения.
+    
+    Файлы, которые лежали в папке до запуска, обрабатываются, если для них
+    нет результата или он устарел. Детектор создается один раз и остается
+    прогретым между событиями. Для каждого нового файла печатается задержка
+    от появления файла до сохранения кропа.
+    
+    Args:
+        max_events: Завершиться после стольких обработанных новых файлов
+            (None - до Ctrl+C)
+        use_events: См. FolderWatcher (None - события ОС, если доступны)
+    
+    Returns:
+        Задержки "появился → кроп сохранен" в секундах
+    """
+    watcher = FolderWatcher(
+        input_path, IMAGE_EXTENSIONS, recursive, settle, ignore=[output_dir],
+        use_events=use_events
+    )
+    # С событиями ОС цикл нужен только для проверки дописанных файлов
+    tick = poll_interval if watcher.mode == "polling" else min(poll_interval, 0.2)
+    print(f"Слежение за {input_path} ({watcher.mode}), Ctrl+C - остановить")
+    latencies = []
+    processed = 0
+    try:
+        while max_events is None or len(latencies) < max_events:
+            for path, first_seen in watcher.poll():
+                output_file = output_path_for(path, input_path, output_dir)
+                if not needs_processing(path, output_file):
+                    continue
+                ok = process_image(path, output_file, cropper, target_size, k, padding, False, visualize)
+                processed += ok
+                if ok and first_seen is not None:
+                    latencies.append(time.monotonic() - first_seen)
+                    print(f"Готово: {path.name}, задержка {latencies[-1]:.2f}с")
+                elif ok:
+                    print(f"Готово: {path.name}")
+            time.sleep(tick)
+    except KeyboardInterrupt:
+        print("\nСлежение остановлено.")
+    finally:
+        watcher.close()
+    print(f"Обработано: {processed}")
+    if latencies:
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        print(
+            f"Задержка появился → кроп: медиана {statistics.median(ordered):.2f}с, "
+            f"p95 {p95:.2f}с, макс {ordered[-1]:.2f}с (из них ожидание записи {settle:.1f}с)"
+        )
+    print_stats(cropper.stats)
+    return latencies
+
+
+def run_stream_paths(
+    stream,
+    output_dir: Path,
+    target_size: int,
+    k: float,
+    padding: str,
+    delimiter: bytes = b'\n',
+    root: Optional[Path] = None,
+    workers: int = 1,
+    queue_size: int = 4,
+    cropper_options: Optional[Dict[str, Any]] = None,
+    out=None
+) -> int:
+    """
+    Обрабатывает пути, поступающие из stream, по мере чтения.
+    
+    Пути результатов пишутся в out (по умолчанию stdout) с тем же
+    разделителем, чтобы их мог читать следующий инструмент конвейера; все
+    сообщения идут в stderr. Пути внутри root сохраняют структуру папок,
+    остальные складываются в output_dir плоско. Если результат с таким
+    путем уже записан из другого файла (одинаковые имена в разных папках),
+    файл не обрабатывается и в stderr выводится ошибка - результаты не
+    перезаписывают друг друга.
+    
+    Returns:
+        Количество успешно обработанных изображений
+    """
+    out = out or sys.stdout.buffer
+    croppers = []
+    
+    # Путь результата -> файл, из которого он записан
+    claimed = {}
+    
+    def jobs():
+        for path in read_paths(stream, delimiter):
+            inside = root is not None and root in path.parents
+            output_path = output_path_for(path, root if inside else path, output_dir)
+            source = claimed.setdefault(output_path, path)
+            if source != path:
+                print(
+                    f"Ошибка при обработке {path}: результат {output_path} "
+                    f"уже записан из {source}",
+                    file=sys.stderr
+                )
+                continue
+            yield (path, output_path)
+    
+    def compute_factory():
+        cropper = FaceCropper(**(cropper_options or {}))
+        croppers.append(cropper)
+        return lambda job, image: cropper.crop_to_square_with_face(
+            image, target_size=target_size, k=k, padding=padding
+        )
+    
+    def on_result(result: PipelineResult):
+        if result.ok:
+            out.write(os.fsencode(result.job[1]) + delimiter)
+            out.flush()
+        else:
+            print(f"Ошибка при обработке {result.job[0]}: {result.error}", file=sys.stderr)
+    
+    pipeline = Pipeline(
+        read=lambda job: load_image(job[0]),
+        compute_factory=compute_factory,
+        write=lambda job, image: save_image(image, job[1]),
+        queue_size=queue_size,
+        workers=workers
+    )
+    results = pipeline.run(jobs(), on_result=on_result)
+    print(pipeline.summary(), file=sys.stderr)
+    print_stats(sum((c.stats for c in croppers), Counter()), file=sys.stderr)
+    return sum(1 for r in results if r.ok)
+
+
+def crop_bytes(
+    data: bytes,
+    cropper: FaceCropper,
+    target_size: int,
+    k: float,
+    padding: str,
+    output_format: Optional[str] = None
+) -> bytes:
+    """
+    Кропает закодированное изображение в памяти.
+    
+    output_format - 'JPEG', 'PNG' или 'WEBP'; по умолчанию формат входа
+    (JPEG, если вход в другом формате).
+    """
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if output_format is None:
+        output_format = image.format if image.format in ('JPEG', 'PNG', 'WEBP') else 'JPEG'
+    cropped = cropper.crop_to_square_with_face(image, target_size=target_size, k=k, padding=padding)
+    buffer = io.BytesIO()
+    write_image(cropped, buffer, output_format)
+    return buffer.getvalue()
+
+
+def run_stdio(
+    mode: str,
+    cropper: FaceCropper,
+    target_size: int,
+    k: float,
+    padding: str,
+    output_format: Optional[str] = None,
+    stdin=None,
+    stdout=None
+) -> int:
+    """
+    Кропает изображения из stdin в stdout без временных файлов.
+    
+    mode "single" - одно изображение (весь stdin) → байты результата.
+    mode "framed" - поток кадров "длина uint32 big-endian + данные" в обе
+    стороны; на ошибку отвечает пустым кадром, чтобы ответы оставались
+    сопоставлены запросам.
+    
+    Returns:
+        Количество успешно обработанных изображений
+    """
+    stdin = stdin or sys.stdin.buffer
+    stdout = stdout or sys.stdout.buffer
+    if mode == "single":
+        stdout.write(crop_bytes(stdin.read(), cropper, target_size, k, padding, output_format))
+        stdout.flush()
+        return 1
+    done = 0
+    for index, data in enumerate(read_frames(stdin), 1):
+        try:
+            result = crop_bytes(data, cropper, target_size, k, padding, output_format)
+            done += 1
+        except Exception as e:
+            print(f"Ошибка при обработке кадра {index}: {e}", file=sys.stderr)
+            result = b''
+        write_frame(stdout, result)
+    print_stats(cropper.stats, file=sys.stderr)
+    return done
+
+
+def print_queue_status(queue: JobQueue):
+    """Печатает состояние очереди и задания в dead-letter."""
+    counts = queue.counts()
+    print(", ".join(f"{status}: {count}" for status, count in counts.items()))
+    for input_path, error in queue.dead_jobs():
+        print(f"dead: {input_path}: {error}")
+
+
+def run_merge(report_paths: List[str], output: Optional[str]) -> int:
+    """
+    Объединяет отчеты шардов (--merge-reports) и печатает сводку.
+    
+    Returns:
+        Код выхода: 1, если есть ошибки обработки или не хватает шардов
+    """
+    merged, warnings = merge_reports(RunReport.load(Path(path)) for path in report_paths)
+    print(f"Отчетов: {len(report_paths)}, самый долгий шард: {merged.wall_time:.2f}с")
+    print_stats(merged.stats)
+    for warning in warnings:
+        print(f"Внимание: {warning}", file=sys.stderr)
+    for path in merged.failed:
+        print(f"Ошибка: {path}", file=sys.stderr)
+    print(f"\nГотово! Успешно обработано: {merged.success}/{merged.total}")
+    if output:
+        merged.save(Path(output))
+    return 1 if warnings or merged.failed else 0
+
+
+def print_stats(stats: Counter, file=None):
+    """Печатает счетчики FaceCropper за прогон (по умолчанию в stdout)."""
+    file = file or sys.stdout
+    if stats['tiled_detections']:
+        print(f"Тайловых детекций: {stats['tiled_detections']}", file=file)
+    tier_parts = [
+        f"{key.split(':', 1)[1]} {stats['tier_hit:' + key.split(':', 1)[1]]}/{runs}"
+        for key, runs in stats.items()
+        if key.startswith('tier_run:')
+    ]
+    if len(tier_parts) > 1:
+        print("Ступени детектора (нашли/запусков): " + ", ".join(tier_parts), file=file)
+    roi_total = stats['roi_hit'] + stats['roi_miss']
+    if roi_total:
+        print(
+            f"ROI: лицо найдено в априорной области {stats['roi_hit']}/{roi_total} "
+            f"({100 * stats['roi_hit'] / roi_total:.0f}%), полный кадр: {stats['roi_miss']}",
+            file=file
+        )
+    dedup_total = stats['dedup_hit'] + stats['dedup_miss']
+    if dedup_total:
+        print(
+            f"Почти-дубликаты: bbox взят из индекса для {stats['dedup_hit']}/{dedup_total} "
+            f"({100 * stats['dedup_hit'] / dedup_total:.0f}%)",
+            file=file
+        )
+    if stats['center_fallback']:
+        print(f"Лицо не найдено (центральный кроп): {stats['center_fallback']}", file=file)
+    if stats['detect_skipped']:
+        print(
+            f"Детекций пропущено: {stats['detect_skipped']} "
+            f"(кроп не зависит от положения лица), выполнено: {stats['detect_run']}",
+            file=file
+        )
+
+
 def create_visualization(
     input_path: Path,
     output_path: Path,
     cropper: FaceCropper,
     target_size: int,
-    k: float
+    k: float,
+    padding: str = "none"
 ):
-    """Создает визуализацию с рамками лица и кропа."""
+    """
+    Создает визуализацию с рамками лица и кропа.
+    
+    Лицо ищется так же, как в crop_to_square_with_face (адаптивные
+    параметры, roi, уровни детектора, dedup), поэтому рамка - это лицо,
+    по которому на самом деле строился кроп. Если детекция для кропа не
+    нужна, рамок нет.
+    """
     image = Image.open(input_path)
+    orientation = cropper._get_orientation(image)
+    face_bbox = None
+    if cropper.face_can_change_crop(cropper._oriented_size(image.size, orientation), target_size, padding):
+        # bbox в отображаемых координатах
+        face_bbox = cropper._detect_or_reuse(cropper._to_gray(image), orientation, target_size, k)
     image = cropper._fix_orientation(image)
     
     img_array = np.array(image)
@@ -102,9 +761,6 @@ def create_visualization(
     else:
         img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
     
-    # Детектируем лицо
-    face_bbox = cropper.detect_face(img_array)
-    
     if face_bbox:
         x, y, w, h = face_bbox
         # Рисуем рамку лица (зеленая)
@@ -145,6 +801,45 @@ def main():
         default=7860,
         help='Порт для Web UI (по умолчанию 7860)'
     )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=None,
+        help='Порт /metrics Prometheus для Web UI (нужен prometheus_client; '
+             'по умолчанию из METRICS_PORT, иначе выключено)'
+    )
+    parser.add_argument(
+        '--ui-concurrency',
+        type=int,
+        default=None,
+        help='Web UI: одновременных запросов (по умолчанию из UI_CONCURRENCY, иначе 1)'
+    )
+    parser.add_argument(
+        '--ui-max-queue',
+        type=int,
+        default=None,
+        help='Web UI: максимум запросов в очереди (по умолчанию из UI_MAX_QUEUE, иначе 16)'
+    )
+    parser.add_argument(
+        '--ui-workers',
+        type=int,
+        default=None,
+        help='Web UI: потоков кропа (по умолчанию из UI_WORKERS, иначе число CPU)'
+    )
+    parser.add_argument(
+        '--ui-cache-dir',
+        type=str,
+        default=None,
+        help='Web UI: папка кэша результатов (по умолчанию из UI_CACHE_DIR, иначе '
+             'facecrop-cache во временной папке)'
+    )
+    parser.add_argument(
+        '--ui-cache-mb',
+        type=int,
+        default=None,
+        help='Web UI: размер кэша результатов, МБ; 0 - без кэша (по умолчанию из '
+             'UI_CACHE_MB, иначе 256)'
+    )
     parser.add_argument(
         '--input', '-i',
         type=str,
@@ -191,26 +886,328 @@ def main():
         action='store_true',
         help='Сохранить визуализацию с рамками'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Число потоков детекции/кропа в конвейере (по умолчанию 1)'
+    )
+    parser.add_argument(
+        '--cv-threads',
+        type=int,
+        default=None,
+        help='Потоков OpenCV на воркер (по умолчанию доступные CPU / --workers)'
+    )
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=4,
+        help='Размер очередей между стадиями конвейера (по умолчанию 4)'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=BACKENDS,
+        default='pil',
+        help='Декодирование/кроп/кодирование: pil или opencv (быстрее, альфа-канал '
+             'отбрасывается; по умолчанию pil)'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=None,
+        help='Лимит времени на изображение, секунды: каждое изображение '
+             'обрабатывается в отдельном процессе-воркере'
+    )
+    parser.add_argument(
+        '--memory-limit',
+        type=int,
+        default=None,
+        metavar='MB',
+        help='Лимит памяти на изображение, МБ (процесс-воркер, как у --timeout). '
+             'Превысившие лимиты изображения повторяются уменьшенными в 4 раза'
+    )
+    parser.add_argument(
+        '--prescan',
+        action='store_true',
+        help='Сначала прочитать только заголовки: сводка, ожидаемое время, нечитаемые '
+             'файлы сразу отбрасываются, большие кадры обрабатываются первыми'
+    )
+    parser.add_argument(
+        '--tiled',
+        type=str,
+        choices=['auto', 'on', 'off'],
+        default='auto',
+        help='Тайловая параллельная детекция для панорам и очень больших кадров '
+             '(auto - при кадре детекции больше 3 Мп и нескольких CPU)'
+    )
+    parser.add_argument(
+        '--roi',
+        type=parse_roi,
+        nargs='?',
+        const=DEFAULT_ROI,
+        default=None,
+        metavar='LEFT,TOP,RIGHT,BOTTOM',
+        help='Сначала искать лицо в области (доли кадра), весь кадр - только при промахе. '
+             'Без значения - верхние две трети, центральная полоса (0.15,0,0.85,0.67)'
+    )
+    parser.add_argument(
+        '--tiers',
+        type=parse_tiers,
+        default=DEFAULT_TIERS,
+        metavar='TIER[,TIER...]',
+        help='Цепочка детекторов от дешевого к дорогому, следующий запускается '
+             'только при промахе: fast, default, alt, profile (по умолчанию default)'
+    )
+    parser.add_argument(
+        '--resampling',
+        choices=list(RESAMPLING_POLICIES),
+        default=DEFAULT_RESAMPLING,
+        help='Ресайз результата: fast и balanced сначала уменьшают кадр в целое число раз, '
+             f'затем LANCZOS; max - LANCZOS из полного разрешения (по умолчанию {DEFAULT_RESAMPLING})'
+    )
+    parser.add_argument(
+        '--dedup',
+        type=int,
+        nargs='?',
+        const=DEDUP_MAX_DISTANCE,
+        default=None,
+        metavar='MAX_DISTANCE',
+        help='Не детектировать почти-дубликаты уже обработанных кадров (пересохранения, '
+             'уменьшенные копии): bbox берется по перцептивному хешу. Значение - порог '
+             f'расстояния Хэмминга из 64 бит (без значения {DEDUP_MAX_DISTANCE})'
+    )
+    parser.add_argument(
+        '--shard',
+        type=shard_arg,
+        default=None,
+        metavar='I/N',
+        help='Обработать только шард I из N (I от 1): входные файлы делятся по хешу '
+             'относительного пути, одинаково на всех машинах'
+    )
+    parser.add_argument(
+        '--report',
+        type=str,
+        default=None,
+        metavar='FILE',
+        help='Сохранить итоги прогона в JSON (для --merge-reports)'
+    )
+    parser.add_argument(
+        '--merge-reports',
+        nargs='+',
+        default=None,
+        metavar='FILE',
+        help='Объединить отчеты шардов в одну сводку (с --report - сохранить ее)'
+    )
+    parser.add_argument(
+        '--queue',
+        type=str,
+        default=None,
+        metavar='DB',
+        help='Файл очереди заданий (SQLite) для --enqueue, --worker и --queue-status'
+    )
+    parser.add_argument(
+        '--enqueue',
+        action='store_true',
+        help='Добавить файлы из --input в очередь (выходные пути - как при обычном прогоне)'
+    )
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='Режим воркера: брать задания из --queue; можно запустить несколько процессов'
+    )
+    parser.add_argument(
+        '--queue-status',
+        action='store_true',
+        help='Показать состояние очереди и задания в dead-letter'
+    )
+    parser.add_argument(
+        '--exit-when-empty',
+        action='store_true',
+        help='Завершить воркер, когда в очереди не осталось заданий'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=1.0,
+        help='Интервал опроса пустой очереди воркером, сек (по умолчанию 1)'
+    )
+    parser.add_argument(
+        '--lease',
+        type=float,
+        default=LEASE_SECONDS,
+        help=f'Аренда задания, сек: после нее задание упавшего воркера выдается снова '
+             f'(по умолчанию {LEASE_SECONDS:.0f})'
+    )
+    parser.add_argument(
+        '--max-attempts',
+        type=int,
+        default=MAX_ATTEMPTS,
+        help=f'Попыток до перевода задания в dead-letter (по умолчанию {MAX_ATTEMPTS})'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Следить за папкой --input и обрабатывать новые и измененные файлы '
+             '(события ОС при установленном watchdog, иначе опрос раз в --poll-interval)'
+    )
+    parser.add_argument(
+        '--settle',
+        type=float,
+        default=SETTLE_SECONDS,
+        help=f'Файл обрабатывается, когда он не менялся столько секунд (по умолчанию {SETTLE_SECONDS})'
+    )
+    parser.add_argument(
+        '--paths-from-stdin',
+        action='store_true',
+        help='Читать пути изображений из stdin вместо обхода --input; пути результатов '
+             'пишутся в stdout, сообщения - в stderr'
+    )
+    parser.add_argument(
+        '--null', '-0',
+        action='store_true',
+        help='Пути в stdin и stdout разделены NUL (как find -print0 / xargs -0)'
+    )
+    parser.add_argument(
+        '--stdio',
+        type=str,
+        nargs='?',
+        const='single',
+        choices=['single', 'framed'],
+        default=None,
+        help='Байты изображения из stdin, байты кропа в stdout. framed - поток кадров '
+             '"длина uint32 big-endian + данные" в одном процессе'
+    )
+    parser.add_argument(
+        '--format',
+        type=str,
+        choices=['jpeg', 'png', 'webp'],
+        default=None,
+        help='Формат результата для --stdio (по умолчанию как у входа)'
+    )
+    parser.add_argument(
+        '--video',
+        action='store_true',
+        help='Режим ролика: --input - видеофайл или папка с пронумерованными кадрами; '
+             'детекция на ключевых кадрах, между ними трекинг лица'
+    )
+    parser.add_argument(
+        '--keyframe-interval',
+        type=int,
+        default=KEYFRAME_INTERVAL,
+        help=f'Детекция не реже чем раз в N кадров (по умолчанию {KEYFRAME_INTERVAL})'
+    )
+    parser.add_argument(
+        '--smoothing',
+        type=float,
+        default=CROP_SMOOTHING,
+        help=f'Сглаживание рамки кропа между кадрами, 0..1 (по умолчанию {CROP_SMOOTHING}, 0 - выключено)'
+    )
     
     args = parser.parse_args()
     
     # Если запрошен UI - запускаем его
     if args.ui:
-        from .ui import launch_ui
+        from .ui import launch_ui, validate_concurrency, DEFAULT_CACHE_MB, DEFAULT_CONCURRENCY, DEFAULT_MAX_QUEUE
         
         # Для Render: читаем PORT из env и используем 0.0.0.0
         port = int(os.environ.get("PORT", args.port))
         host = "0.0.0.0" if "PORT" in os.environ else "127.0.0.1"
         
         try:
-            launch_ui(server_name=host, server_port=port)
+            # Флаг важнее переменной окружения
+            metrics_port = args.metrics_port or env_int("METRICS_PORT") or None
+            concurrency = args.ui_concurrency or env_int("UI_CONCURRENCY", DEFAULT_CONCURRENCY)
+            max_queue = args.ui_max_queue or env_int("UI_MAX_QUEUE", DEFAULT_MAX_QUEUE)
+            workers = args.ui_workers or env_int("UI_WORKERS", available_cpus())
+            for value in (args.ui_concurrency, args.ui_max_queue, args.ui_workers):
+                if value is not None and value < 1:
+                    raise ValueError("--ui-concurrency, --ui-max-queue и --ui-workers должны быть >= 1")
+            validate_concurrency(concurrency, max_queue, workers)
+            # 0 - осмысленное значение (кэш выключен), поэтому не через or
+            cache_mb = args.ui_cache_mb if args.ui_cache_mb is not None else env_int("UI_CACHE_MB", DEFAULT_CACHE_MB)
+            if cache_mb < 0:
+                raise ValueError("--ui-cache-mb должен быть >= 0")
+            cache_dir = args.ui_cache_dir or os.environ.get("UI_CACHE_DIR") or None
+        except ValueError as e:
+            parser.error(str(e))
+        try:
+            launch_ui(
+                server_name=host, server_port=port, metrics_port=metrics_port,
+                concurrency=concurrency, max_queue_size=max_queue, workers=workers,
+                cache_dir=cache_dir, cache_mb=cache_mb
+            )
         except KeyboardInterrupt:
             print("\n\nСервер остановлен.")
         return
     
+    if args.cv_threads is not None and args.cv_threads < 1:
+        parser.error("--cv-threads должен быть >= 1")
+    # Внутренние потоки OpenCV (и тайлы детекции) - в пределах своей доли
+    # CPU; до выбора режима, чтобы действовало и в --worker/--stdio/
+    # --paths-from-stdin
+    cv_threads = configure_threads(max(1, args.workers), args.cv_threads)
+    if args.workers > 1 or args.cv_threads:
+        print(f"Потоков OpenCV на воркер: {cv_threads}", file=sys.stderr)
+    
+    if args.merge_reports:
+        sys.exit(run_merge(args.merge_reports, args.report))
+    
+    if args.worker or args.queue_status or args.enqueue:
+        if not args.queue:
+            parser.error("--worker, --enqueue и --queue-status требуют --queue")
+        if args.lease <= 0 or args.max_attempts < 1:
+            parser.error("--lease должен быть > 0, --max-attempts >= 1")
+        queue = JobQueue(Path(args.queue), args.lease, args.max_attempts)
+        if args.queue_status:
+            print_queue_status(queue)
+            return
+        if args.worker:
+            if args.dedup is not None and not 0 <= args.dedup <= 64:
+                parser.error("--dedup должен быть в диапазоне 0..64")
+            cropper = FaceCropper(
+                tiled=args.tiled, roi=args.roi, tiers=args.tiers, resampling=args.resampling,
+                dedup=DetectionIndex(args.dedup) if args.dedup is not None else None
+            )
+            run_worker(
+                queue, cropper, args.size, args.k, args.padding, args.visualize,
+                args.poll_interval, args.exit_when_empty
+            )
+            return
+    
+    if args.stdio or args.paths_from_stdin:
+        if args.dedup is not None and not 0 <= args.dedup <= 64:
+            parser.error("--dedup должен быть в диапазоне 0..64")
+        options = dict(tiled=args.tiled, roi=args.roi, tiers=args.tiers, resampling=args.resampling)
+        if args.dedup is not None:
+            options['dedup'] = DetectionIndex(args.dedup)
+        if args.stdio:
+            run_stdio(
+                args.stdio, FaceCropper(**options), args.size, args.k, args.padding,
+                args.format.upper() if args.format else None
+            )
+            return
+        if not args.output:
+            parser.error("--paths-from-stdin требует --output")
+        if args.workers < 1 or args.queue_size < 1:
+            parser.error("--workers и --queue-size должны быть >= 1")
+        run_stream_paths(
+            sys.stdin.buffer, Path(args.output), args.size, args.k, args.padding,
+            delimiter=b'\0' if args.null else b'\n',
+            root=Path(args.input) if args.input else None,
+            workers=args.workers, queue_size=args.queue_size, cropper_options=options
+        )
+        return
+    
     # Проверяем обязательные параметры для CLI
     if not args.input or not args.output:
         parser.error("--input и --output обязательны для CLI режима (или используйте --ui)")
+    if args.workers < 1 or args.queue_size < 1:
+        parser.error("--workers и --queue-size должны быть >= 1")
+    isolated = args.timeout is not None or args.memory_limit is not None
+    if (args.timeout is not None and args.timeout <= 0) or (args.memory_limit is not None and args.memory_limit <= 0):
+        parser.error("--timeout и --memory-limit должны быть > 0")
+    if isolated and args.visualize:
+        parser.error("--visualize не поддерживается с --timeout/--memory-limit")
     
     # Проверяем входной путь
     input_path = Path(args.input)
@@ -218,6 +1215,39 @@ def main():
         print(f"Ошибка: путь {input_path} не существует", file=sys.stderr)
         sys.exit(1)
     
+    if args.dedup is not None and not 0 <= args.dedup <= 64:
+        parser.error("--dedup должен быть в диапазоне 0..64")
+    cropper_options = dict(
+        tiled=args.tiled, roi=args.roi, tiers=args.tiers, resampling=args.resampling
+    )
+    if args.dedup is not None:
+        # Один индекс на все потоки: дубликат может попасть к другому потоку
+        cropper_options['dedup'] = DetectionIndex(args.dedup)
+    
+    if args.watch:
+        if not input_path.is_dir():
+            parser.error("--watch ожидает папку в --input")
+        if args.settle < 0 or args.poll_interval <= 0:
+            parser.error("--settle должен быть >= 0, --poll-interval > 0")
+        run_watch(
+            input_path, Path(args.output), FaceCropper(**cropper_options),
+            args.size, args.k, args.padding, args.visualize, args.recursive,
+            args.settle, args.poll_interval
+        )
+        return
+    
+    if args.video:
+        if args.keyframe_interval < 1 or not 0 <= args.smoothing < 1:
+            parser.error("--keyframe-interval должен быть >= 1, --smoothing - в диапазоне [0, 1)")
+        if not is_video_file(input_path) and not input_path.is_dir():
+            parser.error(f"--video ожидает видео ({', '.join(sorted(VIDEO_EXTENSIONS))}) или папку с кадрами")
+        frames = run_video(
+            input_path, Path(args.output), args.size, args.k, args.padding,
+            args.keyframe_interval, args.smoothing, cropper_options
+        )
+        print(f"\nГотово! Обработано кадров: {frames}")
+        return
+    
     # Получаем список файлов
     image_files = get_image_files(input_path, args.recursive)
     if not image_files:
@@ -226,29 +1256,61 @@ def main():
     
     print(f"Найдено изображений: {len(image_files)}")
     
-    # Создаем cropper
-    cropper = FaceCropper()
-    
     # Обрабатываем файлы
     output_dir = Path(args.output)
-    success_count = 0
+    jobs = []
+    for input_file in image_files:
+        jobs.append((input_file, output_path_for(input_file, input_path, output_dir)))
     
-    for i, input_file in enumerate(image_files, 1):
-        # Формируем имя выходного файла
-        relative_path = input_file.relative_to(input_path) if input_path.is_dir() else input_file.name
-        output_file = output_dir / relative_path
-        output_file = output_file.parent / f"{output_file.stem}_square{output_file.suffix}"
-        
-        print(f"[{i}/{len(image_files)}] Обработка: {input_file.name}")
-        
-        if process_image(
-            input_file, output_file, cropper,
-            args.size, args.k, args.padding,
-            args.dry_run, args.visualize
-        ):
-            success_count += 1
-    
-    print(f"\nГотово! Успешно обработано: {success_count}/{len(image_files)}")
+    report = RunReport(shard=args.shard)
+    if args.shard:
+        index, count = args.shard
+        jobs = select_shard(jobs, input_path, index, count)
+        print(f"Шард {index}/{count}: {len(jobs)} из {len(image_files)}")
+    
+    unreadable = []
+    if args.prescan:
+        jobs, unreadable = prescan_jobs(jobs, args.workers)
+    
+    if args.enqueue:
+        added = queue.enqueue(jobs)
+        print(f"Добавлено в очередь: {added} (уже были: {len(jobs) - added})")
+        print_queue_status(queue)
+        return
+    
+    if args.dry_run:
+        # Без декодирования и записи конвейер не нужен
+        cropper = FaceCropper(**cropper_options)
+        success_count = 0
+        for i, (input_file, output_file) in enumerate(jobs, 1):
+            print(f"[{i}/{len(jobs)}] Обработка: {input_file.name}")
+            if process_image(
+                input_file, output_file, cropper,
+                args.size, args.k, args.padding,
+                True, args.visualize
+            ):
+                success_count += 1
+        report.total, report.success = len(jobs), success_count
+    elif isolated:
+        memory_limit = args.memory_limit << 20 if args.memory_limit else None
+        success_count = run_isolated(
+            jobs, args.size, args.k, args.padding, workers=args.workers,
+            timeout=args.timeout, memory_limit=memory_limit,
+            cropper_options=cropper_options, report=report, backend=args.backend
+        )
+    else:
+        success_count = run_pipelined(
+            jobs, args.size, args.k, args.padding, args.visualize,
+            workers=args.workers, queue_size=args.queue_size,
+            cropper_options=cropper_options, report=report, backend=args.backend
+        )
+    
+    if unreadable:
+        report.total += len(unreadable)
+        report.failed = sorted(report.failed + [str(path) for path in unreadable])
+    if args.report:
+        report.save(Path(args.report))
+    print(f"\nГотово! Успешно обработано: {success_count}/{len(jobs) + len(unreadable)}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,150 @@
+"""Метрики Prometheus для Web UI: время стадий, счетчики, память."""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+    from prometheus_client.exposition import generate_latest
+except ImportError:  # prometheus_client - необязательная зависимость
+    CollectorRegistry = None
+
+
+STAGES = ("decode", "detect", "resample", "encode")
+# Границы гистограмм, секунды: от миниатюр до 24 Мп кадров на shared CPU
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (на Linux из /proc, иначе пиковый из getrusage, 0 на Windows)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource  # нет на Windows
+    except ImportError:
+        return 0
+    # ru_maxrss - в килобайтах на Linux, в байтах на macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class UIMetrics:
+    """
+    Метрики обработки изображений в Web UI.
+
+    Время стадий - гистограмма facecrop_stage_seconds{stage=...}; detect
+    берется из счетчика 'detect_seconds' вызова (FaceCropper.track_call),
+    resample - это остаток времени кропа. Отдаются отдельным HTTP сервером (serve) на
+    своем порту, как ожидает секция [metrics] в fly.toml.
+    """
+
+    def __init__(self, registry: Optional["CollectorRegistry"] = None):
+        if CollectorRegistry is None:
+            raise RuntimeError("для метрик нужен пакет prometheus_client (pip install prometheus-client)")
+        self.registry = registry or CollectorRegistry()
+        self.stage_seconds = Histogram(
+            'facecrop_stage_seconds', 'Время стадии обработки изображения',
+            ['stage'], buckets=STAGE_BUCKETS, registry=self.registry
+        )
+        self.images = Counter(
+            'facecrop_images_processed', 'Обработанные изображения', registry=self.registry
+        )
+        self.fallbacks = Counter(
+            'facecrop_center_fallbacks', 'Лицо не найдено, центральный кроп', registry=self.registry
+        )
+        self.errors = Counter(
+            'facecrop_errors', 'Изображения, обработка которых упала', registry=self.registry
+        )
+        self.in_flight = Gauge(
+            'facecrop_in_flight_jobs', 'Изображения в обработке', registry=self.registry
+        )
+        self.rss = Gauge(
+            'facecrop_rss_bytes', 'Resident set size процесса', registry=self.registry
+        )
+        self.rss.set_function(rss_bytes)
+        for stage in STAGES:
+            # Ряды всех стадий видны сразу, а не после первого изображения
+            self.stage_seconds.labels(stage)
+
+    def observe(self, stage: str, seconds: float):
+        self.stage_seconds.labels(stage).observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        """Замеряет блок как стадию stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    @contextmanager
+    def job(self):
+        """Одно изображение: в обработке, затем обработано или ошибка."""
+        self.in_flight.inc()
+        try:
+            yield
+        except Exception:
+            self.errors.inc()
+            raise
+        else:
+            self.images.inc()
+        finally:
+            self.in_flight.dec()
+
+    @contextmanager
+    def crop(self, cropper):
+        """
+        Вызов crop_to_square_with_face: detect и промахи детектора - по
+        счетчикам этого вызова в текущем потоке (FaceCropper.track_call,
+        общий FaceCropper в других потоках их не сдвигает), остальное
+        время - resample.
+        """
+        start = time.perf_counter()
+        with cropper.track_call() as call:
+            try:
+                yield
+            finally:
+                total = time.perf_counter() - start
+                detect = call['detect_seconds']
+                if detect:
+                    self.observe('detect', detect)
+                self.observe('resample', max(0.0, total - detect))
+                self.fallbacks.inc(call['center_fallback'])
+
+    def track_cache(self, cache):
+        """Отдает счетчики ResultCache (hit rate = hits / (hits + misses))."""
+        self.registry.register(_CacheCollector(cache))
+
+    def exposition(self) -> bytes:
+        """Текущие значения в текстовом формате Prometheus."""
+        return generate_latest(self.registry)
+
+    def serve(self, port: int, addr: str = '0.0.0.0'):
+        """Запускает /metrics в фоновом потоке."""
+        start_http_server(port, addr=addr, registry=self.registry)
+
+
+class _CacheCollector:
+    """Значения ResultCache.stats в момент опроса /metrics."""
+
+    COUNTERS = (
+        ('hits', 'Результаты, отданные из кэша'),
+        ('misses', 'Промахи кэша результатов'),
+        ('evictions', 'Записи, вытесненные из кэша по размеру'),
+        ('invalidations', 'Записи, сброшенные после ручной обрезки'),
+    )
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        for name, documentation in self.COUNTERS:
+            yield CounterMetricFamily(f'facecrop_cache_{name}', documentation, value=self.cache.stats[name])
+        yield GaugeMetricFamily('facecrop_cache_bytes', 'Размер кэша результатов на диске', value=self.cache.total_bytes)
+        yield GaugeMetricFamily('facecrop_cache_entries', 'Записей в кэше результатов', value=len(self.cache))
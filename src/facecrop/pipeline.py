@@ -0,0 +1,260 @@
+"""Конвейерная обработка: чтение → кроп → запись с ограниченными очередями."""
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+
+# Маркер конца потока данных между стадиями
+_STOP = object()
+# Как часто заблокированный reader проверяет, не остановлен ли конвейер, сек
+_SHUTDOWN_POLL = 0.1
+
+
+class StageStats:
+    """Статистика одной стадии конвейера."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.busy = 0.0  # Суммарное время полезной работы, сек
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, elapsed: float):
+        with self._lock:
+            self.busy += elapsed
+            self.items += 1
+
+    def rate(self) -> float:
+        """Пропускная способность стадии (изображений в секунду работы)."""
+        return self.items / self.busy if self.busy > 0 else 0.0
+
+
+class PipelineResult:
+    """Результат обработки одного задания."""
+
+    def __init__(self, job: Any, ok: bool, error: Optional[BaseException] = None):
+        self.job = job
+        self.ok = ok
+        self.error = error
+
+
+class Pipeline:
+    """
+    Трехстадийный конвейер: reader → compute → writer.
+
+    Стадии работают в отдельных потоках и связаны очередями ограниченного
+    размера. Pillow (decode/encode) и OpenCV (детекция) отпускают GIL, поэтому
+    диск и CPU работают одновременно, а пропускная способность стремится к
+    скорости самой медленной стадии. Размер очередей ограничивает число
+    декодированных изображений в памяти.
+
+    Если compute_factory или итератор заданий бросает исключение, конвейер
+    останавливается и run() пробрасывает его после завершения потоков.
+    """
+
+    def __init__(
+        self,
+        read: Callable[[Any], Any],
+        compute_factory: Callable[[], Callable[[Any, Any], Any]],
+        write: Callable[[Any, Any], None],
+        queue_size: int = 4,
+        workers: int = 1
+    ):
+        """
+        Args:
+            read: read(job) -> данные (декодированное изображение)
+            compute_factory: Создает функцию compute(job, data) -> результат.
+                Вызывается один раз в каждом потоке вычислений, чтобы у потока
+                был собственный детектор.
+            write: write(job, результат) - сохранение на диск
+            queue_size: Максимальный размер каждой межстадийной очереди
+            workers: Число потоков стадии вычислений
+        """
+        if queue_size < 1:
+            raise ValueError("queue_size должен быть >= 1")
+        if workers < 1:
+            raise ValueError("workers должен быть >= 1")
+        self.read = read
+        self.compute_factory = compute_factory
+        self.write = write
+        self.queue_size = queue_size
+        self.workers = workers
+        self.stats = {
+            name: StageStats(name) for name in ("read", "compute", "write")
+        }
+        self.wall_time = 0.0
+        self._shutdown = threading.Event()
+        self._failure: Optional[BaseException] = None
+        # Потоки вычислений, у которых не создался compute (очередь не читают)
+        self._dead_workers = 0
+        self._lock = threading.Lock()
+
+    def _fail(self, error: BaseException):
+        """Останавливает конвейер; run() пробросит первую ошибку."""
+        with self._lock:
+            if self._failure is None:
+                self._failure = error
+        self._shutdown.set()
+
+    def _send_stops(self, decoded: queue.Queue):
+        """
+        Отправляет _STOP каждому живому потоку вычислений.
+
+        Живые потоки разбирают очередь, поэтому место для их маркеров
+        появится; маркеры для потоков, у которых не создался compute, не
+        нужны (их некому прочитать, и очередь может быть полна навсегда).
+        """
+        sent = 0
+        while sent < self.workers - self._dead_workers:
+            try:
+                decoded.put(_STOP, timeout=_SHUTDOWN_POLL)
+                sent += 1
+            except queue.Full:
+                pass
+
+    def _put(self, decoded: queue.Queue, item) -> bool:
+        """
+        put, который не блокируется навсегда после остановки конвейера
+        (потоки вычислений, которые разбирают очередь, могли завершиться).
+
+        Returns:
+            False, если конвейер остановлен и место в очереди не появилось
+        """
+        while True:
+            try:
+                decoded.put(item, timeout=_SHUTDOWN_POLL)
+                return True
+            except queue.Full:
+                if self._shutdown.is_set():
+                    return False
+
+    def _reader(self, jobs: Iterable, decoded: queue.Queue):
+        stats = self.stats["read"]
+        try:
+            for job in jobs:
+                if self._shutdown.is_set():
+                    break
+                start = time.perf_counter()
+                try:
+                    item = (job, self.read(job), None)
+                except Exception as e:
+                    item = (job, None, e)
+                stats.add(time.perf_counter() - start)
+                if not self._put(decoded, item):
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._send_stops(decoded)
+
+    def _computer(self, decoded: queue.Queue, computed: queue.Queue):
+        stats = self.stats["compute"]
+        try:
+            try:
+                compute = self.compute_factory()
+            except BaseException as e:
+                with self._lock:
+                    self._dead_workers += 1
+                self._fail(e)
+                return
+            while True:
+                item = decoded.get()
+                if item is _STOP:
+                    break
+                job, data, error = item
+                if error is None:
+                    start = time.perf_counter()
+                    try:
+                        data = compute(job, data)
+                    except Exception as e:
+                        data, error = None, e
+                    stats.add(time.perf_counter() - start)
+                computed.put((job, data, error))
+        finally:
+            computed.put(_STOP)
+
+    def run(
+        self,
+        jobs: Iterable,
+        on_result: Optional[Callable[[PipelineResult], None]] = None
+    ) -> List[PipelineResult]:
+        """
+        Прогоняет задания через конвейер.
+
+        Стадия записи выполняется в вызывающем потоке. Ошибки отдельных
+        заданий не останавливают конвейер, а возвращаются в PipelineResult.
+        Порядок результатов соответствует порядку завершения.
+
+        Raises:
+            Исключение compute_factory или итератора jobs - после того, как
+            уже прочитанные задания обработаны и потоки завершились
+        """
+        self._shutdown.clear()
+        self._failure = None
+        self._dead_workers = 0
+        decoded = queue.Queue(maxsize=self.queue_size)
+        computed = queue.Queue(maxsize=self.queue_size)
+
+        threads = [threading.Thread(
+            target=self._reader, args=(jobs, decoded), daemon=True
+        )]
+        for _ in range(self.workers):
+            threads.append(threading.Thread(
+                target=self._computer, args=(decoded, computed), daemon=True
+            ))
+
+        wall_start = time.perf_counter()
+        for t in threads:
+            t.start()
+
+        results = []
+        stats = self.stats["write"]
+        finished = 0
+        while finished < self.workers:
+            item = computed.get()
+            if item is _STOP:
+                finished += 1
+                continue
+            job, data, error = item
+            if error is None:
+                start = time.perf_counter()
+                try:
+                    self.write(job, data)
+                except Exception as e:
+                    error = e
+                stats.add(time.perf_counter() - start)
+            result = PipelineResult(job, error is None, error)
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        for t in threads:
+            t.join()
+        self.wall_time = time.perf_counter() - wall_start
+        if self._failure is not None:
+            raise self._failure
+        return results
+
+    def bottleneck(self) -> Tuple[str, float]:
+        """Возвращает (имя, время) самой загруженной стадии с учетом числа потоков."""
+        loads = {
+            "read": self.stats["read"].busy,
+            "compute": self.stats["compute"].busy / self.workers,
+            "write": self.stats["write"].busy,
+        }
+        name = max(loads, key=loads.get)
+        return name, loads[name]
+
+    def summary(self) -> str:
+        """Краткий отчет о загрузке стадий."""
+        parts = [
+            f"{s.name}: {s.busy:.2f}с ({s.rate():.1f} изобр/с)"
+            for s in self.stats.values()
+        ]
+        name, load = self.bottleneck()
+        return (
+            f"Конвейер: {self.wall_time:.2f}с; " + ", ".join(parts)
+            + f"; узкое место: {name} ({load:.2f}с)"
+        )
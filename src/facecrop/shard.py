@@ -0,0 +1,151 @@
+"""Детерминированное шардирование входных файлов и сводные отчеты прогонов."""
+
+import hashlib
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    Разбирает шард вида "i/N" (i от 1 до N).
+
+    Raises:
+        ValueError: Если формат или номера некорректны
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"шард должен быть в виде i/N, получено: {value}")
+    if not 1 <= index <= count:
+        raise ValueError(f"номер шарда должен быть от 1 до {count}, получено: {value}")
+    return index, count
+
+
+def shard_of(key: str, count: int) -> int:
+    """
+    Номер шарда (1..count) для ключа.
+
+    Используется SHA-1, а не hash(): встроенный хеш строк рандомизирован
+    между процессами, а разбиение должно совпадать на всех машинах.
+    """
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def select_shard(
+    jobs: Sequence[Tuple[Path, Path]],
+    root: Path,
+    index: int,
+    count: int
+) -> List[Tuple[Path, Path]]:
+    """
+    Оставляет задания (input, output) своего шарда.
+
+    Ключ - путь входного файла относительно root в POSIX виде, поэтому
+    разбиение не зависит от точки монтирования архива на узле.
+    """
+    selected = []
+    for input_file, output_file in jobs:
+        relative = input_file.relative_to(root) if root.is_dir() else Path(input_file.name)
+        if shard_of(relative.as_posix(), count) == index:
+            selected.append((input_file, output_file))
+    return selected
+
+
+class RunReport:
+    """Итоги прогона (или шарда) для сохранения в JSON и объединения."""
+
+    def __init__(
+        self,
+        shard: Optional[Tuple[int, int]] = None,
+        total: int = 0,
+        success: int = 0,
+        failed: Optional[List[str]] = None,
+        stats: Optional[Counter] = None,
+        wall_time: float = 0.0
+    ):
+        """
+        Args:
+            shard: (i, N) или None для прогона без шардирования
+            total: Число заданий
+            success: Число успешно обработанных
+            failed: Входные пути с ошибками
+            stats: Счетчики FaceCropper
+            wall_time: Время прогона, сек
+        """
+        self.shard = shard
+        self.total = total
+        self.success = success
+        self.failed = failed or []
+        self.stats = stats or Counter()
+        self.wall_time = wall_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'shard': list(self.shard) if self.shard else None,
+            'total': self.total,
+            'success': self.success,
+            'failed': self.failed,
+            'stats': dict(self.stats),
+            'wall_time': self.wall_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RunReport':
+        shard = data.get('shard')
+        return cls(
+            shard=tuple(shard) if shard else None,
+            total=data['total'],
+            success=data['success'],
+            failed=list(data.get('failed', [])),
+            stats=Counter(data.get('stats', {})),
+            wall_time=data.get('wall_time', 0.0)
+        )
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=1), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: Path) -> 'RunReport':
+        return cls.from_dict(json.loads(path.read_text(encoding='utf-8')))
+
+
+def merge_reports(reports: Iterable[RunReport]) -> Tuple[RunReport, List[str]]:
+    """
+    Объединяет отчеты шардов одного прогона.
+
+    wall_time сводного отчета - максимум по шардам (узлы работают
+    параллельно).
+
+    Returns:
+        Tuple (сводный отчет, предупреждения о недостающих/повторных шардах)
+    """
+    reports = list(reports)
+    merged = RunReport()
+    seen = Counter()
+    counts = set()
+    for report in reports:
+        merged.total += report.total
+        merged.success += report.success
+        merged.failed.extend(report.failed)
+        merged.stats.update(report.stats)
+        merged.wall_time = max(merged.wall_time, report.wall_time)
+        if report.shard:
+            seen[report.shard[0]] += 1
+            counts.add(report.shard[1])
+
+    warnings = []
+    if len(counts) > 1:
+        warnings.append(f"отчеты из разных разбиений: N = {sorted(counts)}")
+    elif counts:
+        count = counts.pop()
+        missing = [i for i in range(1, count + 1) if i not in seen]
+        if missing:
+            warnings.append(f"нет отчетов шардов {missing} из {count}")
+        repeated = sorted(i for i, n in seen.items() if n > 1)
+        if repeated:
+            warnings.append(f"шарды {repeated} встречаются несколько раз")
+    return merged, warnings
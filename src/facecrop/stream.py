@@ -0,0 +1,80 @@
+"""Потоковый ввод-вывод для shell-конвейеров: пути и изображения через stdin/stdout."""
+
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+
+# Размер порции чтения stdin
+READ_CHUNK = 65536
+# Заголовок кадра в режиме --stdio framed: длина данных, uint32 big-endian
+FRAME_HEADER = struct.Struct('>I')
+
+
+def read_paths(stream: BinaryIO, delimiter: bytes = b'\n') -> Iterator[Path]:
+    """
+    Читает пути из потока по мере поступления, не дожидаясь EOF.
+
+    Пустые записи пропускаются, для разделителя '\\n' обрезается '\\r'.
+    Байты декодируются как имена файловой системы (os.fsdecode), поэтому
+    не-UTF-8 имена не теряются.
+    """
+    read = getattr(stream, 'read1', stream.read)
+    buffer = b''
+    while True:
+        chunk = read(READ_CHUNK)
+        if not chunk:
+            break
+        buffer += chunk
+        *records, buffer = buffer.split(delimiter)
+        for record in records:
+            path = _record_to_path(record, delimiter)
+            if path is not None:
+                yield path
+    path = _record_to_path(buffer, delimiter)
+    if path is not None:
+        yield path
+
+
+def _record_to_path(record: bytes, delimiter: bytes) -> Optional[Path]:
+    if delimiter == b'\n':
+        record = record.rstrip(b'\r')
+    return Path(os.fsdecode(record)) if record else None
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def read_frames(stream: BinaryIO) -> Iterator[bytes]:
+    """
+    Читает кадры "длина (uint32 big-endian) + данные" до EOF.
+
+    Raises:
+        EOFError: Если поток оборвался посреди кадра
+    """
+    while True:
+        header = _read_exact(stream, FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            raise EOFError("поток оборвался в заголовке кадра")
+        size, = FRAME_HEADER.unpack(header)
+        data = _read_exact(stream, size)
+        if len(data) < size:
+            raise EOFError("поток оборвался посреди кадра")
+        yield data
+
+
+def write_frame(stream: BinaryIO, data: bytes):
+    """Пишет кадр "длина + данные" и сразу отдает его читателю."""
+    stream.write(FRAME_HEADER.pack(len(data)))
+    stream.write(data)
+    stream.flush()
@@ -0,0 +1,68 @@
+"""Согласование внутренних потоков OpenCV с числом воркеров facecrop."""
+
+import os
+from typing import Optional
+
+import cv2
+
+
+# Переменные окружения пулов потоков нативных библиотек: читаются при их
+# загрузке, поэтому действуют на процессы, запущенные после настройки
+# (воркеры --timeout/--memory-limit)
+THREAD_ENV_VARS = (
+    "OPENCV_FOR_THREADS_NUM",
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+)
+
+
+# Переменные, выставленные configure_threads (их можно перенастроить)
+_exported = set()
+
+
+def available_cpus() -> int:
+    """CPU, доступные процессу (с учетом affinity/cpuset контейнера)."""
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:  # нет на macOS и Windows
+        return os.cpu_count() or 1
+
+
+def cv_threads_for(workers: int, cpus: Optional[int] = None) -> int:
+    """
+    Потоков OpenCV на воркер: доступные CPU поровну между воркерами.
+
+    Каждый воркер сам занимает ядро, поэтому при workers >= cpus внутренняя
+    параллельность cvtColor/detectMultiScale/GaussianBlur только добавляет
+    переключения контекста.
+    """
+    return max(1, (cpus or available_cpus()) // max(1, workers))
+
+
+def configure_threads(workers: int, cv_threads: Optional[int] = None) -> int:
+    """
+    Настраивает потоки OpenCV под workers параллельных воркеров facecrop.
+
+    cv2.setNumThreads действует на текущий процесс сразу; THREAD_ENV_VARS
+    экспортируются для дочерних процессов, если пользователь не задал их
+    сам. Вызывать, когда facecrop параллелится снаружи (свой пул потоков
+    или процессов).
+
+    Args:
+        workers: Число параллельных воркеров
+        cv_threads: Потоков OpenCV на воркер (None - cv_threads_for(workers))
+
+    Returns:
+        Установленное число потоков OpenCV
+    """
+    if cv_threads is None:
+        cv_threads = cv_threads_for(workers)
+    if cv_threads < 1:
+        raise ValueError("cv_threads должен быть >= 1")
+    cv2.setNumThreads(cv_threads)
+    for name in THREAD_ENV_VARS:
+        if name not in os.environ or name in _exported:
+            os.environ[name] = str(cv_threads)
+            _exported.add(name)
+    return cv_threads
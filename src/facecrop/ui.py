@@ -2,24 +2,214 @@
 
 import gradio as gr
 import tempfile
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 from PIL import Image
-from typing import List, Tuple
-import os
+from typing import List, Optional, Tuple
 
-from .core import FaceCropper
+from .cache import DEFAULT_CACHE_MB, ResultCache, cache_key, file_digest
+from .core import FaceCropper, DEFAULT_RESAMPLING, RESAMPLING_POLICIES, resize_image
+from .metrics import UIMetrics
+from .threads import available_cpus, configure_threads
 
 
 # Глобальное хранилище для отслеживания обработанных файлов
 _processed_files_storage = {}
+# Метрики Prometheus, если launch_ui запущен с metrics_port
+_metrics: Optional[UIMetrics] = None
+
+# Сколько запросов Gradio обрабатывает одновременно и сколько ждут в очереди.
+# Состояние ручной обрезки (_processed_files_storage) общее, поэтому по
+# умолчанию запросы идут по одному, а параллелится кроп внутри запроса.
+DEFAULT_CONCURRENCY = 1
+DEFAULT_MAX_QUEUE = 16
+# Пул потоков кропа (None - последовательно в потоке запроса). OpenCV и
+# Pillow отпускают GIL, поэтому потоки загружают все ядра.
+_crop_pool: Optional[ThreadPoolExecutor] = None
+_thread_croppers = threading.local()
+# Кэш результатов по содержимому загруженного файла (None - выключен)
+_result_cache: Optional[ResultCache] = None
+# Результаты UI - JPEG с этим качеством (входит в ключ кэша)
+RESULT_QUALITY = 95
+# Имя результата: <имя загруженного файла>_square.jpg
+RESULT_SUFFIX = "_square"
+# Галерея и просмотр получают превью до THUMB_SIZE px; полноразмерные
+# результаты (до 2048²) отдаются только в ZIP и кнопкой скачивания
+THUMB_SIZE = 512
+THUMB_QUALITY = 85
+
+
+def validate_concurrency(concurrency: int, max_queue_size: int, workers: int):
+    """
+    Проверяет настройки параллельности UI.
+    
+    Raises:
+        ValueError: Если какое-то значение вне допустимого диапазона
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency должен быть >= 1")
+    if max_queue_size < 1:
+        raise ValueError("max_queue_size должен быть >= 1")
+    if workers < 1:
+        raise ValueError("workers должен быть >= 1")
+
+
+def configure_workers(workers: Optional[int]):
+    """Создает пул из workers потоков кропа (None или 0 - без пула)."""
+    global _crop_pool
+    if _crop_pool is not None:
+        _crop_pool.shutdown(wait=True)
+    if workers:
+        configure_threads(workers)
+    _crop_pool = ThreadPoolExecutor(workers, thread_name_prefix="crop") if workers else None
+
+
+def configure_cache(cache_dir: Optional[str], max_mb: int = DEFAULT_CACHE_MB) -> Optional[ResultCache]:
+    """
+    Включает кэш результатов в cache_dir (по умолчанию во временной папке
+    системы) размером до max_mb МБ; max_mb = 0 выключает кэш.
+    """
+    global _result_cache
+    if max_mb < 0:
+        raise ValueError("размер кэша должен быть >= 0")
+    if max_mb == 0:
+        _result_cache = None
+    else:
+        root = Path(cache_dir) if cache_dir else Path(tempfile.gettempdir()) / "facecrop-cache"
+        _result_cache = ResultCache(root, max_mb << 20)
+    return _result_cache
+
+
+def _worker_cropper(resampling: str) -> FaceCropper:
+    """FaceCropper потока пула: каскад загружается один раз на поток."""
+    croppers = getattr(_thread_croppers, 'croppers', None)
+    if croppers is None:
+        croppers = _thread_croppers.croppers = {}
+    if resampling not in croppers:
+        croppers[resampling] = FaceCropper(resampling=resampling)
+    return croppers[resampling]
+
+
+def _source_name(result_path: str) -> str:
+    """
+    Ключ files_map (имя загруженного файла без расширения) по пути
+    результата или превью: отрезается только суффикс RESULT_SUFFIX, так что
+    photo_square.jpg дает photo_square, а не photo.
+    """
+    stem = Path(result_path).stem
+    return stem[:-len(RESULT_SUFFIX)] if stem.endswith(RESULT_SUFFIX) else stem
+
+
+def _save_thumbnail(output_path: Path, image: Optional[Image.Image] = None) -> Path:
+    """
+    Сохраняет превью результата output_path в папку thumbs рядом с ним.
+    
+    Args:
+        output_path: Полноразмерный результат
+        image: Он же, уже в памяти (иначе читается с диска с draft-уменьшением)
+    
+    Returns:
+        Путь превью; сам output_path, если результат не больше THUMB_SIZE
+    """
+    if image is None:
+        image = Image.open(output_path)
+    if max(image.size) <= THUMB_SIZE:
+        return output_path
+    # Для JPEG с диска декодер сразу уменьшает в 2-8 раз
+    image.draft('RGB', (THUMB_SIZE, THUMB_SIZE))
+    thumb_path = output_path.parent / "thumbs" / output_path.name
+    thumb_path.parent.mkdir(exist_ok=True)
+    thumb = resize_image(image.convert('RGB'), (THUMB_SIZE, THUMB_SIZE), "fast")
+    thumb.save(thumb_path, 'JPEG', quality=THUMB_QUALITY)
+    return thumb_path
+
+
+def _crop_job(
+    file_path: str,
+    output_path: Path,
+    size: int,
+    k: float,
+    resampling: str,
+    cropper: Optional[FaceCropper] = None
+) -> Tuple[Optional[str], Path]:
+    """
+    Одно изображение запроса; без cropper - в потоке пула.
+    
+    При включенном кэше результат того же файла с теми же параметрами
+    копируется из кэша без декодирования и детекции.
+    
+    Returns:
+        (ключ кэша результата или None, если кэш выключен; путь превью)
+    """
+    cache = _result_cache
+    with _metric('job'):
+        key = None
+        if cache is not None:
+            try:
+                key = cache_key(file_digest(file_path), size, k, "none", resampling, "JPEG", RESULT_QUALITY)
+            except OSError:
+                key = None  # Ошибку с понятным текстом даст _crop_file
+            if key is not None and cache.get(key, output_path):
+                return key, _save_thumbnail(output_path)
+        thumb_path = _crop_file(cropper or _worker_cropper(resampling), file_path, output_path, size, k)
+        if key is not None:
+            cache.put(key, output_path)
+        return key, thumb_path
+
+
+def _metric(name: str, *args):
+    """Контекст UIMetrics (job, time, crop) или пустой, если метрики выключены."""
+    return getattr(_metrics, name)(*args) if _metrics is not None else nullcontext()
+
+
+def _crop_file(cropper: FaceCropper, file_path: str, output_path: Path, size: int, k: float) -> Path:
+    """
+    Кропает загруженный файл в JPEG output_path, замеряя стадии для метрик.
+    
+    Returns:
+        Путь превью результата (см. _save_thumbnail)
+    
+    Raises:
+        ValueError: С сообщением для пользователя, если файл не открылся или
+            не обработался
+    """
+    try:
+        with _metric('time', 'decode'):
+            image = Image.open(file_path)
+            image.load()
+    except Exception as e:
+        raise ValueError(f"Ошибка загрузки изображения {Path(file_path).name}: {str(e)}") from e
+    
+    try:
+        with _metric('crop', cropper):
+            cropped = cropper.crop_to_square_with_face(
+                image, target_size=size, k=k, padding="none"
+            )
+    except Exception as e:
+        raise ValueError(f"Ошибка обработки изображения {Path(file_path).name}: {str(e)}") from e
+    
+    with _metric('time', 'encode'):
+        cropped = cropped.convert('RGB')
+        cropped.save(output_path, 'JPEG', quality=RESULT_QUALITY)
+        return _save_thumbnail(output_path, cropped)
+
 
 def process_images_ui(
     files: List,
     size: int,
-    k: float
+    k: float,
+    resampling: str = DEFAULT_RESAMPLING
 ) -> Tuple[str, List[Tuple[str, str]]]:
-    """Обрабатывает изображения через UI."""
+    """
+    Обрабатывает изображения через UI.
+    
+    Returns:
+        (путь ZIP с полноразмерными результатами или текст ошибки,
+        элементы галереи - превью до THUMB_SIZE px с подписями)
+    """
     if not files:
         return "Загрузите изображения", []
     
@@ -28,10 +218,12 @@ def process_images_ui(
     _processed_files_storage['temp_dir'] = temp_dir
     _processed_files_storage['files_map'] = {}  # filename -> output_path
     
+    pool = _crop_pool
     try:
-        # Инициализация cropper с проверкой ошибок
+        # Инициализация cropper с проверкой ошибок; с пулом у каждого
+        # потока свой (_worker_cropper), общий не нужен
         try:
-            cropper = FaceCropper()
+            cropper = FaceCropper(resampling=resampling) if pool is None else None
         except ImportError as e:
             error_msg = str(e)
             if "MediaPipe" in error_msg or "mediapipe" in error_msg.lower():
@@ -49,38 +241,40 @@ def process_images_ui(
             return f"Ошибка инициализации: {str(e)}", []
         
         try:
+            jobs = []
             for file_obj in files:
                 # Gradio может передавать объекты файлов или пути
                 file_path = file_obj.name if hasattr(file_obj, 'name') else str(file_obj)
-                
-                # Загружаем изображение
-                try:
-                    image = Image.open(file_path)
-                except Exception as e:
-                    return f"Ошибка загрузки изображения {Path(file_path).name}: {str(e)}", []
-                
-                # Кропаем
+                filename = Path(file_path).stem
+                jobs.append((file_path, Path(temp_dir) / f"{filename}{RESULT_SUFFIX}.jpg"))
+            
+            # Загружаем, кропаем и сохраняем во временную папку. С пулом
+            # файлы запроса обрабатываются параллельно, ждем их по порядку
+            futures = []
+            if pool is not None:
+                futures = [pool.submit(_crop_job, *job, size, k, resampling) for job in jobs]
+            for i, (file_path, output_path) in enumerate(jobs):
                 try:
-                    cropped = cropper.crop_to_square_with_face(
-                        image, target_size=size, k=k, padding="none"
-                    )
-                except Exception as e:
-                    return f"Ошибка обработки изображения {Path(file_path).name}: {str(e)}", []
-                
-                # Сохраняем во временную папку
+                    if futures:
+                        key, thumb_path = futures[i].result()
+                    else:
+                        key, thumb_path = _crop_job(file_path, output_path, size, k, resampling, cropper)
+                except ValueError as e:
+                    for future in futures:
+                        future.cancel()
+                    return str(e), []
                 filename = Path(file_path).stem
-                output_path = Path(temp_dir) / f"{filename}_square.jpg"
-                cropped = cropped.convert('RGB')
-                cropped.save(output_path, 'JPEG', quality=95)
                 
                 # Сохраняем маппинг для ручной обрезки
                 _processed_files_storage['files_map'][filename] = {
                     'output': str(output_path),
-                    'original': file_path
+                    'thumb': str(thumb_path),
+                    'original': file_path,
+                    'cache_key': key
                 }
                 
-                # Добавляем в результаты для предпросмотра
-                results.append((str(output_path), f"Обработано: {filename}"))
+                # В галерею - только превью
+                results.append((str(thumb_path), f"Обработано: {filename}"))
             
             # Создаем ZIP архив
             zip_path = Path(temp_dir) / "results.zip"
@@ -88,9 +282,9 @@ def process_images_ui(
                 for file_obj in files:
                     file_path = file_obj.name if hasattr(file_obj, 'name') else str(file_obj)
                     filename = Path(file_path).stem
-                    output_path = Path(temp_dir) / f"{filename}_square.jpg"
+                    output_path = Path(temp_dir) / f"{filename}{RESULT_SUFFIX}.jpg"
                     if output_path.exists():
-                        zipf.write(output_path, f"{filename}_square.jpg")
+                        zipf.write(output_path, output_path.name)
             
             return str(zip_path), results
             
@@ -109,10 +303,37 @@ def launch_ui(
     server_name: str = "127.0.0.1",
     server_port: int = 7860,
     inbrowser: bool = False,
+    metrics_port: Optional[int] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_queue_size: int = DEFAULT_MAX_QUEUE,
+    workers: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    cache_mb: int = DEFAULT_CACHE_MB,
 ):
-    """Запускает Gradio UI."""
+    """
+    Запускает Gradio UI.
+    
+    Если задан metrics_port, на нем поднимается /metrics для Prometheus
+    (нужен пакет prometheus_client).
+    
+    Args:
+        concurrency: Сколько запросов обрабатывается одновременно
+        max_queue_size: Сколько запросов может ждать в очереди; лишним
+            Gradio сразу отвечает ошибкой
+        workers: Потоков кропа (по умолчанию - число CPU)
+        cache_dir: Папка кэша результатов (по умолчанию во временной папке)
+        cache_mb: Размер кэша результатов, МБ (0 - без кэша)
+    
+    Raises:
+        ValueError: Если настройки параллельности или кэша некорректны
+    """
+    global _metrics
     import socket
     
+    workers = workers or available_cpus()
+    validate_concurrency(concurrency, max_queue_size, workers)
+    cache = configure_cache(cache_dir, cache_mb)
+    
     # Функция для проверки доступности порта
     def is_port_available(port):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -240,6 +461,11 @@ def launch_ui(
                         step=0.1,
                         label="Множитель размера лица (k)"
                     )
+                    resampling_radio = gr.Radio(
+                        choices=list(RESAMPLING_POLICIES),
+                        value=DEFAULT_RESAMPLING,
+                        label="Качество ресайза (fast - быстрее, max - LANCZOS из полного размера)"
+                    )
                 
                 process_btn = gr.Button("Обработать", variant="primary")
             
@@ -288,6 +514,9 @@ def launch_ui(
                     prev_btn = gr.Button("◀ Предыдущее", size="lg")
                     image_counter = gr.Markdown("**0 / 0**")
                     next_btn = gr.Button("Следующее ▶", size="lg")
+                
+                # Полный размер - только по запросу, в просмотре превью
+                current_download = gr.File(label="Скачать в полном размере")
             
             # Правая колонка - обрезка
             with gr.Column(scale=1):
@@ -325,43 +554,43 @@ def launch_ui(
                     interactive=False
                 )
         
-        def get_original_for_index(idx, gallery):
-            """Получает оригинальное изображение для указанного индекса."""
+        def get_entry_for_index(idx, gallery):
+            """Запись files_map (результат, превью, оригинал) для индекса галереи."""
             if not gallery or idx < 0 or idx >= len(gallery):
                 return None
             
             item = gallery[idx]
             result_path = item[0] if isinstance(item, tuple) else str(item)
-            
-            # Ищем оригинал в files_map
-            filename = Path(result_path).stem.replace('_square', '')
-            if filename in _processed_files_storage.get('files_map', {}):
-                original_path = _processed_files_storage['files_map'][filename].get('original')
-                if original_path and Path(original_path).exists():
-                    return Image.open(original_path)
-            
+            # Превью называется так же, как результат
+            return _processed_files_storage.get('files_map', {}).get(_source_name(result_path))
+        
+        def get_original_for_index(idx, gallery):
+            """Получает оригинальное изображение для указанного индекса."""
+            entry = get_entry_for_index(idx, gallery)
+            original_path = entry.get('original') if entry else None
+            if original_path and Path(original_path).exists():
+                return Image.open(original_path)
             return None
         
-        def process_wrapper(files, size, k):
+        def get_views_for_index(idx, gallery):
+            """Превью для просмотра и полноразмерный файл для скачивания."""
+            entry = get_entry_for_index(idx, gallery)
+            if not entry or not Path(entry['output']).exists():
+                return None, None
+            return entry['thumb'], entry['output']
+        
+        def process_wrapper(files, size, k, resampling):
             if not files:
-                return "Загрузите изображения", None, [], [], None, "**0 / 0**", "Загрузите и обработайте фотографии", None
+                return "Загрузите изображения", None, [], [], None, None, "**0 / 0**", "Загрузите и обработайте фотографии", None
             
-            zip_path, gallery = process_images_ui(files, int(size), float(k))
+            zip_path, gallery = process_images_ui(files, int(size), float(k), resampling)
             
             if zip_path and Path(zip_path).exists():
                 status = f"✓ Обработано {len(gallery)} изображений"
                 
-                # Загружаем первое изображение для просмотра
-                first_result = None
-                first_original = None
-                
-                if gallery:
-                    first_path = gallery[0][0] if isinstance(gallery[0], tuple) else str(gallery[0])
-                    if Path(first_path).exists():
-                        first_result = Image.open(first_path)
-                    
-                    # Загружаем оригинал
-                    first_original = get_original_for_index(0, gallery)
+                # Первое изображение для просмотра
+                first_result, first_full = get_views_for_index(0, gallery)
+                first_original = get_original_for_index(0, gallery)
                 
                 counter = f"**1 / {len(gallery)}**" if gallery else "**0 / 0**"
                 
@@ -370,14 +599,14 @@ def launch_ui(
                 else:
                     crop_msg = "Используйте кнопки навигации для просмотра"
                 
-                return status, zip_path, gallery, gallery, first_result, counter, crop_msg, first_original
+                return status, zip_path, gallery, gallery, first_result, first_full, counter, crop_msg, first_original
             else:
-                return zip_path, None, [], [], None, "**0 / 0**", "Ошибка обработки", None
+                return zip_path, None, [], [], None, None, "**0 / 0**", "Ошибка обработки", None
         
         def navigate_images(current_idx, gallery, direction):
             """Навигация по изображениям."""
             if not gallery:
-                return None, "**0 / 0**", 0, "Нет изображений", None, None
+                return None, None, "**0 / 0**", 0, "Нет изображений", None, None
             
             new_idx = current_idx + direction
             if new_idx < 0:
@@ -385,15 +614,8 @@ def launch_ui(
             elif new_idx >= len(gallery):
                 new_idx = 0  # Переход к первому
             
-            # Загружаем обработанное изображение для показа
-            item = gallery[new_idx]
-            result_path = item[0] if isinstance(item, tuple) else str(item)
-            
-            result_img = None
-            original_img = None
-            
-            if Path(result_path).exists():
-                result_img = Image.open(result_path)
+            # Для показа - превью, полный размер - в скачивание
+            result_img, full_path = get_views_for_index(new_idx, gallery)
             
             # Загружаем оригинал для обрезки
             original_img = get_original_for_index(new_idx, gallery)
@@ -405,7 +627,7 @@ def launch_ui(
             else:
                 status = f"Изображение {new_idx + 1}. Оригинал не найден."
             
-            return result_img, counter, new_idx, status, None, original_img
+            return result_img, full_path, counter, new_idx, status, None, original_img
         
         def update_crop_preview(original_img, position_pct, target_size):
             """Обновляет превью обрезки из ОРИГИНАЛЬНОГО изображения."""
@@ -428,17 +650,22 @@ def launch_ui(
                     x = 0
                     y = int((position_pct / 100) * max_offset)
                 
-                cropped = original_img.crop((x, y, x + crop_size, y + crop_size))
-                cropped = cropped.resize((target_size, target_size), Image.Resampling.LANCZOS)
-                return cropped
+                # Превью показывается маленьким - не больше THUMB_SIZE и
+                # всегда быстрая политика
+                preview_size = min(int(target_size), THUMB_SIZE)
+                return resize_image(
+                    original_img, (preview_size, preview_size), "fast",
+                    box=(x, y, x + crop_size, y + crop_size)
+                )
             except:
                 return None
         
-        def apply_crop(original_img, position_pct, target_size, current_idx, gallery):
+        def apply_crop(original_img, position_pct, target_size, current_idx, gallery, resampling):
             """Применяет обрезку к текущему изображению из ОРИГИНАЛА."""
             try:
-                if original_img is None or not gallery:
-                    return gallery, gallery, None, "Ошибка: оригинал не найден. Попробуйте перейти к другому изображению."
+                entry = get_entry_for_index(current_idx, gallery)
+                if original_img is None or entry is None:
+                    return gallery, gallery, None, None, "Ошибка: оригинал не найден. Попробуйте перейти к другому изображению."
                 
                 w, h = original_img.size
                 crop_size = min(w, h)
@@ -453,36 +680,46 @@ def launch_ui(
                     x = 0
                     y = int((position_pct / 100) * max_offset)
                 
-                cropped = original_img.crop((x, y, x + crop_size, y + crop_size))
+                # Палитровые и 1-битные режимы Pillow ресайзит без фильтра
+                if original_img.mode not in ('RGB', 'RGBA', 'L'):
+                    original_img = original_img.convert('RGB')
                 
-                if cropped.mode != 'RGB':
-                    cropped = cropped.convert('RGB')
+                # В галерее превью, перезаписываем полноразмерный результат
+                output_path = Path(entry['output'])
                 
-                cropped = cropped.resize((target_size, target_size), Image.Resampling.LANCZOS)
-                
-                # Получаем путь к файлу результата
-                item = gallery[current_idx]
-                result_path = item[0] if isinstance(item, tuple) else str(item)
+                with _metric('job'):
+                    # Кроп и ресайз одной операцией
+                    with _metric('time', 'resample'):
+                        cropped = resize_image(
+                            original_img, (target_size, target_size), resampling,
+                            box=(x, y, x + crop_size, y + crop_size)
+                        ).convert('RGB')
+                    
+                    # Сохраняем
+                    with _metric('time', 'encode'):
+                        cropped.save(output_path, 'JPEG', quality=RESULT_QUALITY)
+                        thumb_path = _save_thumbnail(output_path, cropped)
+                entry['thumb'] = str(thumb_path)
                 
-                # Сохраняем
-                output_path = Path(result_path)
-                cropped.save(output_path, 'JPEG', quality=95)
+                # Автоматический результат в кэше больше не актуален
+                if _result_cache is not None and entry.get('cache_key'):
+                    _result_cache.invalidate(entry['cache_key'])
                 
                 # Обновляем галерею
                 updated_gallery = []
                 for idx, item in enumerate(gallery):
                     if idx == current_idx:
                         if isinstance(item, tuple):
-                            updated_gallery.append((str(output_path), f"✓ Обрезано: {output_path.stem}"))
+                            updated_gallery.append((str(thumb_path), f"✓ Обрезано: {output_path.stem}"))
                         else:
-                            updated_gallery.append((str(output_path), f"✓ Обрезано"))
+                            updated_gallery.append((str(thumb_path), f"✓ Обрезано"))
                     else:
                         updated_gallery.append(item)
                 
-                return updated_gallery, updated_gallery, cropped, f"✓ Обрезка применена! {target_size}x{target_size}"
+                return updated_gallery, updated_gallery, str(thumb_path), str(output_path), f"✓ Обрезка применена! {target_size}x{target_size}"
             
             except Exception as e:
-                return gallery, gallery, None, f"Ошибка: {str(e)}"
+                return gallery, gallery, None, None, f"Ошибка: {str(e)}"
         
         def update_zip_after_manual_crop():
             """Обновляет ZIP архив после ручной обрезки."""
@@ -505,38 +742,31 @@ def launch_ui(
         # Обработка изображений
         process_btn.click(
             fn=process_wrapper,
-            inputs=[file_input, size_slider, k_slider],
-            outputs=[status_text, download_file, output_gallery, gallery_data, current_image, image_counter, crop_status, original_image_state]
+            inputs=[file_input, size_slider, k_slider, resampling_radio],
+            outputs=[status_text, download_file, output_gallery, gallery_data, current_image, current_download, image_counter, crop_status, original_image_state]
         )
         
         # Навигация - предыдущее
         prev_btn.click(
             fn=lambda idx, gallery: navigate_images(idx, gallery, -1),
             inputs=[current_index, gallery_data],
-            outputs=[current_image, image_counter, current_index, crop_status, crop_preview, original_image_state]
+            outputs=[current_image, current_download, image_counter, current_index, crop_status, crop_preview, original_image_state]
         )
         
         # Навигация - следующее
         next_btn.click(
             fn=lambda idx, gallery: navigate_images(idx, gallery, 1),
             inputs=[current_index, gallery_data],
-            outputs=[current_image, image_counter, current_index, crop_status, crop_preview, original_image_state]
+            outputs=[current_image, current_download, image_counter, current_index, crop_status, crop_preview, original_image_state]
         )
         
         # Клик по галерее - переход к изображению
         def on_gallery_click(evt: gr.SelectData, gallery):
             if not gallery:
-                return None, "**0 / 0**", 0, "Нет изображений", None, None
+                return None, None, "**0 / 0**", 0, "Нет изображений", None, None
             
             idx = evt.index
-            item = gallery[idx]
-            result_path = item[0] if isinstance(item, tuple) else str(item)
-            
-            result_img = None
-            original_img = None
-            
-            if Path(result_path).exists():
-                result_img = Image.open(result_path)
+            result_img, full_path = get_views_for_index(idx, gallery)
             
             # Загружаем оригинал
             original_img = get_original_for_index(idx, gallery)
@@ -546,12 +776,12 @@ def launch_ui(
             else:
                 status = f"Изображение {idx + 1}. Оригинал не найден."
             
-            return result_img, f"**{idx + 1} / {len(gallery)}**", idx, status, None, original_img
+            return result_img, full_path, f"**{idx + 1} / {len(gallery)}**", idx, status, None, original_img
         
         output_gallery.select(
             fn=on_gallery_click,
             inputs=[gallery_data],
-            outputs=[current_image, image_counter, current_index, crop_status, crop_preview, original_image_state]
+            outputs=[current_image, current_download, image_counter, current_index, crop_status, crop_preview, original_image_state]
         )
         
         # Обновление превью при изменении слайдера положения (из оригинала!)
@@ -564,8 +794,8 @@ def launch_ui(
         # Применение обрезки (из оригинала!)
         crop_btn.click(
             fn=apply_crop,
-            inputs=[original_image_state, crop_position, crop_size_slider, current_index, gallery_data],
-            outputs=[output_gallery, gallery_data, current_image, crop_status]
+            inputs=[original_image_state, crop_position, crop_size_slider, current_index, gallery_data, resampling_radio],
+            outputs=[output_gallery, gallery_data, current_image, current_download, crop_status]
         ).then(
             fn=update_zip_after_manual_crop,
             outputs=[download_file]
@@ -586,13 +816,21 @@ def launch_ui(
     except AttributeError:
         print("✓ Gradio загружен")
     
+    if metrics_port:
+        _metrics = UIMetrics()
+        if cache is not None:
+            _metrics.track_cache(cache)
+        _metrics.serve(metrics_port, addr=server_name or "127.0.0.1")
+        print(f"✓ Метрики Prometheus: http://{server_name}:{metrics_port}/metrics")
+    
     try:
         print("Запуск сервера...")
         # Очередь помогает на слабых хостингах/при батч-обработке
-        try:
-            demo.queue(concurrency_count=1)
-        except Exception:
-            pass
+        demo.queue(default_concurrency_limit=concurrency, max_size=max_queue_size)
+        configure_workers(workers)
+        print(f"✓ Параллельность: запросов {concurrency}, очередь {max_queue_size}, потоков кропа {workers}")
+        if cache is not None:
+            print(f"✓ Кэш результатов: {cache.root} (до {cache_mb} МБ, записей {len(cache)})")
 
         demo.launch(
             share=share,
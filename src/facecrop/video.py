@@ -0,0 +1,364 @@
+"""Кроп видео и последовательностей кадров с трекингом лица между ключевыми кадрами."""
+
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .core import FaceCropper
+
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v'}
+
+# Детектор запускается раз в KEYFRAME_INTERVAL кадров, между ними лицо
+# ведет трекер
+KEYFRAME_INTERVAL = 10
+# Ниже этой уверенности (TM_CCOEFF_NORMED) трекер считается потерявшим лицо
+TRACK_MIN_CONFIDENCE = 0.6
+# Размер лица в кадре трекера: сопоставление шаблона идет на уменьшенной копии
+TRACK_FACE_PX = 32
+# Окно поиска вокруг прошлого положения, в долях размера лица с каждой стороны
+TRACK_SEARCH_MARGIN = 0.5
+# Вес истории в экспоненциальном сглаживании рамки кропа (0 - без сглаживания)
+CROP_SMOOTHING = 0.5
+
+
+class TemplateTracker:
+    """
+    Дешевый трекер лица: сопоставление шаблона с ключевого кадра в окне
+    вокруг прошлого положения. Размер рамки не меняется - его уточняет
+    следующая детекция.
+    """
+
+    def __init__(self):
+        self.template = None
+        self.bbox = None
+        self.scale = 1.0
+
+    def init(self, gray: np.ndarray, bbox: Tuple[int, int, int, int]):
+        """Запоминает шаблон лица с ключевого кадра."""
+        x, y, w, h = bbox
+        self.scale = min(1.0, TRACK_FACE_PX / max(w, h))
+        face = gray[y:y + h, x:x + w]
+        self.template = self._resize(face)
+        self.bbox = bbox
+
+    def _resize(self, array: np.ndarray) -> np.ndarray:
+        if self.scale >= 1.0:
+            return array
+        size = (
+            max(1, round(array.shape[1] * self.scale)),
+            max(1, round(array.shape[0] * self.scale))
+        )
+        return cv2.resize(array, size, interpolation=cv2.INTER_AREA)
+
+    def update(self, gray: np.ndarray) -> Tuple[Optional[Tuple[int, int, int, int]], float]:
+        """
+        Ищет лицо на новом кадре.
+
+        Returns:
+            Tuple (bbox, уверенность 0..1); bbox None, если трекер не
+            инициализирован или окно поиска меньше шаблона
+        """
+        if self.template is None:
+            return None, 0.0
+        x, y, w, h = self.bbox
+        img_h, img_w = gray.shape[:2]
+        margin_x = int(w * TRACK_SEARCH_MARGIN) + 1
+        margin_y = int(h * TRACK_SEARCH_MARGIN) + 1
+        left, top = max(0, x - margin_x), max(0, y - margin_y)
+        right, bottom = min(img_w, x + w + margin_x), min(img_h, y + h + margin_y)
+        window = self._resize(gray[top:bottom, left:right])
+        t_h, t_w = self.template.shape[:2]
+        if window.shape[0] < t_h or window.shape[1] < t_w:
+            return None, 0.0
+        result = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, (loc_x, loc_y) = cv2.minMaxLoc(result)
+        ratio_x = (right - left) / window.shape[1]
+        ratio_y = (bottom - top) / window.shape[0]
+        self.bbox = (left + int(round(loc_x * ratio_x)), top + int(round(loc_y * ratio_y)), w, h)
+        return self.bbox, max(0.0, float(confidence))
+
+
+class CropSmoother:
+    """
+    Экспоненциальное сглаживание рамки (кропа или лица) между кадрами.
+
+    Скачок центра больше половины рамки (смена сцены, другой человек)
+    сбрасывает историю, чтобы кроп не "проплывал" через весь кадр.
+    """
+
+    def __init__(self, smoothing: float = CROP_SMOOTHING):
+        if not 0 <= smoothing < 1:
+            raise ValueError("smoothing должен быть в диапазоне [0, 1)")
+        self.smoothing = smoothing
+        self.state = None
+
+    def reset(self):
+        self.state = None
+
+    def update(
+        self,
+        box: Tuple[int, int, int, int],
+        image_size: Tuple[int, int]
+    ) -> Tuple[int, int, int, int]:
+        """Добавляет рамку (x, y, w, h) и возвращает сглаженную, не выходящую за кадр."""
+        box = np.asarray(box, dtype=np.float64)
+        if self.state is not None:
+            prev_center = self.state[:2] + self.state[2:] / 2
+            center = box[:2] + box[2:] / 2
+            if np.any(np.abs(center - prev_center) > self.state[2:] / 2):
+                self.state = None
+        if self.state is None:
+            self.state = box
+        else:
+            self.state = self.smoothing * self.state + (1 - self.smoothing) * box
+        img_w, img_h = image_size
+        w = int(round(min(self.state[2], img_w)))
+        h = int(round(min(self.state[3], img_h)))
+        x = int(round(min(max(self.state[0], 0), img_w - w)))
+        y = int(round(min(max(self.state[1], 0), img_h - h)))
+        return (x, y, max(1, w), max(1, h))
+
+
+class VideoCropper:
+    """
+    Кроп последовательности кадров одного ролика.
+
+    Детектор запускается на ключевых кадрах и когда трекер теряет лицо, между
+    ними рамку лица ведет TemplateTracker. По времени сглаживаются и рамка
+    кропа из calculate_orientation_crop, и рамка лица, по которой квадрат
+    вырезается из кропа, поэтому итоговое окно не дрожит от кадра к кадру
+    ни на горизонтальных, ни на вертикальных кадрах.
+    """
+
+    def __init__(
+        self,
+        cropper: Optional[FaceCropper] = None,
+        keyframe_interval: int = KEYFRAME_INTERVAL,
+        min_confidence: float = TRACK_MIN_CONFIDENCE,
+        smoothing: float = CROP_SMOOTHING
+    ):
+        """
+        Args:
+            cropper: Детектор и геометрия кропа (по умолчанию новый FaceCropper)
+            keyframe_interval: Детекция не реже чем раз в столько кадров
+            min_confidence: Порог уверенности трекера, ниже - повторная детекция
+            smoothing: Вес истории в сглаживании рамки кропа (0 - выключено)
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval должен быть >= 1")
+        self.cropper = cropper or FaceCropper()
+        self.keyframe_interval = keyframe_interval
+        self.min_confidence = min_confidence
+        self.smoother = CropSmoother(smoothing)
+        self.face_smoother = CropSmoother(smoothing)
+        self.tracker = TemplateTracker()
+        # Счетчики: frames, detections, tracked, track_lost
+        self.stats = Counter()
+        self.elapsed = 0.0
+        # Рамка кропа последнего кадра (x, y, w, h) или None для центрального
+        self.last_crop_box = None
+        # Итоговое квадратное окно последнего кадра в координатах кадра
+        self.last_square_box = None
+        self.reset()
+
+    def reset(self):
+        """Начинает новый ролик: сбрасывает трекер и сглаживание."""
+        self._drop_track()
+        self._since_detect = self.keyframe_interval
+        self._shape = None
+
+    def _drop_track(self):
+        """Забывает лицо: новый трекер, сглаживание начинается заново."""
+        self.tracker = TemplateTracker()
+        self.smoother.reset()
+        self.face_smoother.reset()
+        self._bbox = None
+
+    def face_for_frame(
+        self,
+        gray: np.ndarray,
+        target_size: int = 1024,
+        k: float = 2.5
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        Рамка лица на очередном кадре: трекинг или детекция.
+
+        Если детекция на ключевом кадре промахнулась, рамку ведет трекер,
+        пока он уверен. Если лицо не нашли ни детектор, ни трекер, трек
+        сбрасывается: кадр кропается по центру, а следующая детекция - на
+        ближайшем ключевом кадре.
+        """
+        if gray.shape != self._shape:
+            # Кадр другого размера - начинаем заново
+            self.reset()
+            self._shape = gray.shape
+        track_lost = False
+        if self._since_detect < self.keyframe_interval and self._bbox is not None:
+            bbox, confidence = self.tracker.update(gray)
+            if bbox is not None and confidence >= self.min_confidence:
+                self.stats['tracked'] += 1
+                self._since_detect += 1
+                self._bbox = bbox
+                return bbox
+            self.stats['track_lost'] += 1
+            track_lost = True
+        elif self._since_detect < self.keyframe_interval:
+            # Лица не было на прошлом ключевом кадре - ждем следующего
+            self._since_detect += 1
+            return None
+
+        self.stats['detections'] += 1
+        self._since_detect = 1
+        face = self.cropper._detect_scaled(gray, 1, target_size, k)
+        if face is not None:
+            self._bbox = face
+            self.tracker.init(gray, face)
+            return face
+        if self._bbox is not None and not track_lost:
+            # Промах детектора на ключевом кадре - держим лицо трекером
+            bbox, confidence = self.tracker.update(gray)
+            if bbox is not None and confidence >= self.min_confidence:
+                self.stats['tracked'] += 1
+                self._bbox = bbox
+                return bbox
+            self.stats['track_lost'] += 1
+        self._drop_track()
+        return None
+
+    def crop_frame(
+        self,
+        image: Image.Image,
+        target_size: int = 1024,
+        k: float = 2.5,
+        safety_margin: float = 0.15,
+        padding: str = "none"
+    ) -> Image.Image:
+        """Кропает очередной кадр ролика (кадры подаются по порядку)."""
+        start = time.perf_counter()
+        self.stats['frames'] += 1
+        cropper = self.cropper
+        image = cropper._fix_orientation(image)
+        size = image.size
+        self.last_crop_box = None
+        self.last_square_box = None
+
+        if not cropper.face_can_change_crop(size, target_size, padding):
+            result = cropper._center_crop_orientation(image, target_size)
+        else:
+            face = self.face_for_frame(cropper._to_gray(image), target_size, k)
+            if face is None:
+                result = cropper._center_crop_orientation(image, target_size)
+            elif padding != "none" and cropper._needs_padding(face, size, k, safety_margin):
+                result = cropper._padding_stage(
+                    image, face, target_size, k, safety_margin, padding
+                )
+            else:
+                crop_box = cropper.calculate_orientation_crop(face, size, k, safety_margin)
+                crop_box = self.smoother.update(crop_box, size)
+                # Квадрат вырезается по позиции лица в кропе - ее тоже
+                # сглаживаем, иначе на вертикальных кадрах дрожит окно
+                face = self.face_smoother.update(face, size)
+                plan = cropper._square_plan(face, crop_box, target_size)
+                self.last_crop_box = crop_box
+                self.last_square_box = self._square_in_frame(crop_box, plan)
+                result = cropper._apply_plan(image, plan)
+        self.elapsed += time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _square_in_frame(crop_box, plan) -> Tuple[int, int, int, int]:
+        """Итоговый квадрат плана (см. FaceCropper._square_plan) в координатах кадра."""
+        crop_x, crop_y, crop_w, crop_h = crop_box
+        _, (new_w, new_h), (left, top, right, bottom) = plan
+        scale_x, scale_y = crop_w / new_w, crop_h / new_h
+        return (
+            int(round(crop_x + left * scale_x)), int(round(crop_y + top * scale_y)),
+            int(round((right - left) * scale_x)), int(round((bottom - top) * scale_y))
+        )
+
+    def process(
+        self,
+        frames: Iterable[Image.Image],
+        target_size: int = 1024,
+        k: float = 2.5,
+        safety_margin: float = 0.15,
+        padding: str = "none"
+    ) -> Iterator[Image.Image]:
+        """Кропает ролик кадр за кадром."""
+        self.reset()
+        for frame in frames:
+            yield self.crop_frame(frame, target_size, k, safety_margin, padding)
+
+    def fps(self) -> float:
+        """Скорость обработки (кадров в секунду чистого времени кропа)."""
+        return self.stats['frames'] / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        """Краткий отчет о прогоне."""
+        return (
+            f"Кадров: {self.stats['frames']}, {self.fps():.1f} кадр/с; "
+            f"детекций: {self.stats['detections']}, трекинг: {self.stats['tracked']}, "
+            f"потерь трекинга: {self.stats['track_lost']}"
+        )
+
+
+def is_video_file(path: Path) -> bool:
+    """Проверяет расширение видеофайла."""
+    return path.is_file() and path.suffix.lower() in VIDEO_EXTENSIONS
+
+
+def sort_frames(paths: Iterable[Path]) -> List[Path]:
+    """Сортирует кадры по номеру в имени: frame_2 раньше frame_10."""
+    def key(path: Path):
+        return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', path.stem)]
+    return sorted(paths, key=key)
+
+
+def read_video(path: Path) -> Iterator[Image.Image]:
+    """Читает кадры видео через cv2.VideoCapture (RGB)."""
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise IOError(f"не удалось открыть видео {path}")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        capture.release()
+
+
+def video_fps(path: Path, default: float = 25.0) -> float:
+    """Частота кадров видео (default, если контейнер ее не сообщает)."""
+    capture = cv2.VideoCapture(str(path))
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+    finally:
+        capture.release()
+    return fps if fps and fps > 0 else default
+
+
+class VideoWriter:
+    """Запись квадратных кадров в видеофайл (mp4v)."""
+
+    def __init__(self, path: Path, fps: float, size: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.writer = cv2.VideoWriter(
+            str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (size, size)
+        )
+        if not self.writer.isOpened():
+            raise IOError(f"не удалось создать видео {path}")
+
+    def write(self, image: Image.Image):
+        self.writer.write(cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2BGR))
+
+    def close(self):
+        self.writer.release()
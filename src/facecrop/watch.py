@@ -0,0 +1,217 @@
+"""Слежение за папкой: новые и измененные файлы после завершения записи."""
+
+import os
+import queue
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog - необязательная зависимость
+    Observer = None
+    FileSystemEventHandler = object
+
+
+# Файл считается дописанным, если размер и mtime не менялись столько секунд
+SETTLE_SECONDS = 2.0
+
+# Сигнатура файла: (размер, mtime в наносекундах)
+Signature = Tuple[int, int]
+
+
+def file_signature(path: Path) -> Optional[Signature]:
+    """Размер и mtime файла или None, если файла нет."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class SettleTracker:
+    """
+    Файлы, в которые еще может идти запись.
+
+    Файл выдается, когда его сигнатура не менялась settle секунд. Для
+    каждого файла запоминается момент, когда его впервые заметили, - от него
+    считается задержка "положили → кроп".
+    """
+
+    def __init__(self, settle: float = SETTLE_SECONDS):
+        self.settle = settle
+        # path -> (сигнатура, момент последнего изменения, момент появления)
+        self._pending: Dict[Path, Tuple[Signature, float, Optional[float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def touch(self, path: Path, now: float, initial: bool = False):
+        """
+        Отмечает событие по файлу.
+
+        initial - файл найден при запуске: момент его появления неизвестен,
+        задержка для него не считается.
+        """
+        first_seen = None if initial else now
+        signature = file_signature(path)
+        if signature is None:
+            self._pending.pop(path, None)
+            return
+        previous = self._pending.get(path)
+        if previous is not None:
+            first_seen = previous[2]
+            if previous[0] == signature:
+                return
+        self._pending[path] = (signature, now, first_seen)
+
+    def ready(self, now: float) -> List[Tuple[Path, Optional[float]]]:
+        """Забирает дописанные файлы: [(путь, момент появления)]."""
+        settled = []
+        for path, (signature, changed_at, first_seen) in list(self._pending.items()):
+            current = file_signature(path)
+            if current is None:
+                del self._pending[path]
+            elif current != signature:
+                self._pending[path] = (current, now, first_seen)
+            elif now - changed_at >= self.settle:
+                del self._pending[path]
+                settled.append((path, first_seen))
+        return settled
+
+
+class _EventQueue(FileSystemEventHandler):
+    """Складывает пути из событий watchdog в очередь."""
+
+    def __init__(self):
+        super().__init__()
+        self.paths = queue.SimpleQueue()
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.paths.put(Path(getattr(event, 'dest_path', '') or event.src_path))
+
+
+class FolderWatcher:
+    """
+    Источник новых и измененных изображений в папке.
+
+    Если установлен watchdog, события приходят от ОС (inotify на Linux),
+    иначе папка периодически сканируется и сравнивается со снимком. В обоих
+    случаях файл выдается только после того, как запись в него закончилась.
+    Файлы, которые уже лежали в папке при запуске, тоже выдаются (без
+    задержки) - решать, нужна ли им обработка, должен вызывающий код.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        extensions: Iterable[str],
+        recursive: bool = False,
+        settle: float = SETTLE_SECONDS,
+        ignore: Iterable[Path] = (),
+        use_events: Optional[bool] = None
+    ):
+        """
+        Args:
+            root: Папка для слежения
+            extensions: Расширения изображений (в нижнем регистре, с точкой)
+            recursive: Следить и за вложенными папками
+            settle: Сколько секунд файл должен не меняться
+            ignore: Папки, которые не отслеживаются (например, выходная
+                внутри входной)
+            use_events: True/False - принудительно события ОС/опрос,
+                None - события, если доступен watchdog
+        """
+        if use_events and Observer is None:
+            raise RuntimeError("для событий ОС нужен пакет watchdog (pip install watchdog)")
+        self.root = Path(root)
+        self.extensions = {ext.lower() for ext in extensions}
+        self.recursive = recursive
+        self.ignore = [Path(path).resolve() for path in ignore]
+        self.tracker = SettleTracker(settle)
+        if use_events is None:
+            use_events = Observer is not None
+        self.mode = "events" if use_events else "polling"
+        self._observer = None
+        self._events = None
+        self._snapshot: Dict[Path, Signature] = {}
+
+        if self.mode == "events":
+            self._events = _EventQueue()
+            self._observer = Observer()
+            self._observer.schedule(self._events, str(self.root), recursive=recursive)
+            self._observer.start()
+        # Стартовый снимок: и для опроса, и чтобы не пропустить уже лежащие файлы
+        now = time.monotonic()
+        self._snapshot = self._scan()
+        for path in self._snapshot:
+            self.tracker.touch(path, now, initial=True)
+
+    def _wanted(self, path: Path) -> bool:
+        if path.suffix.lower() not in self.extensions:
+            return False
+        if not self.recursive and path.parent != self.root:
+            return False
+        if not self.ignore:
+            return True
+        resolved = path.resolve()
+        return not any(ignored == resolved or ignored in resolved.parents for ignored in self.ignore)
+
+    def _scan(self) -> Dict[Path, Signature]:
+        snapshot = {}
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                path = Path(entry.path)
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive and not any(path.resolve() == ignored for ignored in self.ignore):
+                        stack.append(path)
+                elif self._wanted(path):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def _changes(self) -> Set[Path]:
+        if self.mode == "events":
+            changed = set()
+            while True:
+                try:
+                    path = self._events.paths.get_nowait()
+                except queue.Empty:
+                    break
+                if self._wanted(path):
+                    changed.add(path)
+            return changed
+        snapshot = self._scan()
+        changed = {path for path, signature in snapshot.items() if self._snapshot.get(path) != signature}
+        self._snapshot = snapshot
+        return changed
+
+    def poll(self) -> List[Tuple[Path, Optional[float]]]:
+        """
+        Забирает файлы, запись в которые закончилась.
+
+        Returns:
+            [(путь, момент появления по time.monotonic() или None для
+            файлов, найденных при запуске)]
+        """
+        now = time.monotonic()
+        for path in self._changes():
+            self.tracker.touch(path, now)
+        return self.tracker.ready(now)
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
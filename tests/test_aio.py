@@ -0,0 +1,97 @@
+"""Тесты для asyncio API."""
+
+import asyncio
+import io
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from src.facecrop import aio
+from src.facecrop.aio import AsyncCropper, crop_async
+
+
+def _encode(size, image_format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (120, 100, 90)).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class TestAsyncCropper(unittest.IsolatedAsyncioTestCase):
+    """Тесты для AsyncCropper."""
+
+    async def asyncSetUp(self):
+        self.pool = AsyncCropper(workers=2, max_pending=2, target_size=64)
+
+    async def asyncTearDown(self):
+        await self.pool.__aexit__(None, None, None)
+
+    async def test_crop_returns_encoded_bytes(self):
+        data = await self.pool.crop(_encode((300, 200)))
+        image = Image.open(io.BytesIO(data))
+        self.assertEqual((image.format, image.size), ('JPEG', (64, 64)))
+
+        data = await self.pool.crop(_encode((300, 200)), target_size=32, output_format='PNG')
+        image = Image.open(io.BytesIO(data))
+        self.assertEqual((image.format, image.size), ('PNG', (32, 32)))
+        self.assertEqual(self.pool.stats['detect_run'], 2)
+
+    async def test_crop_many_keeps_order_and_errors(self):
+        inputs = [_encode((300 + 20 * i, 200)) for i in range(5)]
+        inputs[2] = b"not an image"
+        results = [result async for result in self.pool.crop_many(inputs, target_size=32)]
+
+        self.assertEqual([result.index for result in results], list(range(5)))
+        self.assertEqual([result.ok for result in results], [True, True, False, True, True])
+        self.assertEqual(Image.open(io.BytesIO(results[4].data)).size, (32, 32))
+
+    async def test_crop_many_backpressure(self):
+        pulled = []
+
+        async def source():
+            for i in range(10):
+                pulled.append(i)
+                yield _encode((300, 200))
+
+        results = self.pool.crop_many(source())
+        await results.__anext__()
+        # Прочитано не больше окна max_pending и одного входа сверх него
+        self.assertLessEqual(len(pulled), self.pool.max_pending + 1)
+        await results.aclose()
+
+    async def test_cancel_releases_slots(self):
+        data = _encode((1200, 800))
+        tasks = [asyncio.ensure_future(self.pool.crop(data)) for _ in range(4)]
+        await asyncio.sleep(0)
+        for task in tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertTrue(all(task.cancelled() for task in tasks[1:]))
+
+        # Места в пуле вернулись: новые изображения не ждут вечно
+        results = await asyncio.wait_for(
+            asyncio.gather(*(self.pool.crop(data) for _ in range(3))), timeout=60
+        )
+        self.assertEqual(len(results), 3)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            AsyncCropper(workers=-1)
+
+    def test_threads_governed_only_on_request(self):
+        with mock.patch.object(aio, 'configure_threads') as configure:
+            AsyncCropper(workers=3).close()
+            configure.assert_not_called()
+            AsyncCropper(workers=3, govern_threads=True).close()
+            configure.assert_called_once_with(3)
+
+
+class TestCropAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_default_pool(self):
+        data = await crop_async(_encode((300, 200), 'PNG'), target_size=48)
+        image = Image.open(io.BytesIO(data))
+        self.assertEqual((image.format, image.size), ('PNG', (48, 48)))
+
+
+if __name__ == '__main__':
+    unittest.main()
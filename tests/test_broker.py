@@ -0,0 +1,166 @@
+"""Тесты для очереди заданий и режима воркера."""
+
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from src.facecrop.broker import JobQueue, LeaseKeeper
+from src.facecrop.core import FaceCropper
+from src.facecrop.main import run_worker
+
+
+class TestJobQueue(unittest.TestCase):
+    """Тесты для JobQueue."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Path(self.tmp.name) / "queue.db"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _jobs(self, n):
+        return [(Path(f"in/{i}.jpg"), Path(f"out/{i}_square.jpg")) for i in range(n)]
+
+    def test_enqueue_skips_existing(self):
+        queue = JobQueue(self.db)
+        self.assertEqual(queue.enqueue(self._jobs(3)), 3)
+        self.assertEqual(queue.enqueue(self._jobs(5)), 2)
+        self.assertEqual(queue.counts()['pending'], 5)
+        queue.close()
+
+    def test_claim_and_complete(self):
+        """Задание выдается один раз и после complete не возвращается."""
+        queue = JobQueue(self.db)
+        queue.enqueue(self._jobs(2))
+        first, second = queue.claim(), queue.claim()
+
+        self.assertEqual((first.input, second.input), (Path("in/0.jpg"), Path("in/1.jpg")))
+        self.assertIsNone(queue.claim())
+        queue.complete(first)
+        queue.complete(second)
+        self.assertEqual(queue.counts()['done'], 2)
+        queue.close()
+
+    def test_retry_then_dead_letter(self):
+        """После max_attempts неудач задание уходит в dead-letter."""
+        queue = JobQueue(self.db, max_attempts=2)
+        queue.enqueue(self._jobs(1))
+        queue.fail(queue.claim(), "битый файл")
+        job = queue.claim()
+        self.assertEqual(job.attempts, 2)
+        queue.fail(job, "битый файл")
+
+        self.assertIsNone(queue.claim())
+        self.assertEqual(queue.counts()['dead'], 1)
+        self.assertEqual(list(queue.dead_jobs()), [("in/0.jpg", "битый файл")])
+        queue.close()
+
+    def test_expired_lease_is_reclaimed(self):
+        """Задание упавшего воркера снова выдается после истечения аренды."""
+        crashed = JobQueue(self.db, lease_seconds=0.05)
+        crashed.enqueue(self._jobs(1))
+        crashed.claim()
+        crashed.close()
+
+        queue = JobQueue(self.db, lease_seconds=0.05)
+        self.assertIsNone(queue.claim())
+        time.sleep(0.1)
+        job = queue.claim()
+        self.assertIsNotNone(job)
+        self.assertEqual(job.attempts, 2)
+        queue.close()
+
+    def test_late_report_after_reclaim_is_ignored(self):
+        """Воркер с истекшей арендой не может отчитаться за чужое задание."""
+        slow = JobQueue(self.db, lease_seconds=0.05)
+        slow.enqueue(self._jobs(1))
+        stale = slow.claim()
+        time.sleep(0.1)
+
+        other = JobQueue(self.db, lease_seconds=0.05)
+        other.worker_id = "other:1"
+        current = other.claim()
+        self.assertEqual(current.attempts, 2)
+
+        self.assertFalse(slow.complete(stale))
+        self.assertFalse(slow.fail(stale, "поздно"))
+        self.assertFalse(slow.renew(stale))
+        self.assertEqual(other.counts()['running'], 1)
+        # Поздний fail не снял аренду: третьему воркеру задание не выдается
+        self.assertTrue(other.renew(current))
+        self.assertIsNone(slow.claim())
+
+        self.assertTrue(other.complete(current))
+        self.assertEqual(other.counts()['done'], 1)
+        slow.close()
+        other.close()
+
+    def test_lease_keeper_renews_long_job(self):
+        """Задание дольше аренды не выдается второй раз, пока его продлевают."""
+        queue = JobQueue(self.db, lease_seconds=0.15)
+        queue.enqueue(self._jobs(1))
+        job = queue.claim()
+        other = JobQueue(self.db, lease_seconds=0.15)
+        other.worker_id = "other:1"
+        with LeaseKeeper(queue, job) as lease:
+            time.sleep(0.5)
+            self.assertIsNone(other.claim())
+        self.assertFalse(lease.lost)
+        self.assertTrue(queue.complete(job))
+        queue.close()
+        other.close()
+
+    def test_concurrent_claims_are_exclusive(self):
+        """Несколько соединений не получают одно задание дважды."""
+        JobQueue(self.db).enqueue(self._jobs(60))
+        claimed = []
+        lock = threading.Lock()
+
+        def worker():
+            queue = JobQueue(self.db)
+            while True:
+                job = queue.claim()
+                if job is None:
+                    break
+                with lock:
+                    claimed.append(job.id)
+                queue.complete(job)
+            queue.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(claimed), list(range(1, 61)))
+
+
+class TestRunWorker(unittest.TestCase):
+    """Тесты для run_worker."""
+
+    def test_processes_queue_until_empty(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            Image.new('RGB', (300, 200), (120, 130, 140)).save(root / "good.jpg")
+            (root / "bad.jpg").write_bytes(b"not an image")
+            queue = JobQueue(root / "queue.db", max_attempts=1)
+            queue.enqueue([
+                (root / "good.jpg", root / "out" / "good_square.jpg"),
+                (root / "bad.jpg", root / "out" / "bad_square.jpg"),
+            ])
+
+            done = run_worker(queue, FaceCropper(), 64, 2.5, "none", False, exit_when_empty=True)
+
+            self.assertEqual(done, 1)
+            self.assertEqual(Image.open(root / "out" / "good_square.jpg").size, (64, 64))
+            self.assertEqual(queue.counts(), {'pending': 0, 'running': 0, 'done': 1, 'dead': 1})
+            queue.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
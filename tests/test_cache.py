@@ -0,0 +1,95 @@
+"""Тесты для кэша результатов."""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.facecrop.cache import ResultCache, cache_key, file_digest
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_depends_on_every_setting(self):
+        base = cache_key("abc", 1024, 2.5)
+        self.assertEqual(base, cache_key("abc", 1024, 2.5, "none", "max", "JPEG", 95))
+        variants = [
+            cache_key("abd", 1024, 2.5),
+            cache_key("abc", 512, 2.5),
+            cache_key("abc", 1024, 3.0),
+            cache_key("abc", 1024, 2.5, padding="blur"),
+            cache_key("abc", 1024, 2.5, resampling="balanced"),
+            cache_key("abc", 1024, 2.5, output_format="PNG"),
+            cache_key("abc", 1024, 2.5, quality=90),
+        ]
+        self.assertEqual(len(set(variants + [base])), len(variants) + 1)
+        # 2.5 из слайдера и 2.50 - один ключ
+        self.assertEqual(cache_key("abc", 1024, 2.50), cache_key("abc", 1024, 5 / 2))
+
+
+class TestResultCache(unittest.TestCase):
+    """Тесты для ResultCache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.root = self.dir / "cache"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _file(self, name, size):
+        path = self.dir / name
+        path.write_bytes(name.encode()[:1] * size)
+        return path
+
+    def test_hit_and_miss(self):
+        cache = ResultCache(self.root, max_bytes=1000)
+        source = self._file("a", 100)
+        out = self.dir / "out"
+        self.assertFalse(cache.get("k1", out))
+        cache.put("k1", source)
+        self.assertTrue(cache.get("k1", out))
+        self.assertEqual(out.read_bytes(), source.read_bytes())
+        self.assertEqual((cache.stats['hits'], cache.stats['misses']), (1, 1))
+        self.assertEqual(cache.hit_rate, 0.5)
+        self.assertEqual(file_digest(out), file_digest(source))
+
+    def test_lru_eviction_by_size(self):
+        cache = ResultCache(self.root, max_bytes=250)
+        for key in ("a", "b"):
+            cache.put(key, self._file(key, 100))
+        cache.get("a", self.dir / "out")  # "b" становится самым старым
+        cache.put("c", self._file("c", 100))
+
+        self.assertEqual(cache.total_bytes, 200)
+        self.assertFalse(cache.get("b", self.dir / "out"))
+        self.assertTrue(cache.get("a", self.dir / "out"))
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertEqual(sorted(p.stem for p in self.root.iterdir()), ["a", "c"])
+
+    def test_oversized_entry_not_stored(self):
+        cache = ResultCache(self.root, max_bytes=50)
+        cache.put("a", self._file("a", 100))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        cache = ResultCache(self.root, max_bytes=1000)
+        cache.put("a", self._file("a", 100))
+        cache.invalidate("a")
+        cache.invalidate("missing")
+        self.assertFalse(cache.get("a", self.dir / "out"))
+        self.assertEqual((cache.total_bytes, cache.stats['invalidations']), (0, 1))
+
+    def test_survives_restart_in_lru_order(self):
+        cache = ResultCache(self.root, max_bytes=1000)
+        for i, key in enumerate(("old", "new")):
+            cache.put(key, self._file(key, 100))
+            os.utime(self.root / f"{key}.bin", ns=(i * 10**9, i * 10**9))
+
+        reopened = ResultCache(self.root, max_bytes=150)
+        self.assertEqual(len(reopened), 1)
+        self.assertTrue(reopened.get("new", self.dir / "out"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,37 @@
 """Тесты для core функций."""
 
+import io
+import tempfile
 import unittest
+from pathlib import Path
+from unittest import mock
 import numpy as np
 from PIL import Image
 
-from src.facecrop.core import FaceCropper
+from src.facecrop.core import (
+    FaceCropper, ORIENTATION_TRANSPOSE, RESAMPLING_POLICIES, merge_boxes, resize_image
+)
+from src.facecrop.main import create_visualization
+
+
+def _smooth_image(width, height):
+    """Гладкое тестовое изображение без симметрий."""
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    return Image.fromarray(np.stack([
+        255 * xx / width,
+        255 * yy / height,
+        128 + 100 * np.sin((xx + 2 * yy) / 23.0),
+    ], axis=-1).astype(np.uint8))
+
+
+def _with_orientation(image, orientation):
+    """Сохраняет изображение с EXIF ориентацией и открывает заново."""
+    exif = Image.Exif()
+    exif[274] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', exif=exif)
+    buffer.seek(0)
+    return Image.open(buffer)
 
 
 class TestFaceCropper(unittest.TestCase):
@@ -103,6 +130,403 @@ class TestFaceCropper(unittest.TestCase):
         image = Image.new('RGB', (100, 100), color=(128, 128, 128))
         avg_color = self.cropper._get_average_color(image)
         self.assertEqual(avg_color, (128, 128, 128))
+    
+    def test_mirror_padding_reflects_all_sides(self):
+        """Зеркальный padding отражает изображение со всех сторон."""
+        content = np.arange(40 * 30 * 3, dtype=np.uint8).reshape(40, 30, 3)
+        image = Image.fromarray(content)
+        result = np.asarray(self.cropper._mirror_padding(image, 60))
+        
+        self.assertEqual(result.shape, (60, 60, 3))
+        left, top = (60 - 30) // 2, (60 - 40) // 2
+        # Центр - исходное изображение
+        np.testing.assert_array_equal(result[top:top + 40, left:left + 30], content)
+        # Столбец слева от изображения - зеркало первого столбца
+        np.testing.assert_array_equal(result[top:top + 40, left - 1], content[:, 0])
+        # Справа и снизу тоже отражение, а не пустота
+        np.testing.assert_array_equal(result[top:top + 40, left + 30], content[:, -1])
+        np.testing.assert_array_equal(result[top + 40, left:left + 30], content[-1])
+    
+    def test_padding_applied_when_face_does_not_fit(self):
+        """padding применяется, если лицо с запасом не помещается в квадрат."""
+        image = Image.new('RGB', (400, 300), color=(0, 200, 0))
+        # Лицо 200px: нужен кроп 200 * 2.5 * 1.15 = 575 > 300
+        self.cropper._detect_face_gray = lambda gray, **kwargs: (100, 50, 200, 200)
+        
+        result = self.cropper.crop_to_square_with_face(
+            image, target_size=256, padding="solid"
+        )
+        self.assertEqual(result.size, (256, 256))
+        
+        # Без padding кроп прежний
+        plain = self.cropper.crop_to_square_with_face(
+            image, target_size=256, padding="none"
+        )
+        self.assertEqual(plain.size, (256, 256))
+    
+    def test_padding_fills_with_background(self):
+        """Фон padding заполняет края квадрата вокруг вписанной области."""
+        image = Image.new('RGB', (300, 100), color=(10, 20, 30))
+        self.cropper._detect_face_gray = lambda gray, **kwargs: (130, 20, 60, 60)
+        
+        result = self.cropper.crop_to_square_with_face(
+            image, target_size=120, padding="mirror"
+        )
+        pixels = np.asarray(result)
+        self.assertEqual(pixels.shape, (120, 120, 3))
+        # Зеркальный фон повторяет цвет изображения, а не белый фон
+        np.testing.assert_array_equal(pixels[0, 0], (10, 20, 30))
+        np.testing.assert_array_equal(pixels[-1, -1], (10, 20, 30))
+    
+    def test_blur_padding_close_to_full_resolution_blur(self):
+        """
+        Фон, размытый в малом масштабе, близок к тому же фону, построенному
+        в полном размере.
+        
+        Эталон - не прежний алгоритм (он масштабировал по большей стороне
+        кропа), а текущая геометрия фона, собранная в полном размере:
+        оригинал покрывает весь квадрат, LANCZOS и ядро 51x51.
+        """
+        import cv2
+        
+        target_size = 512
+        yy, xx = np.mgrid[0:600, 0:800].astype(np.float32)
+        original = Image.fromarray(np.stack([
+            128 + 100 * np.sin(xx / 37.0),
+            128 + 100 * np.cos(yy / 53.0),
+            128 + 60 * np.sin((xx + yy) / 71.0),
+        ], axis=-1).astype(np.uint8))
+        content = original.resize((300, 512))
+        
+        # Эталон: оригинал покрывает квадрат (масштаб по меньшей стороне),
+        # LANCZOS до target и ядро 51x51 в полном размере
+        scale = target_size / min(original.size)
+        enlarged = original.resize(
+            (int(original.size[0] * scale), int(original.size[1] * scale)),
+            Image.Resampling.LANCZOS
+        )
+        left = (enlarged.size[0] - target_size) // 2
+        top = (enlarged.size[1] - target_size) // 2
+        reference = enlarged.crop((left, top, left + target_size, top + target_size))
+        reference = cv2.GaussianBlur(np.array(reference), (51, 51), 0)
+        
+        fast = np.asarray(self.cropper._blur_padding(content, target_size, original))
+        
+        self.assertEqual(fast.shape, reference.shape)
+        diff = np.abs(fast.astype(np.int16) - reference.astype(np.int16))
+        # Без учета краевых эффектов интерполяции
+        inner = diff[16:-16, 16:-16]
+        self.assertLess(inner.mean(), 1.5)
+        self.assertLess(np.percentile(inner, 99), 6)
+    
+    def test_fix_orientation_all_exif_values(self):
+        """_fix_orientation поддерживает все 8 значений EXIF ориентации."""
+        stored = _smooth_image(60, 40)
+        for orientation in range(1, 9):
+            image = _with_orientation(stored, orientation)
+            result = self.cropper._fix_orientation(image)
+            transpose = ORIENTATION_TRANSPOSE.get(orientation)
+            expected = stored.transpose(transpose) if transpose is not None else stored
+            np.testing.assert_array_equal(np.asarray(result), np.asarray(expected))
+    
+    def test_box_to_stored_matches_transpose(self):
+        """Box в отображаемых координатах переводится в сохраненные пиксели."""
+        stored = _smooth_image(13, 9)
+        box = (2, 1, 7, 5)
+        for orientation in range(1, 9):
+            transpose = ORIENTATION_TRANSPOSE.get(orientation)
+            display = stored.transpose(transpose) if transpose is not None else stored
+            expected = np.asarray(display.crop(box))
+            result = self.cropper._crop_oriented(stored, box, orientation)
+            np.testing.assert_array_equal(np.asarray(result), expected, err_msg=str(orientation))
+    
+    def test_orient_array_matches_transpose(self):
+        """Полутоновая копия для детекции разворачивается как изображение."""
+        stored = _smooth_image(13, 9)
+        for orientation in range(1, 9):
+            transpose = ORIENTATION_TRANSPOSE.get(orientation)
+            display = stored.transpose(transpose) if transpose is not None else stored
+            result = self.cropper._orient_array(np.asarray(stored), orientation)
+            np.testing.assert_array_equal(result, np.asarray(display), err_msg=str(orientation))
+    
+    def test_crop_with_exif_orientation_matches_upright(self):
+        """Кроп с EXIF ориентацией совпадает с кропом заранее повернутого кадра."""
+        stored = _smooth_image(360, 240)
+        for orientation in range(1, 9):
+            transpose = ORIENTATION_TRANSPOSE.get(orientation)
+            upright = stored.transpose(transpose) if transpose is not None else stored
+            shapes = []
+            
+            def fake_detect(gray, **kwargs):
+                shapes.append(gray.shape)
+                height, width = gray.shape
+                return (width // 3, height // 4, width // 8, width // 8)
+            
+            self.cropper._detect_face_gray = fake_detect
+            # При k=8 лицо не помещается и срабатывает padding
+            for padding, k in (("none", 1.5), ("mirror", 8), ("blur", 8)):
+                expected = self.cropper.crop_to_square_with_face(
+                    upright, target_size=96, k=k, padding=padding
+                )
+                result = self.cropper.crop_to_square_with_face(
+                    _with_orientation(stored, orientation), target_size=96, k=k,
+                    padding=padding
+                )
+                self.assertEqual(result.size, (96, 96))
+                diff = np.abs(
+                    np.asarray(result).astype(np.int16) - np.asarray(expected).astype(np.int16)
+                )
+                self.assertLessEqual(diff.max(), 2, msg=f"{orientation} {padding}")
+            # Детектор получает кадр в отображаемой ориентации
+            self.assertEqual(shapes[0], shapes[1])
+            
+            # Fallback без лица
+            self.cropper._detect_face_gray = lambda gray, **kwargs: None
+            expected = self.cropper.crop_to_square_with_face(upright, target_size=96)
+            result = self.cropper.crop_to_square_with_face(
+                _with_orientation(stored, orientation), target_size=96
+            )
+            diff = np.abs(
+                np.asarray(result).astype(np.int16) - np.asarray(expected).astype(np.int16)
+            )
+            self.assertLessEqual(diff.max(), 2, msg=f"{orientation} fallback")
+    
+    def test_detection_params_scale_with_image_and_output(self):
+        """Границы детекции зависят от размера изображения, target_size и k."""
+        # Небольшое изображение детектируется в полном размере
+        scale, min_size, max_size, scale_factor = self.cropper.detection_params((640, 480))
+        self.assertEqual(scale, 1.0)
+        self.assertEqual(min_size, 30)
+        self.assertEqual(max_size, 480)
+        
+        # Большое изображение уменьшается, но не грубее половины target_size
+        scale, min_size, max_size, scale_factor = self.cropper.detection_params(
+            (6000, 4000), target_size=1024, k=2.5
+        )
+        self.assertLess(scale, 1.0)
+        self.assertGreaterEqual(4000 * scale, 512)
+        self.assertGreaterEqual(min_size, 24)
+        self.assertLessEqual(max_size, int(4000 * scale))
+        self.assertGreaterEqual(scale_factor, 1.1)
+        
+        # Больший target_size требует более детального кадра
+        larger_scale = self.cropper.detection_params((6000, 4000), target_size=2048)[0]
+        self.assertGreater(larger_scale, scale)
+    
+    def test_detect_scaled_maps_bbox_to_full_resolution(self):
+        """bbox из уменьшенного кадра переводится в координаты полного размера."""
+        gray = np.zeros((4000, 6000), dtype=np.uint8)
+        seen = []
+        
+        def fake_detect(small, **kwargs):
+            seen.append(small.shape)
+            height, width = small.shape
+            return (width // 2, height // 4, width // 10, width // 10)
+        
+        self.cropper._detect_face_gray = fake_detect
+        x, y, w, h = self.cropper._detect_scaled(gray, 1, 1024, 2.5)
+        
+        self.assertLess(seen[0][1], 6000)
+        self.assertAlmostEqual(x, 3000, delta=10)
+        self.assertAlmostEqual(y, 1000, delta=10)
+        self.assertAlmostEqual(w, 600, delta=10)
+    
+    def test_face_can_change_crop(self):
+        """Предпроверка геометрии по размерам изображения."""
+        self.assertFalse(self.cropper.face_can_change_crop((800, 800), 1024))
+        # Сдвиг меньше пикселя результата
+        self.assertFalse(self.cropper.face_can_change_crop((1001, 1000), 512))
+        self.assertFalse(self.cropper.face_can_change_crop((1000, 1001), 512))
+        self.assertTrue(self.cropper.face_can_change_crop((1010, 1000), 512))
+        self.assertTrue(self.cropper.face_can_change_crop((600, 800), 512))
+        # С padding от лица зависит наличие фона
+        self.assertTrue(self.cropper.face_can_change_crop((800, 800), 1024, "blur"))
+    
+    def test_detection_skipped_for_square_images(self):
+        """Для квадратного кадра детекция не запускается и учитывается в stats."""
+        def fail_detect(gray, **kwargs):
+            raise AssertionError("детекция не должна вызываться")
+        
+        self.cropper._detect_face_gray = fail_detect
+        image = Image.new('RGB', (300, 300), color=(1, 2, 3))
+        result = self.cropper.crop_to_square_with_face(image, target_size=128)
+        
+        self.assertEqual(result.size, (128, 128))
+        self.assertEqual(self.cropper.stats['detect_skipped'], 1)
+        self.assertEqual(self.cropper.stats['detect_run'], 0)
+        
+        self.cropper._detect_face_gray = lambda gray, **kwargs: None
+        self.cropper.crop_to_square_with_face(Image.new('RGB', (300, 400)), target_size=128)
+        self.assertEqual(self.cropper.stats['detect_run'], 1)
+    
+    def test_tiles_cover_every_allowed_face(self):
+        """Любое лицо до maxSize целиком попадает хотя бы в один тайл."""
+        shape, max_size = (800, 5333), 400
+        tiles = self.cropper._tile_boxes(shape, max_size)
+        self.assertGreater(len(tiles), 1)
+        for x in range(0, shape[1] - max_size + 1, 37):
+            self.assertTrue(any(
+                x0 <= x and x + max_size <= x1 and y0 == 0 and y1 == shape[0]
+                for x0, y0, x1, y1 in tiles
+            ), msg=str(x))
+    
+    def test_merge_boxes(self):
+        """NMS объединяет дубли и обрезанные на стыке лица."""
+        boxes = [
+            (100, 100, 200, 200),
+            (105, 98, 196, 204),   # дубль из соседнего тайла
+            (100, 120, 90, 150),   # обрезанная стыком часть того же лица
+            (900, 100, 50, 50),    # другое лицо
+        ]
+        merged = merge_boxes(boxes)
+        self.assertEqual(len(merged), 2)
+        self.assertIn((100, 100, 200, 200), merged)
+        self.assertIn((900, 100, 50, 50), merged)
+    
+    def test_tiled_detection_matches_whole_frame(self):
+        """Тайловая детекция возвращает то же самое большое лицо."""
+        faces = [(2950, 200, 380, 380), (600, 50, 120, 120)]
+        
+        full = np.zeros((800, 5333), dtype=np.uint8)
+        
+        class FakeCascade:
+            """Находит лица, целиком лежащие в переданном тайле."""
+            def empty(self):
+                return False
+            
+            def detectMultiScale(self, tile, **kwargs):
+                # Тайл - view на full, его смещение восстанавливаем по адресу
+                offset = tile.ctypes.data - full.ctypes.data
+                y0, x0 = divmod(offset, full.strides[0])
+                height, width = tile.shape
+                found = []
+                for x, y, w, h in faces:
+                    if x >= x0 and x + w <= x0 + width:
+                        found.append((x - x0, y - y0, w, h))
+                    elif x < x0 + width and x + w > x0:
+                        # Лицо на стыке - частичный бокс
+                        left, right = max(x, x0), min(x + w, x0 + width)
+                        found.append((left - x0, y - y0, right - left, h))
+                return found
+        
+        fake = FakeCascade()
+        cropper = FaceCropper(tiled="on", tile_workers=3)
+        cropper.face_cascade = fake
+        cropper._thread_cascade = lambda tier="default": fake
+        result = cropper._detect_tiled(full, max_size=(400, 400))
+        
+        self.assertEqual(result, (2950, 200, 380, 380))
+        self.assertEqual(cropper.stats['tiled_detections'], 1)
+    
+    def test_tiled_mode_selection(self):
+        """Режим auto включает тайлы только для больших кадров и нескольких потоков."""
+        self.assertFalse(FaceCropper(tiled="off")._use_tiles((800, 5333), 400))
+        self.assertTrue(FaceCropper(tiled="on")._use_tiles((800, 5333), 400))
+        self.assertTrue(FaceCropper(tiled="auto", tile_workers=4)._use_tiles((800, 5333), 400))
+        self.assertFalse(FaceCropper(tiled="auto", tile_workers=1)._use_tiles((800, 5333), 400))
+        self.assertFalse(FaceCropper(tiled="auto", tile_workers=4)._use_tiles((600, 800), 400))
+        with self.assertRaises(ValueError):
+            FaceCropper(tiled="maybe")
+    
+    def test_roi_first_detection(self):
+        """Сначала ищем в априорной области, весь кадр - только при промахе."""
+        cropper = FaceCropper(roi=(0.25, 0.0, 0.75, 0.5))
+        gray = np.zeros((400, 600), dtype=np.uint8)
+        calls = []
+        
+        def fake_detect(region, **kwargs):
+            calls.append(region.shape)
+            return (10, 20, 40, 40)
+        
+        cropper._detect_face_gray = fake_detect
+        face = cropper._detect_scaled(gray, 1, 256, 2.5)
+        # Бокс из области переводится в координаты кадра
+        self.assertEqual(face, (150 + 10, 20, 40, 40))
+        self.assertEqual(calls, [(200, 300)])
+        self.assertEqual(cropper.stats['roi_hit'], 1)
+        
+        # Промах в области - повторная детекция по всему кадру
+        calls.clear()
+        cropper._detect_face_gray = lambda region, **kwargs: (
+            calls.append(region.shape) or (None if region.shape != gray.shape else (5, 5, 50, 50))
+        )
+        face = cropper._detect_scaled(gray, 1, 256, 2.5)
+        self.assertEqual(face, (5, 5, 50, 50))
+        self.assertEqual(calls, [(200, 300), (400, 600)])
+        self.assertEqual(cropper.stats['roi_miss'], 1)
+        
+        with self.assertRaises(ValueError):
+            FaceCropper(roi=(0.5, 0.0, 0.4, 1.0))
+    
+    def test_detector_tiers_run_only_on_miss(self):
+        """Следующая ступень детектора запускается только при промахе."""
+        cropper = FaceCropper(tiers=("fast", "default", "profile"))
+        gray = np.zeros((400, 600), dtype=np.uint8)
+        calls = []
+        hits = {"profile": (10, 10, 60, 60)}
+        
+        def fake_detect(region, tier="default", **kwargs):
+            calls.append((tier, region.shape))
+            return hits.get(tier)
+        
+        cropper._detect_face_gray = fake_detect
+        face = cropper._detect_scaled(gray, 1, 256, 2.5)
+        
+        self.assertEqual(face, (10, 10, 60, 60))
+        # Дешевая ступень работает на уменьшенном кадре
+        self.assertEqual(calls, [
+            ("fast", (200, 300)), ("default", (400, 600)), ("profile", (400, 600))
+        ])
+        self.assertEqual(cropper.stats['tier_hit:profile'], 1)
+        
+        # Попадание дешевой ступени - дорогие не запускаются
+        calls.clear()
+        hits["fast"] = (5, 5, 30, 30)
+        face = cropper._detect_scaled(gray, 1, 256, 2.5)
+        self.assertEqual(face, (10, 10, 60, 60))
+        self.assertEqual([tier for tier, shape in calls], ["fast"])
+        self.assertEqual(cropper.stats['tier_run:fast'], 2)
+        self.assertEqual(cropper.stats['tier_run:default'], 1)
+        
+        with self.assertRaises(ValueError):
+            FaceCropper(tiers=("fast", "dnn"))
+    
+    def test_resampling_policies_close_to_full_lanczos(self):
+        """Быстрые политики (reduce + LANCZOS) почти не отличаются от max."""
+        image = _smooth_image(1800, 1200)
+        box = (300, 0, 1500, 1200)
+        reference = np.asarray(resize_image(image, (200, 200), "max", box), dtype=np.int16)
+        for policy in RESAMPLING_POLICIES:
+            result = resize_image(image, (200, 200), policy, box)
+            self.assertEqual(result.size, (200, 200))
+            self.assertLess(np.abs(np.asarray(result, dtype=np.int16) - reference).mean(), 1.0)
+        
+        # По умолчанию результат не меняется: LANCZOS из полного разрешения
+        self.assertEqual(FaceCropper().resampling, "max")
+        cropped = FaceCropper(resampling="fast").crop_to_square_with_face(image, target_size=200)
+        self.assertEqual(cropped.size, (200, 200))
+        with self.assertRaises(ValueError):
+            FaceCropper(resampling="bicubic")
+    
+    def test_visualization_uses_crop_detection(self):
+        """--visualize ищет лицо тем же путем, что и кроп (с target_size и k)."""
+        cropper = FaceCropper()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "a.jpg"
+            exif = Image.Exif()
+            exif[0x0112] = 6
+            _smooth_image(800, 600).save(path, exif=exif)
+            with mock.patch.object(cropper, '_detect_or_reuse', return_value=(200, 300, 100, 100)) as detect, \
+                    mock.patch.object(cropper, 'detect_face') as legacy:
+                create_visualization(path, Path(tmp) / "vis.jpg", cropper, 256, 3.0)
+            
+            gray, orientation, target_size, k = detect.call_args.args
+            self.assertEqual((gray.shape, orientation, target_size, k), ((600, 800), 6, 256, 3.0))
+            legacy.assert_not_called()
+            # Визуализация в отображаемой ориентации, рамка лица зеленая
+            vis = np.asarray(Image.open(Path(tmp) / "vis.jpg"))
+            self.assertEqual(vis.shape[:2], (800, 600))
+            self.assertGreater(vis[350, 200, 1], 200)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,99 @@
+"""Тесты для OpenCV бэкенда."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.facecrop.core import FaceCropper
+from src.facecrop.cv_backend import crop_array, read_array, write_array
+from src.facecrop.main import run_pipelined
+
+
+def _photo(width, height):
+    """Плавное цветное изображение: разница фильтров ресайза на нем мала."""
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    rgb = np.stack([
+        128 + 100 * np.sin(xx / 37.0),
+        128 + 100 * np.cos(yy / 53.0),
+        128 + 60 * np.sin((xx + yy) / 71.0),
+    ], axis=-1)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+
+
+def _stub_cropper(face):
+    cropper = FaceCropper()
+    cropper._detect_scaled = lambda gray, orientation, target_size, k: face
+    return cropper
+
+
+class TestCropArray(unittest.TestCase):
+    """crop_array совпадает с PIL путем с точностью до фильтра ресайза."""
+
+    def _assert_matches(self, image, face, padding="none"):
+        expected = np.asarray(
+            _stub_cropper(face).crop_to_square_with_face(image, 256, padding=padding).convert('RGB')
+        )
+        bgr = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+        result = crop_array(_stub_cropper(face), bgr, 256, padding=padding)[:, :, ::-1]
+
+        self.assertEqual(result.shape, expected.shape)
+        self.assertLess(np.abs(result.astype(np.int16) - expected).mean(), 2.0)
+
+    def test_landscape_face(self):
+        self._assert_matches(_photo(1200, 600), (700, 150, 120, 150))
+
+    def test_portrait_face(self):
+        self._assert_matches(_photo(500, 1000), (180, 120, 110, 130))
+
+    def test_no_face_and_square_fallback(self):
+        self._assert_matches(_photo(900, 600), None)
+        self._assert_matches(_photo(600, 600), (200, 200, 100, 100))
+
+    def test_padding_falls_back_to_pil(self):
+        self._assert_matches(_photo(800, 400), (350, 100, 200, 250), padding="solid")
+
+
+class TestReadWrite(unittest.TestCase):
+    """Тесты для read_array и write_array."""
+
+    def test_read_applies_exif_orientation(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "rotated.jpg"
+            exif = Image.Exif()
+            exif[274] = 6
+            _photo(300, 200).save(path, 'JPEG', exif=exif)
+
+            self.assertEqual(read_array(path).shape, (300, 200, 3))
+
+    def test_png_round_trip_and_bad_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            array = cv2.cvtColor(np.asarray(_photo(64, 48)), cv2.COLOR_RGB2BGR)
+            write_array(array, Path(tmp) / "out" / "a.png")
+            np.testing.assert_array_equal(read_array(Path(tmp) / "out" / "a.png"), array)
+
+            (Path(tmp) / "bad.jpg").write_bytes(b"not an image")
+            (Path(tmp) / "empty.jpg").write_bytes(b"")
+            for name in ("bad.jpg", "empty.jpg"):
+                with self.assertRaises(ValueError):
+                    read_array(Path(tmp) / name)
+
+    def test_run_pipelined_opencv_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _photo(320, 200).save(root / "a.jpg")
+            (root / "bad.jpg").write_bytes(b"not an image")
+            jobs = [(root / "a.jpg", root / "out" / "a_square.jpg"),
+                    (root / "bad.jpg", root / "out" / "bad_square.jpg")]
+
+            done = run_pipelined(jobs, 64, 2.5, "none", False, backend="opencv")
+
+            self.assertEqual(done, 1)
+            self.assertEqual(Image.open(root / "out" / "a_square.jpg").size, (64, 64))
+
+
+if __name__ == '__main__':
+    unittest.main()
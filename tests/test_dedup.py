@@ -0,0 +1,108 @@
+"""Тесты для повторного использования детекций на почти-дубликатах."""
+
+import io
+import unittest
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.facecrop.core import FaceCropper
+from src.facecrop.dedup import DetectionIndex, dhash
+
+
+def _photo(width=640, height=480, seed=0):
+    """Плавное изображение со случайной структурой."""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, size=(height // 16, width // 16, 3), dtype=np.uint8)
+    return Image.fromarray(cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC))
+
+
+def _hash(image):
+    gray = np.asarray(image.convert('L'))
+    return dhash(cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA))
+
+
+def _distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class TestDhash(unittest.TestCase):
+    """Тесты для dhash."""
+
+    def test_stable_for_near_duplicates(self):
+        """Пересохранение и уменьшение почти не меняют хеш."""
+        image = _photo()
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=50)
+        resaved = Image.open(io.BytesIO(buffer.getvalue()))
+        resized = image.resize((448, 336), Image.Resampling.BILINEAR)
+
+        self.assertLessEqual(_distance(_hash(image), _hash(resaved)), 3)
+        self.assertLessEqual(_distance(_hash(image), _hash(resized)), 3)
+
+    def test_differs_for_different_images(self):
+        self.assertGreater(_distance(_hash(_photo(seed=1)), _hash(_photo(seed=2))), 10)
+
+
+class TestDetectionIndex(unittest.TestCase):
+    """Тесты для DetectionIndex."""
+
+    def test_lookup_respects_distance_and_aspect(self):
+        """Совпадение - только в пределах порога и при тех же пропорциях."""
+        index = DetectionIndex(max_distance=2)
+        index.add(0b1111, 1.5, (0.1, 0.2, 0.3, 0.4))
+        index.add(0xFF00, 1.0, None)
+
+        self.assertEqual(index.lookup(0b0111, 1.5), (True, (0.1, 0.2, 0.3, 0.4)))
+        self.assertEqual(index.lookup(0b0001, 1.5), (False, None))
+        self.assertEqual(index.lookup(0b1111, 1.0), (False, None))
+        # Промах детекции тоже переиспользуется
+        self.assertEqual(index.lookup(0xFF00, 1.0), (True, None))
+
+    def test_grows_beyond_initial_capacity(self):
+        index = DetectionIndex(max_distance=0)
+        for key in range(200):
+            index.add(key << 8, 1.0, (key, 0, 0, 0))
+        self.assertEqual(len(index), 200)
+        self.assertEqual(index.lookup(150 << 8, 1.0), (True, (150, 0, 0, 0)))
+
+    def test_invalid_distance(self):
+        with self.assertRaises(ValueError):
+            DetectionIndex(max_distance=65)
+
+
+class TestFaceCropperDedup(unittest.TestCase):
+    """Тесты для повторного использования bbox в FaceCropper."""
+
+    def test_duplicate_reuses_scaled_bbox(self):
+        """Уменьшенная копия не детектируется, bbox масштабируется к ее размеру."""
+        index = DetectionIndex()
+        cropper = FaceCropper(dedup=index)
+        calls = []
+
+        def detect(gray, orientation, target_size, k):
+            calls.append(gray.shape)
+            return (320, 160, 80, 80)
+
+        cropper._detect_scaled = detect
+        image = _photo(seed=0)
+        copy = image.resize((320, 240), Image.Resampling.BILINEAR)
+
+        self.assertEqual(cropper._detect_or_reuse(cropper._to_gray(image), 1, 512, 2.5), (320, 160, 80, 80))
+        self.assertEqual(cropper._detect_or_reuse(cropper._to_gray(copy), 1, 512, 2.5), (160, 80, 40, 40))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cropper.stats['dedup_hit'], 1)
+        self.assertEqual(cropper.stats['dedup_miss'], 1)
+
+    def test_different_images_are_detected(self):
+        cropper = FaceCropper(dedup=DetectionIndex())
+        calls = []
+        cropper._detect_scaled = lambda gray, *args: calls.append(1)
+        for seed in (4, 5):
+            cropper._detect_or_reuse(cropper._to_gray(_photo(seed=seed)), 1, 512, 2.5)
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
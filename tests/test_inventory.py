@@ -0,0 +1,97 @@
+"""Тесты для инвентаризации по заголовкам."""
+
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from PIL import Image
+
+from src.facecrop.inventory import ImageInfo, expected_runtime, order_by_cost, scan_image, scan_jobs
+from src.facecrop.main import prescan_jobs
+
+
+class TestScan(unittest.TestCase):
+    """Тесты для scan_image."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_header_fields(self):
+        path = self.dir / "rotated.jpg"
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new('RGB', (300, 200)).save(path, exif=exif)
+
+        info = scan_image(path)
+        self.assertTrue(info.ok)
+        self.assertEqual(info.size, (300, 200))
+        self.assertEqual(info.format, 'JPEG')
+        self.assertEqual(info.orientation, 6)
+
+    def test_unreadable(self):
+        path = self.dir / "bad.jpg"
+        path.write_bytes(b"not an image")
+
+        info = scan_image(path)
+        self.assertFalse(info.ok)
+        self.assertEqual(info.cost, 0.0)
+
+    def test_cost_grows_with_size(self):
+        small = ImageInfo("a.jpg", (800, 600), 'JPEG')
+        large = ImageInfo("b.jpg", (4000, 3000), 'JPEG')
+        png = ImageInfo("c.png", (4000, 3000), 'PNG')
+        self.assertLess(small.cost, large.cost)
+        self.assertLess(large.cost, png.cost)
+
+
+class TestOrdering(unittest.TestCase):
+    """Тесты для order_by_cost и expected_runtime."""
+
+    def test_most_expensive_first_and_stable(self):
+        infos = [
+            ImageInfo("a.jpg", (800, 600), 'JPEG'),
+            ImageInfo("b.jpg", (4000, 3000), 'JPEG'),
+            ImageInfo("c.jpg", (800, 600), 'JPEG'),
+        ]
+        jobs = [(info.path, Path(f"out_{i}.jpg")) for i, info in enumerate(infos)]
+        ordered = order_by_cost(jobs, infos)
+        self.assertEqual([job[0].name for job in ordered], ["b.jpg", "a.jpg", "c.jpg"])
+
+    def test_expected_runtime(self):
+        self.assertEqual(expected_runtime([1, 1, 1, 1], 2), 2)
+        # Большое задание в конце задерживает прогон, в начале - нет
+        self.assertEqual(expected_runtime([1, 1, 4], 2), 5)
+        self.assertEqual(expected_runtime([4, 1, 1], 2), 4)
+        self.assertEqual(expected_runtime([], 4), 0)
+
+
+class TestPrescanJobs(unittest.TestCase):
+    """Тесты для prescan_jobs из CLI."""
+
+    def test_drops_unreadable_and_orders(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for name, size in (("a.jpg", (300, 200)), ("b.jpg", (1200, 800))):
+                Image.new('RGB', size).save(tmp / name)
+            (tmp / "c.jpg").write_bytes(b"")
+            jobs = [(tmp / name, tmp / "out" / name) for name in ("a.jpg", "b.jpg", "c.jpg")]
+
+            out = io.StringIO()
+            with redirect_stdout(out):
+                ordered, unreadable = prescan_jobs(jobs, workers=2)
+
+        self.assertEqual([job[0].name for job in ordered], ["b.jpg", "a.jpg"])
+        self.assertEqual(unreadable, [tmp / "c.jpg"])
+        self.assertIn("Инвентаризация: 2 изображений", out.getvalue())
+        self.assertIn("Нечитаемых файлов: 1", out.getvalue())
+        self.assertEqual(len(scan_jobs(jobs[:1])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+"""Тесты для изолированной обработки с лимитами."""
+
+import io
+import pickle
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image
+
+from src.facecrop.dedup import DetectionIndex
+from src.facecrop.isolate import (
+    CRASHED, ERROR, MEMORY, OK, TIMEOUT, IsolatedWorker, decodes_reduced, load_reduced, partial_path
+)
+from src.facecrop.main import run_isolated
+from src.facecrop.shard import RunReport
+
+
+class TestIsolatedWorker(unittest.TestCase):
+    """Тесты для IsolatedWorker (запускают процессы-воркеры)."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.image = self.dir / "photo.jpg"
+        Image.new('RGB', (600, 400), (120, 100, 90)).save(self.image)
+        self.worker = None
+
+    def tearDown(self):
+        if self.worker is not None:
+            self.worker.close()
+        self.tmp.cleanup()
+
+    def test_success_reuses_process(self):
+        self.worker = IsolatedWorker(timeout=60)
+        for i in range(2):
+            result = self.worker.process(self.image, self.dir / f"out_{i}.jpg", 128, 2.5)
+            self.assertEqual(result.status, OK)
+            self.assertIsNone(result.limit)
+        self.assertEqual(Image.open(self.dir / "out_1.jpg").size, (128, 128))
+        self.assertEqual(result.stats['detect_run'], 1)
+        self.assertEqual(self.worker.restarts, 0)
+
+    def test_broken_file_is_not_retried(self):
+        bad = self.dir / "bad.jpg"
+        bad.write_bytes(b"not an image")
+        self.worker = IsolatedWorker(timeout=60)
+        result = self.worker.process(bad, self.dir / "out.jpg", 128, 2.5)
+        self.assertEqual(result.status, ERROR)
+        self.assertIsNone(result.limit)
+        self.assertEqual(self.worker.restarts, 0)
+
+    def test_timeout_kills_and_retries_reduced(self):
+        self.worker = IsolatedWorker(timeout=0.001)
+        result = self.worker.process(self.image, self.dir / "out.jpg", 128, 2.5)
+        self.assertEqual(result.status, TIMEOUT)
+        self.assertEqual(result.limit, TIMEOUT)
+        self.assertIn("уменьшенный", result.error)
+        self.assertEqual(self.worker.restarts, 2)
+
+    def test_memory_limit(self):
+        big = self.dir / "big.png"
+        Image.new('RGB', (3000, 3000), (120, 100, 90)).save(big, compress_level=1)
+        self.worker = IsolatedWorker(timeout=60, memory_limit=4 << 20)
+        result = self.worker.process(big, self.dir / "out.jpg", 128, 2.5)
+        self.assertEqual(result.limit, MEMORY)
+        self.assertFalse(result.ok)
+        # PNG уменьшенным не декодируется - повтора нет
+        self.assertIn("без повтора", result.error)
+        self.assertEqual(self.worker.restarts, 1)
+
+    def test_killed_attempt_leaves_no_partial_output(self):
+        output = self.dir / "out.jpg"
+        partial_path(output).write_bytes(b"half a jpeg")
+        self.worker = IsolatedWorker(timeout=0.001)
+        self.worker.process(self.image, output, 128, 2.5)
+        self.assertFalse(partial_path(output).exists())
+        self.assertFalse(output.exists())
+
+    def test_worker_dead_between_jobs_is_restarted(self):
+        """Процесс, умерший между заданиями, считается падением, а не обрывает прогон."""
+        self.worker = IsolatedWorker(timeout=60)
+        self.assertTrue(self.worker.process(self.image, self.dir / "out_0.jpg", 128, 2.5).ok)
+        self.worker._process.kill()
+        self.worker._process.join()
+
+        result = self.worker.process(self.image, self.dir / "out_1.jpg", 128, 2.5)
+        self.assertEqual(result.limit, CRASHED)
+        self.assertTrue(result.ok)
+        self.assertEqual(self.worker.restarts, 1)
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            IsolatedWorker(timeout=0)
+        with self.assertRaises(ValueError):
+            IsolatedWorker(memory_limit=-1)
+
+
+class TestLoadReduced(unittest.TestCase):
+    """Тесты для load_reduced."""
+
+    def test_jpeg_and_png(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            exif = Image.Exif()
+            exif[0x0112] = 6
+            for name in ("a.jpg", "a.png"):
+                path = Path(tmp) / name
+                Image.new('RGB', (800, 600)).save(path, exif=exif)
+                image = load_reduced(path, 4)
+                self.assertEqual(image.size, (200, 150))
+                self.assertEqual(image.getexif().get(0x0112), 6)
+            self.assertEqual(
+                [decodes_reduced(Path(tmp) / name) for name in ("a.jpg", "a.png", "missing.jpg")],
+                [True, False, False]
+            )
+
+
+class TestRunIsolated(unittest.TestCase):
+    """Тесты для run_isolated из CLI."""
+
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            jobs = []
+            for i in range(3):
+                path = tmp / f"img_{i}.jpg"
+                Image.new('RGB', (300 + 50 * i, 200)).save(path)
+                jobs.append((path, tmp / "out" / path.name))
+            jobs[1][0].write_bytes(b"")
+            # dedup индекс копируется в каждый процесс
+            options = dict(dedup=DetectionIndex(4))
+            report = RunReport()
+            with redirect_stdout(io.StringIO()) as out, redirect_stderr(io.StringIO()):
+                success = run_isolated(
+                    jobs, 64, 2.5, "none", workers=2, timeout=60,
+                    cropper_options=options, report=report
+                )
+
+            self.assertEqual(success, 2)
+            self.assertEqual((report.total, report.success), (3, 2))
+            self.assertEqual(report.failed, [str(jobs[1][0])])
+            self.assertIn("Изоляция: 3", out.getvalue())
+            self.assertTrue((tmp / "out" / "img_2.jpg").exists())
+
+    def test_worker_start_failure_is_reported(self):
+        """Незапустившийся процесс-воркер не теряет задания из отчета."""
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            jobs = []
+            for i in range(3):
+                path = tmp / f"img_{i}.jpg"
+                Image.new('RGB', (300, 200)).save(path)
+                jobs.append((path, tmp / "out" / path.name))
+            report = RunReport()
+            failure = RuntimeError("процесс-воркер не запустился (код 1)")
+            with mock.patch.object(IsolatedWorker, '_start', side_effect=failure), \
+                    redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()) as err:
+                success = run_isolated(jobs, 64, 2.5, "none", workers=2, timeout=60, report=report)
+
+            self.assertEqual(success, 0)
+            self.assertEqual(report.total, 3)
+            self.assertEqual(report.failed, sorted(str(job[0]) for job in jobs))
+            self.assertIn("не запустился", err.getvalue())
+
+    def test_detection_index_pickles(self):
+        index = DetectionIndex(4)
+        copy = pickle.loads(pickle.dumps(index))
+        self.assertEqual(copy.max_distance, 4)
+        self.assertEqual(len(copy), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
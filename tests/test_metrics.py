@@ -0,0 +1,96 @@
+"""Тесты для метрик Prometheus."""
+
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from src.facecrop.cache import ResultCache
+from src.facecrop.core import FaceCropper
+from src.facecrop.metrics import CollectorRegistry, UIMetrics, rss_bytes
+
+
+@unittest.skipIf(CollectorRegistry is None, "prometheus_client не установлен")
+class TestUIMetrics(unittest.TestCase):
+    """Тесты для UIMetrics."""
+
+    def setUp(self):
+        self.metrics = UIMetrics()
+
+    def _value(self, name, **labels):
+        return self.metrics.registry.get_sample_value(name, labels or None)
+
+    def test_crop_splits_detect_and_resample(self):
+        """Время детекции и промахи берутся из cropper.stats, остальное - resample."""
+        cropper = FaceCropper()
+        cropper._detect_scaled = lambda gray, orientation, target_size, k: None
+        with self.metrics.job(), self.metrics.crop(cropper):
+            cropper.crop_to_square_with_face(Image.new('RGB', (600, 400)), target_size=128)
+
+        self.assertEqual(self._value('facecrop_stage_seconds_count', stage='detect'), 1)
+        self.assertEqual(self._value('facecrop_stage_seconds_count', stage='resample'), 1)
+        self.assertEqual(self._value('facecrop_stage_seconds_count', stage='decode'), 0)
+        self.assertEqual(self._value('facecrop_center_fallbacks_total'), 1)
+        self.assertEqual(self._value('facecrop_images_processed_total'), 1)
+
+    def test_crop_ignores_other_threads_on_shared_cropper(self):
+        """Общий FaceCropper: работа других потоков не попадает в вызов."""
+        cropper = FaceCropper()
+        cropper._detect_scaled = lambda gray, orientation, target_size, k: (250, 150, 100, 100)
+
+        def other_thread():
+            cropper._count('detect_seconds', 100.0)
+            cropper._count('center_fallback')
+
+        with self.metrics.crop(cropper):
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            thread.join()
+            cropper.crop_to_square_with_face(Image.new('RGB', (600, 400)), target_size=128)
+
+        self.assertLess(self._value('facecrop_stage_seconds_sum', stage='detect'), 100.0)
+        self.assertEqual(self._value('facecrop_center_fallbacks_total'), 0)
+        self.assertEqual(cropper.stats['center_fallback'], 1)
+
+    def test_job_counts_errors_and_in_flight(self):
+        with self.metrics.job():
+            self.assertEqual(self._value('facecrop_in_flight_jobs'), 1)
+        with self.assertRaises(OSError):
+            with self.metrics.job():
+                raise OSError("битый файл")
+
+        self.assertEqual(self._value('facecrop_in_flight_jobs'), 0)
+        self.assertEqual(self._value('facecrop_errors_total'), 1)
+        self.assertEqual(self._value('facecrop_images_processed_total'), 1)
+
+    def test_cache_counters(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResultCache(Path(tmp) / "cache", max_bytes=1000)
+            self.metrics.track_cache(cache)
+            source = Path(tmp) / "result.jpg"
+            source.write_bytes(b"x" * 10)
+            cache.get("a", Path(tmp) / "out.jpg")
+            cache.put("a", source)
+            cache.get("a", Path(tmp) / "out.jpg")
+
+            self.assertEqual(self._value('facecrop_cache_hits_total'), 1)
+            self.assertEqual(self._value('facecrop_cache_misses_total'), 1)
+            self.assertEqual(self._value('facecrop_cache_bytes'), 10)
+
+    def test_exposition(self):
+        with self.metrics.time('encode'):
+            pass
+        text = self.metrics.exposition().decode()
+        self.assertIn('facecrop_stage_seconds_bucket{le="0.005",stage="encode"} 1.0', text)
+        self.assertGreater(self._value('facecrop_rss_bytes'), 0)
+
+
+class TestRss(unittest.TestCase):
+    def test_rss_bytes(self):
+        self.assertGreater(rss_bytes(), 1 << 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
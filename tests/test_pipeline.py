@@ -0,0 +1,165 @@
+"""Тесты для конвейерной обработки."""
+
+import threading
+import time
+import unittest
+
+from src.facecrop.pipeline import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    """Тесты для Pipeline."""
+
+    def test_all_jobs_processed(self):
+        """Все задания проходят через три стадии."""
+        written = {}
+        pipeline = Pipeline(
+            read=lambda job: job * 10,
+            compute_factory=lambda: (lambda job, data: data + 1),
+            write=lambda job, data: written.__setitem__(job, data),
+            workers=3
+        )
+        results = pipeline.run(range(20))
+
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(written, {i: i * 10 + 1 for i in range(20)})
+
+    def test_errors_do_not_stop_pipeline(self):
+        """Ошибка в одном задании не останавливает остальные."""
+        def read(job):
+            if job == 2:
+                raise IOError("битый файл")
+            return job
+
+        def compute_factory():
+            def compute(job, data):
+                if job == 4:
+                    raise ValueError("ошибка кропа")
+                return data
+            return compute
+
+        pipeline = Pipeline(read, compute_factory, lambda job, data: None)
+        results = {r.job: r for r in pipeline.run(range(6))}
+
+        self.assertFalse(results[2].ok)
+        self.assertIsInstance(results[2].error, IOError)
+        self.assertFalse(results[4].ok)
+        self.assertIsInstance(results[4].error, ValueError)
+        self.assertEqual(sum(r.ok for r in results.values()), 4)
+
+    def test_memory_bounded_by_queues(self):
+        """Чтение не убегает вперед медленной записи дальше размера очередей."""
+        lock = threading.Lock()
+        in_flight = [0]
+        peak = [0]
+
+        def read(job):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            return job
+
+        def write(job, data):
+            time.sleep(0.005)
+            with lock:
+                in_flight[0] -= 1
+
+        queue_size = 2
+        workers = 1
+        pipeline = Pipeline(
+            read, lambda: (lambda job, data: data), write,
+            queue_size=queue_size, workers=workers
+        )
+        pipeline.run(range(30))
+
+        # Две очереди + по одному элементу в работе у каждой стадии
+        self.assertLessEqual(peak[0], 2 * queue_size + workers + 2)
+
+    def test_one_compute_instance_per_worker(self):
+        """compute_factory вызывается один раз на поток вычислений."""
+        created = []
+        lock = threading.Lock()
+
+        def compute_factory():
+            with lock:
+                created.append(threading.get_ident())
+            return lambda job, data: data
+
+        Pipeline(lambda j: j, compute_factory, lambda j, d: None, workers=4).run(range(10))
+        self.assertEqual(len(created), 4)
+
+    def test_compute_factory_error_is_raised(self):
+        """Ошибка создания детектора останавливает конвейер, а не вешает его."""
+        def compute_factory():
+            raise RuntimeError("каскад не загрузился")
+
+        pipeline = Pipeline(
+            read=lambda job: job,
+            compute_factory=compute_factory,
+            write=lambda job, data: None,
+            queue_size=1,
+            workers=2
+        )
+        errors = []
+
+        def run():
+            try:
+                pipeline.run(range(100))
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        runner = threading.Thread(target=run, daemon=True)
+        runner.start()
+        runner.join(timeout=10)
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(errors, ["каскад не загрузился"])
+
+    def test_partial_compute_factory_failure_is_raised(self):
+        """Один поток вычислений не создался - остальные дорабатывают и завершаются."""
+        created = []
+        lock = threading.Lock()
+
+        def compute_factory():
+            with lock:
+                created.append(None)
+                first = len(created) == 1
+            if first:
+                raise RuntimeError("каскад не загрузился")
+
+            def compute(job, data):
+                time.sleep(0.3)
+                return data
+            return compute
+
+        pipeline = Pipeline(
+            read=lambda job: job,
+            compute_factory=compute_factory,
+            write=lambda job, data: None,
+            queue_size=1,
+            workers=2
+        )
+        errors = []
+
+        def run():
+            try:
+                pipeline.run(range(10))
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        runner = threading.Thread(target=run, daemon=True)
+        runner.start()
+        runner.join(timeout=10)
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(errors, ["каскад не загрузился"])
+
+    def test_invalid_settings(self):
+        """Некорректные параметры отклоняются."""
+        with self.assertRaises(ValueError):
+            Pipeline(lambda j: j, lambda: None, lambda j, d: None, queue_size=0)
+        with self.assertRaises(ValueError):
+            Pipeline(lambda j: j, lambda: None, lambda j, d: None, workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Тесты для шардирования и объединения отчетов."""
+
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+from src.facecrop.shard import RunReport, merge_reports, parse_shard, select_shard, shard_of
+
+
+class TestSharding(unittest.TestCase):
+    """Тесты для разбиения входных файлов."""
+
+    def _jobs(self, root, names):
+        return [(root / name, Path('out') / name) for name in names]
+
+    def test_shards_partition_all_jobs(self):
+        """Каждое задание попадает ровно в один шард, выходные пути не меняются."""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            jobs = self._jobs(root, [f"dir{i % 3}/img_{i}.jpg" for i in range(100)])
+            shards = [select_shard(jobs, root, i, 4) for i in range(1, 5)]
+
+            merged = sorted(job for shard in shards for job in shard)
+            self.assertEqual(merged, sorted(jobs))
+            self.assertTrue(all(shard for shard in shards))
+
+    def test_independent_of_mount_point(self):
+        """Разбиение зависит только от относительного пути."""
+        with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+            names = [f"img_{i}.jpg" for i in range(50)]
+            shard_a = select_shard(self._jobs(Path(a), names), Path(a), 2, 3)
+            shard_b = select_shard(self._jobs(Path(b), names), Path(b), 2, 3)
+            self.assertEqual([j[1] for j in shard_a], [j[1] for j in shard_b])
+
+    def test_shard_of_is_stable(self):
+        """Номер шарда фиксирован (не зависит от рандомизации hash())."""
+        self.assertEqual(shard_of("a/b.jpg", 7), shard_of("a/b.jpg", 7))
+        self.assertTrue(all(1 <= shard_of(f"{i}.jpg", 5) <= 5 for i in range(50)))
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for value in ("0/4", "5/4", "2", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+
+class TestReports(unittest.TestCase):
+    """Тесты для RunReport и merge_reports."""
+
+    def test_merge(self):
+        """Счетчики суммируются, время - максимум по шардам."""
+        first = RunReport((1, 2), total=10, success=9, failed=["a.jpg"],
+                          stats=Counter(detect_run=8), wall_time=3.0)
+        second = RunReport((2, 2), total=5, success=5, stats=Counter(detect_run=4), wall_time=5.0)
+        merged, warnings = merge_reports([first, second])
+
+        self.assertEqual((merged.total, merged.success), (15, 14))
+        self.assertEqual(merged.failed, ["a.jpg"])
+        self.assertEqual(merged.stats['detect_run'], 12)
+        self.assertEqual(merged.wall_time, 5.0)
+        self.assertEqual(warnings, [])
+
+    def test_merge_warns_on_missing_and_repeated(self):
+        reports = [RunReport((1, 3)), RunReport((1, 3))]
+        _, warnings = merge_reports(reports)
+        self.assertEqual(len(warnings), 2)
+
+    def test_round_trip(self):
+        report = RunReport((2, 3), total=4, success=3, failed=["x.png"],
+                           stats=Counter(dedup_hit=2), wall_time=1.5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "report.json"
+            report.save(path)
+            loaded = RunReport.load(path)
+        self.assertEqual(loaded.to_dict(), report.to_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Тесты для потокового режима stdin/stdout."""
+
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from pathlib import Path
+
+from PIL import Image
+
+from src.facecrop.core import FaceCropper
+from src.facecrop.main import run_stdio, run_stream_paths
+from src.facecrop.stream import read_frames, read_paths, write_frame
+
+
+def _jpeg_bytes(size=(300, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (100, 120, 140)).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class TestReadPaths(unittest.TestCase):
+    """Тесты для read_paths."""
+
+    def test_newline_delimited(self):
+        stream = io.BytesIO(b"a.jpg\r\n\nb c.png\nlast.webp")
+        self.assertEqual(list(read_paths(stream)), [Path("a.jpg"), Path("b c.png"), Path("last.webp")])
+
+    def test_nul_delimited_keeps_newlines_in_names(self):
+        stream = io.BytesIO(b"odd\nname.jpg\0b.jpg\0")
+        self.assertEqual(list(read_paths(stream, b'\0')), [Path("odd\nname.jpg"), Path("b.jpg")])
+
+    def test_records_split_across_reads(self):
+        """Запись, разрезанная между порциями чтения, собирается целиком."""
+        class Trickle(io.BytesIO):
+            def read1(self, size=-1):
+                return super().read1(3)
+
+        paths = list(read_paths(Trickle(b"first.jpg\nsecond.jpg\n")))
+        self.assertEqual(paths, [Path("first.jpg"), Path("second.jpg")])
+
+
+class TestFrames(unittest.TestCase):
+    """Тесты для кадров длина + данные."""
+
+    def test_round_trip(self):
+        stream = io.BytesIO()
+        for data in (b"abc", b"", b"x" * 1000):
+            write_frame(stream, data)
+        stream.seek(0)
+        self.assertEqual(list(read_frames(stream)), [b"abc", b"", b"x" * 1000])
+
+    def test_truncated_frame(self):
+        stream = io.BytesIO()
+        write_frame(stream, b"abcdef")
+        with self.assertRaises(EOFError):
+            list(read_frames(io.BytesIO(stream.getvalue()[:-2])))
+
+
+class TestStdio(unittest.TestCase):
+    """Тесты для run_stdio."""
+
+    def test_single_image(self):
+        stdout = io.BytesIO()
+        run_stdio("single", FaceCropper(), 64, 2.5, "none",
+                  stdin=io.BytesIO(_jpeg_bytes()), stdout=stdout)
+        result = Image.open(io.BytesIO(stdout.getvalue()))
+        self.assertEqual((result.format, result.size), ('JPEG', (64, 64)))
+
+    def test_framed_answers_every_frame(self):
+        """Битый кадр получает пустой ответ, остальные обрабатываются."""
+        stdin = io.BytesIO()
+        for data in (_jpeg_bytes(), b"not an image", _jpeg_bytes((200, 300))):
+            write_frame(stdin, data)
+        stdin.seek(0)
+        stdout = io.BytesIO()
+
+        done = run_stdio("framed", FaceCropper(), 32, 2.5, "none", "PNG", stdin=stdin, stdout=stdout)
+
+        stdout.seek(0)
+        answers = list(read_frames(stdout))
+        self.assertEqual(done, 2)
+        self.assertEqual(len(answers), 3)
+        self.assertEqual(answers[1], b"")
+        self.assertEqual(Image.open(io.BytesIO(answers[2])).format, 'PNG')
+
+
+class TestStreamPaths(unittest.TestCase):
+    """Тесты для run_stream_paths."""
+
+    def test_outputs_result_paths(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "in" / "sub").mkdir(parents=True)
+            Image.new('RGB', (300, 200)).save(root / "in" / "sub" / "a.jpg")
+            Image.new('RGB', (300, 200)).save(root / "b.png")
+            stdin = io.BytesIO(f"{root / 'in' / 'sub' / 'a.jpg'}\n{root / 'b.png'}\n".encode())
+            stdout = io.BytesIO()
+
+            done = run_stream_paths(stdin, root / "out", 48, 2.5, "none",
+                                    root=root / "in", out=stdout)
+
+            self.assertEqual(done, 2)
+            expected = {root / "out" / "sub" / "a_square.jpg", root / "out" / "b_square.png"}
+            self.assertEqual({Path(p) for p in stdout.getvalue().decode().split()}, expected)
+            self.assertTrue(all(path.exists() for path in expected))
+    
+    def test_flat_name_collision_is_reported(self):
+        """Одинаковые имена вне root не перезаписывают результат друг друга."""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for folder, color in (("x", (255, 0, 0)), ("y", (0, 0, 255))):
+                (root / folder).mkdir()
+                Image.new('RGB', (300, 200), color).save(root / folder / "a.png")
+            stdin = io.BytesIO(f"{root / 'x' / 'a.png'}\n{root / 'y' / 'a.png'}\n".encode())
+            stdout = io.BytesIO()
+            stderr = io.StringIO()
+
+            with redirect_stderr(stderr):
+                done = run_stream_paths(stdin, root / "out", 48, 2.5, "none", out=stdout)
+
+            self.assertEqual(done, 1)
+            self.assertEqual(stdout.getvalue().decode().split(), [str(root / "out" / "a_square.png")])
+            self.assertIn(str(root / 'y' / 'a.png'), stderr.getvalue())
+            # Результат остался от первого файла
+            with Image.open(root / "out" / "a_square.png") as result:
+                self.assertEqual(result.getpixel((24, 24)), (255, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
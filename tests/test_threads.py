@@ -0,0 +1,114 @@
+"""Тесты для согласования потоков OpenCV."""
+
+import io
+import os
+import sys
+import threading
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+import cv2
+
+from src.facecrop import main, threads
+from src.facecrop.core import FaceCropper
+from src.facecrop.threads import THREAD_ENV_VARS, configure_threads, cv_threads_for
+
+
+class TestConfigureThreads(unittest.TestCase):
+    """Тесты для cv_threads_for и configure_threads."""
+
+    def setUp(self):
+        self.cv_threads = cv2.getNumThreads()
+        patcher = mock.patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in THREAD_ENV_VARS:
+            os.environ.pop(name, None)
+        exported = mock.patch.object(threads, '_exported', set())
+        exported.start()
+        self.addCleanup(exported.stop)
+
+    def tearDown(self):
+        cv2.setNumThreads(self.cv_threads)
+
+    def test_cv_threads_for(self):
+        self.assertEqual(cv_threads_for(1, cpus=8), 8)
+        self.assertEqual(cv_threads_for(4, cpus=8), 2)
+        self.assertEqual(cv_threads_for(3, cpus=8), 2)
+        self.assertEqual(cv_threads_for(16, cpus=8), 1)
+
+    def test_configure_threads(self):
+        with mock.patch.object(threads, 'available_cpus', return_value=8):
+            self.assertEqual(configure_threads(4), 2)
+        self.assertEqual(cv2.getNumThreads(), 2)
+        self.assertEqual(os.environ['OMP_NUM_THREADS'], '2')
+        # Свои значения можно перенастроить
+        configure_threads(1, cv_threads=3)
+        self.assertEqual(os.environ['OPENCV_FOR_THREADS_NUM'], '3')
+        # FaceCropper берет число потоков тайлов у OpenCV
+        self.assertEqual(FaceCropper().tile_workers, 3)
+
+    def test_user_env_is_kept(self):
+        os.environ['OMP_NUM_THREADS'] = '5'
+        configure_threads(1, cv_threads=2)
+        self.assertEqual(os.environ['OMP_NUM_THREADS'], '5')
+        self.assertEqual(os.environ['MKL_NUM_THREADS'], '2')
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            configure_threads(1, cv_threads=0)
+
+
+class TestCliThreads(unittest.TestCase):
+    """--cv-threads действует во всех режимах CLI."""
+
+    def _main(self, *argv):
+        with mock.patch.object(sys, 'argv', ['facecrop', *argv]), \
+                mock.patch.object(main, 'configure_threads', return_value=1) as configure, \
+                mock.patch.object(main, 'run_stream_paths') as run, \
+                redirect_stderr(io.StringIO()):
+            main.main()
+        return configure, run
+
+    def test_paths_from_stdin(self):
+        configure, run = self._main('--paths-from-stdin', '-o', 'out', '--workers', '4', '--cv-threads', '2')
+        configure.assert_called_once_with(4, 2)
+        run.assert_called_once()
+
+    def test_invalid_cv_threads_in_stdin_mode(self):
+        with self.assertRaises(SystemExit):
+            self._main('--paths-from-stdin', '-o', 'out', '--cv-threads', '0')
+
+
+class TestThreadCascades(unittest.TestCase):
+    """Общий FaceCropper в нескольких потоках."""
+
+    def test_each_thread_has_own_cascade(self):
+        cropper = FaceCropper()
+        self.assertIs(cropper._thread_cascade(), cropper.face_cascade)
+
+        found = []
+        thread = threading.Thread(target=lambda: found.append(cropper._thread_cascade()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(found[0], cropper.face_cascade)
+        self.assertFalse(found[0].empty())
+
+    def test_shared_stats_do_not_lose_increments(self):
+        cropper = FaceCropper()
+
+        def count():
+            for _ in range(10000):
+                cropper._count('detect_run')
+
+        workers = [threading.Thread(target=count) for _ in range(4)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(cropper.stats['detect_run'], 40000)
+
+
+if __name__ == '__main__':
+    unittest.main()
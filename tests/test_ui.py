@@ -0,0 +1,114 @@
+"""Тесты для обработки в Web UI (нужен gradio)."""
+
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from PIL import Image
+
+try:
+    from src.facecrop import ui
+except ImportError:  # gradio - не обязателен для CLI
+    ui = None
+
+
+@unittest.skipIf(ui is None, "gradio не установлен")
+class TestProcessImages(unittest.TestCase):
+    """Тесты для process_images_ui и пула кропа."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = []
+        for i in range(5):
+            path = Path(self.tmp.name) / f"img_{i}.jpg"
+            Image.new('RGB', (300 + 40 * i, 200), (20 * i, 100, 150)).save(path)
+            self.files.append(str(path))
+
+    def tearDown(self):
+        ui.configure_workers(None)
+        ui.configure_cache(None, 0)
+        self.tmp.cleanup()
+
+    def _run(self):
+        zip_path, gallery = ui.process_images_ui(self.files, 64, 2.5)
+        self.assertTrue(Path(zip_path).exists())
+        return [Path(path).name for path, _ in gallery], [Image.open(path).size for path, _ in gallery]
+
+    def test_pool_matches_sequential(self):
+        """С пулом результаты те же и в том же порядке."""
+        sequential = self._run()
+        ui.configure_workers(3)
+        self.assertEqual(self._run(), sequential)
+        self.assertEqual(sequential[1], [(64, 64)] * 5)
+
+    def test_pool_does_not_build_request_cropper(self):
+        """С пулом FaceCropper создается только в потоках пула, по одному."""
+        ui.configure_workers(1)
+        with mock.patch.object(ui, 'FaceCropper', wraps=ui.FaceCropper) as factory:
+            self._run()
+            self._run()
+        self.assertLessEqual(factory.call_count, 1)
+
+    def test_error_reported_with_pool(self):
+        Path(self.files[2]).write_bytes(b"not an image")
+        ui.configure_workers(2)
+        message, gallery = ui.process_images_ui(self.files, 64, 2.5)
+        self.assertIn("img_2.jpg", message)
+        self.assertEqual(gallery, [])
+
+    def test_result_cache(self):
+        """Повторная загрузка тех же файлов отдается из кэша теми же байтами."""
+        cache = ui.configure_cache(str(Path(self.tmp.name) / "cache"), 16)
+        _, first = ui.process_images_ui(self.files, 64, 2.5)
+        first_bytes = [Path(path).read_bytes() for path, _ in first]
+        self.assertEqual((cache.stats['hits'], cache.stats['misses']), (0, 5))
+
+        ui.configure_workers(2)
+        _, second = ui.process_images_ui(self.files, 64, 2.5)
+        self.assertEqual([Path(path).read_bytes() for path, _ in second], first_bytes)
+        self.assertEqual(cache.stats['hits'], 5)
+
+        # Другой k - другой ключ
+        ui.process_images_ui(self.files[:1], 64, 3.0)
+        self.assertEqual(cache.stats['misses'], 6)
+        key = ui._processed_files_storage['files_map']['img_0']['cache_key']
+        cache.invalidate(key)
+        self.assertEqual(len(cache), 5)
+
+    def test_gallery_gets_thumbnails(self):
+        """В галерее превью, в ZIP - полноразмерные результаты."""
+        ui.configure_cache(str(Path(self.tmp.name) / "cache"), 16)
+        size = ui.THUMB_SIZE * 2
+        for _ in range(2):  # второй раз - из кэша
+            zip_path, gallery = ui.process_images_ui(self.files, size, 2.5)
+            self.assertEqual([Image.open(path).size for path, _ in gallery], [(ui.THUMB_SIZE,) * 2] * 5)
+            self.assertEqual({Path(path).parent.name for path, _ in gallery}, {"thumbs"})
+
+        entry = ui._processed_files_storage['files_map']['img_0']
+        self.assertEqual(Image.open(entry['output']).size, (size, size))
+        self.assertEqual(entry['thumb'], gallery[0][0])
+        with zipfile.ZipFile(zip_path) as archive:
+            self.assertEqual(len(archive.namelist()), 5)
+            with archive.open("img_0_square.jpg") as member:
+                self.assertEqual(Image.open(member).size, (size, size))
+
+    def test_source_name_strips_only_suffix(self):
+        """Файл с _square в имени находится в files_map под своим именем."""
+        path = Path(self.tmp.name) / "photo_square.jpg"
+        Image.new('RGB', (300, 200)).save(path)
+        _, gallery = ui.process_images_ui([str(path)], 64, 2.5)
+        self.assertEqual(Path(gallery[0][0]).name, "photo_square_square.jpg")
+        self.assertIn(ui._source_name(gallery[0][0]), ui._processed_files_storage['files_map'])
+        self.assertEqual(ui._source_name("/tmp/thumbs/a_square_b_square.jpg"), "a_square_b")
+
+    def test_validate_concurrency(self):
+        ui.validate_concurrency(1, 1, 1)
+        for settings in ((0, 16, 1), (1, 0, 1), (1, 16, 0)):
+            with self.assertRaises(ValueError):
+                ui.validate_concurrency(*settings)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+"""Тесты для кропа видео и последовательностей кадров."""
+
+import unittest
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.facecrop.core import FaceCropper
+from src.facecrop.video import CropSmoother, TemplateTracker, VideoCropper, sort_frames
+
+
+def _textured(width, height, seed=0):
+    """Размытый шум: у шаблона однозначное положение, но нет пиксельной ряби."""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+    return cv2.normalize(cv2.GaussianBlur(noise, (0, 0), 4), None, 0, 255, cv2.NORM_MINMAX)
+
+
+class TestTemplateTracker(unittest.TestCase):
+    """Тесты для TemplateTracker."""
+
+    def test_follows_shifted_patch(self):
+        """Трекер находит сдвинутый участок с высокой уверенностью."""
+        frame = _textured(400, 300)
+        tracker = TemplateTracker()
+        tracker.init(frame, (100, 80, 60, 60))
+
+        shifted = np.roll(frame, (12, -9), axis=(0, 1))
+        bbox, confidence = tracker.update(shifted)
+
+        self.assertGreater(confidence, 0.6)
+        self.assertLessEqual(abs(bbox[0] - 91), 3)
+        self.assertLessEqual(abs(bbox[1] - 92), 3)
+        self.assertEqual(bbox[2:], (60, 60))
+
+    def test_low_confidence_on_new_content(self):
+        """На другом изображении уверенность низкая."""
+        tracker = TemplateTracker()
+        tracker.init(_textured(400, 300, seed=1), (100, 80, 60, 60))
+        _, confidence = tracker.update(_textured(400, 300, seed=2))
+        self.assertLess(confidence, 0.6)
+
+
+class TestCropSmoother(unittest.TestCase):
+    """Тесты для CropSmoother."""
+
+    def test_reduces_jitter(self):
+        """Дрожание рамки уменьшается."""
+        rng = np.random.default_rng(0)
+        smoother = CropSmoother(0.5)
+        raw, smoothed = [], []
+        for _ in range(200):
+            x = 400 + int(rng.integers(-8, 9))
+            raw.append(x)
+            smoothed.append(smoother.update((x, 0, 1080, 1080), (1920, 1080))[0])
+        self.assertLess(np.std(np.diff(smoothed)), np.std(np.diff(raw)))
+
+    def test_resets_on_jump_and_stays_inside(self):
+        """Скачок больше половины рамки сбрасывает историю; рамка не выходит за кадр."""
+        smoother = CropSmoother(0.9)
+        smoother.update((0, 0, 500, 500), (2000, 500))
+        self.assertEqual(smoother.update((1500, 0, 500, 500), (2000, 500)), (1500, 0, 500, 500))
+        self.assertEqual(smoother.update((1600, 0, 500, 500), (2000, 500))[0], 1500)
+
+    def test_invalid_smoothing(self):
+        with self.assertRaises(ValueError):
+            CropSmoother(1.0)
+
+
+class TestVideoCropper(unittest.TestCase):
+    """Тесты для VideoCropper."""
+
+    def _clip(self, frames, step=4):
+        """Текстурный фон с участком, который сдвигается на step px за кадр."""
+        base = _textured(640, 360)
+        return [np.roll(base, i * step, axis=1) for i in range(frames)]
+
+    def _video(self, **kwargs):
+        video = VideoCropper(FaceCropper(), **kwargs)
+        calls = []
+
+        def detect(gray, orientation, target_size, k):
+            calls.append(gray.shape)
+            return (200, 100, 80, 80)
+
+        video.cropper._detect_scaled = detect
+        return video, calls
+
+    def test_detects_only_on_keyframes(self):
+        """Детекция - раз в keyframe_interval кадров, между ними трекинг."""
+        video, calls = self._video(keyframe_interval=5)
+        for gray in self._clip(20):
+            self.assertIsNotNone(video.face_for_frame(gray))
+
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(video.stats['tracked'], 16)
+
+    def test_redetects_when_tracking_lost(self):
+        """Потеря трекинга вызывает детекцию до ключевого кадра."""
+        video, calls = self._video(keyframe_interval=100)
+        frames = self._clip(3)
+        frames.append(_textured(640, 360, seed=5))
+        for gray in frames:
+            video.face_for_frame(gray)
+
+        self.assertEqual(video.stats['track_lost'], 1)
+        self.assertEqual(len(calls), 2)
+
+    def test_no_face_waits_for_keyframe(self):
+        """Без лица детекция не повторяется на каждом кадре."""
+        video = VideoCropper(FaceCropper(), keyframe_interval=4)
+        calls = []
+        video.cropper._detect_scaled = lambda *args: calls.append(1)
+        for gray in self._clip(8):
+            self.assertIsNone(video.face_for_frame(gray))
+        self.assertEqual(len(calls), 2)
+
+    def test_lost_face_falls_back_to_center(self):
+        """Если повторная детекция не нашла лицо, трек сбрасывается и кроп по центру."""
+        video = VideoCropper(FaceCropper(), keyframe_interval=4)
+        calls = []
+        faces = iter([(200, 100, 80, 80)])
+
+        def detect(*args):
+            calls.append(1)
+            return next(faces, None)
+
+        video.cropper._detect_scaled = detect
+        frames = self._clip(2) + [_textured(640, 360, seed=5 + i) for i in range(8)]
+        for image in frames:
+            video.crop_frame(Image.fromarray(image).convert('RGB'), target_size=128)
+
+        # Детекция: первый кадр, потеря трека на третьем, затем только седьмой (ключевой)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(video.stats['track_lost'], 1)
+        self.assertIsNone(video.last_crop_box)
+        self.assertIsNone(video._bbox)
+
+    def test_keyframe_miss_keeps_tracked_face(self):
+        """Промах детектора на ключевом кадре не сбрасывает уверенный трек."""
+        video = VideoCropper(FaceCropper(), keyframe_interval=2)
+        faces = iter([(200, 100, 80, 80)])
+        video.cropper._detect_scaled = lambda *args: next(faces, None)
+        results = [video.face_for_frame(gray) for gray in self._clip(4)]
+        self.assertTrue(all(face is not None for face in results))
+
+    def test_portrait_square_window_is_stable(self):
+        """На вертикальных кадрах дрожание детекции не доходит до итогового окна."""
+        frame = Image.fromarray(_textured(360, 640)).convert('RGB')
+
+        def offsets(smoothing):
+            video = VideoCropper(FaceCropper(), keyframe_interval=1, smoothing=smoothing)
+            rng = np.random.default_rng(0)
+            video.cropper._detect_scaled = lambda *args: (
+                140, 250 + int(rng.integers(-8, 9)), 80, 80
+            )
+            tops = []
+            for _ in range(60):
+                video.crop_frame(frame, target_size=128)
+                tops.append(video.last_square_box[1])
+            return np.std(np.diff(tops))
+
+        self.assertGreater(offsets(0.0), 0)
+        self.assertLess(offsets(0.8), offsets(0.0) / 3)
+
+    def test_process_outputs_squares(self):
+        """Каждый кадр ролика превращается в квадрат target_size."""
+        video, _ = self._video(keyframe_interval=3)
+        frames = [Image.fromarray(gray).convert('RGB') for gray in self._clip(6)]
+        crops = list(video.process(frames, target_size=128))
+
+        self.assertEqual(len(crops), 6)
+        self.assertTrue(all(crop.size == (128, 128) for crop in crops))
+        self.assertEqual(video.stats['frames'], 6)
+        self.assertGreater(video.fps(), 0)
+
+
+class TestSortFrames(unittest.TestCase):
+    """Тесты для sort_frames."""
+
+    def test_numeric_order(self):
+        paths = [Path(f"frame_{i}.png") for i in (10, 2, 1, 100)]
+        self.assertEqual(
+            [p.name for p in sort_frames(paths)],
+            ["frame_1.png", "frame_2.png", "frame_10.png", "frame_100.png"]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
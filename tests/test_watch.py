@@ -0,0 +1,115 @@
+"""Тесты для слежения за папкой."""
+
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from src.facecrop.core import FaceCropper
+from src.facecrop.main import needs_processing, output_path_for, run_watch
+from src.facecrop.watch import FolderWatcher, SettleTracker
+
+
+class TestSettleTracker(unittest.TestCase):
+    """Тесты для SettleTracker."""
+
+    def test_waits_until_file_stops_changing(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "a.jpg"
+            path.write_bytes(b"1")
+            tracker = SettleTracker(settle=1.0)
+            tracker.touch(path, now=0.0)
+
+            self.assertEqual(tracker.ready(0.5), [])
+            # Запись продолжилась - отсчет начинается заново
+            path.write_bytes(b"12")
+            self.assertEqual(tracker.ready(0.9), [])
+            self.assertEqual(tracker.ready(1.5), [])
+            self.assertEqual(tracker.ready(2.0), [(path, 0.0)])
+            self.assertEqual(len(tracker), 0)
+
+    def test_deleted_file_is_dropped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "a.jpg"
+            path.write_bytes(b"1")
+            tracker = SettleTracker(settle=0.0)
+            tracker.touch(path, now=0.0, initial=True)
+            path.unlink()
+            self.assertEqual(tracker.ready(1.0), [])
+            self.assertEqual(len(tracker), 0)
+
+
+class TestFolderWatcher(unittest.TestCase):
+    """Тесты для FolderWatcher в режиме опроса."""
+
+    def test_reports_existing_and_new_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "old.jpg").write_bytes(b"old")
+            (root / "notes.txt").write_bytes(b"skip")
+            (root / "out").mkdir()
+            watcher = FolderWatcher(root, {'.jpg'}, recursive=True, settle=0.0,
+                                    ignore=[root / "out"], use_events=False)
+
+            self.assertEqual(watcher.poll(), [(root / "old.jpg", None)])
+            (root / "new.JPG").write_bytes(b"new")
+            (root / "out" / "old_square.jpg").write_bytes(b"result")
+            ready = watcher.poll()
+            watcher.close()
+
+            self.assertEqual([path for path, _ in ready], [root / "new.JPG"])
+            self.assertIsNotNone(ready[0][1])
+
+
+class TestRunWatch(unittest.TestCase):
+    """Тесты для run_watch."""
+
+    def test_processes_dropped_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            inbox, out = Path(tmp) / "in", Path(tmp) / "out"
+            inbox.mkdir()
+            Image.new('RGB', (300, 200), (90, 100, 110)).save(inbox / "done.jpg")
+            (out).mkdir()
+            Image.new('RGB', (64, 64)).save(out / "done_square.jpg")
+
+            def drop():
+                time.sleep(0.2)
+                Image.new('RGB', (300, 200), (10, 20, 30)).save(inbox / "new.jpg")
+
+            dropper = threading.Thread(target=drop)
+            dropper.start()
+            latencies = run_watch(
+                inbox, out, FaceCropper(), 64, 2.5, "none", False,
+                settle=0.1, poll_interval=0.05, max_events=1, use_events=False
+            )
+            dropper.join()
+
+            self.assertEqual(len(latencies), 1)
+            self.assertEqual(Image.open(out / "new_square.jpg").size, (64, 64))
+            # Актуальный результат не пересчитывался
+            self.assertFalse(needs_processing(inbox / "done.jpg", out / "done_square.jpg"))
+
+
+class TestOutputPaths(unittest.TestCase):
+    """Тесты для output_path_for и needs_processing."""
+
+    def test_output_path_keeps_structure(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            self.assertEqual(
+                output_path_for(root / "a" / "b.png", root, Path("out")),
+                Path("out") / "a" / "b_square.png"
+            )
+
+    def test_needs_processing_missing_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "a.jpg"
+            source.write_bytes(b"1")
+            self.assertTrue(needs_processing(source, Path(tmp) / "a_square.jpg"))
+
+
+if __name__ == '__main__':
+    unittest.main()